@@ -29,37 +29,53 @@ def load_hdf_sort(hdf, **kwargs):
     #keep only GM keys
     gmdict, iedict, uadict, bsdict, crossdict,termdict = {},{},{},{},{},{}
     for key in store.keys():
+        df = store[key]
+        if ((('mp' in key) or ('ms' in key) or ('flow_line' in key) or
+             ('cross' in key) or ('terminator' in key) or ('sphere2' in key))
+            and type(df.index)==pd.DatetimeIndex):
+            #Consolidated store (write_disp.append_to_store), time is
+            # already the index
+            df = df.sort_index(kind='mergesort')
+            if 'tshift' in kwargs:
+                df.index += dt.timedelta(minutes=kwargs.get('tshift',0))
         if ('mp' in key) or ('ms' in key):
-            if 'Time [UTC]' in store[key].keys():
-                gmdict[key] = store[key].sort_values(by='Time [UTC]')
+            if 'Time [UTC]' in df.keys():
+                gmdict[key] = df.sort_values(by='Time [UTC]')
                 if 'tshift' in kwargs:
                     gmdict[key]['Time [UTC]'] += dt.timedelta(minutes=
                                                     kwargs.get('tshift',0))
                 gmdict[key].index=gmdict[key]['Time [UTC]']
                 gmdict[key].drop(columns=['Time [UTC]'],inplace=True)
             else:
-                gmdict[key] = store[key]
+                gmdict[key] = df
         if 'ie' in key or 'iono' in key:
-            iedict[key] = store[key]
+            iedict[key] = df
         if 'ua' in key:
-            uadict[key] = store[key]
+            uadict[key] = df
         if 'bs' in key:
-            bsdict[key] = store[key]
+            bsdict[key] = df
         if 'flow_line' in key or 'cross' in key:
             #crossdict[key] = store[key]
-            crossdict[key] = store[key].sort_values(by=['Time [UTC]','X'])
-            if 'tshift' in kwargs:
-                crossdict[key]['Time [UTC]'] += dt.timedelta(minutes=
+            if 'Time [UTC]' in df.keys():
+                crossdict[key] = df.sort_values(by=['Time [UTC]','X'])
+                if 'tshift' in kwargs:
+                    crossdict[key]['Time [UTC]'] += dt.timedelta(minutes=
                                                     kwargs.get('tshift',0))
-            crossdict[key].index=crossdict[key]['Time [UTC]']
-            crossdict[key].drop(columns=['Time [UTC]'],inplace=True)
+                crossdict[key].index=crossdict[key]['Time [UTC]']
+                crossdict[key].drop(columns=['Time [UTC]'],inplace=True)
+            else:
+                crossdict[key] = df.iloc[np.lexsort((df['X'].values,
+                                                     df.index.values))]
         if 'terminator' in key or 'sphere2' in key:
-            termdict[key] = store[key].sort_values(by='Time [UTC]')
-            if 'tshift' in kwargs:
-                termdict[key]['Time [UTC]'] += dt.timedelta(minutes=
+            if 'Time [UTC]' in df.keys():
+                termdict[key] = df.sort_values(by='Time [UTC]')
+                if 'tshift' in kwargs:
+                    termdict[key]['Time [UTC]'] += dt.timedelta(minutes=
                                                     kwargs.get('tshift',0))
-            termdict[key].index=termdict[key]['Time [UTC]']
-            termdict[key].drop(columns=['Time [UTC]'],inplace=True)
+                termdict[key].index=termdict[key]['Time [UTC]']
+                termdict[key].drop(columns=['Time [UTC]'],inplace=True)
+            else:
+                termdict[key] = df
             for item in termdict[key].keys():
                 if all(termdict[key][item].isna()):
                     termdict[key].drop(columns=item,inplace=True)
@@ -12,7 +12,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import swmfpy
 from global_energetics.analysis.plot_tools import get_omni_cdas
-from global_energetics.extract.shue import r0_alpha_1998
+from global_energetics.extract.coupling import compute, GROUPS
+from global_energetics.extract import log_reader
+from global_energetics.extract.log_reader import (LOG_TIME, IMF_TIME,
+                                                  IMF_SKIPROWS)
 from global_energetics.analysis.plot_tools import (pyplotsetup,
                                                     general_plot_settings)
 
@@ -512,26 +515,15 @@ def csv_to_pandas(csvfile,**kwargs):
                                 second:'sc',
                                 millisecond:'msc')
             tshift (int) - in minutes
+            cache (bool) - True, keep/reuse a binary copy, see log_reader
     Returns
         df (DataFrame)
     """
-    tdict = kwargs.get('tdict',{'year':'year','month':'mo','day':'dy',
-                                'hour':'hr','minute':'mn','second':'sc',
-                                'millisecond':'msc'})
-    df = pd.read_csv(csvfile, sep='\s+', skiprows=kwargs.get('skiprows',1))
-    df['Time [UTC]']=pd.to_datetime(dict(year=df[tdict['year']],
-                                         month=df[tdict['month']],
-                                         day=df[tdict['day']],
-                                         hour=df[tdict['hour']],
-                                         minute=df[tdict['minute']],
-                                         second=df[tdict['second']]))
-    df['Time [UTC]']+=dt.timedelta(minutes=kwargs.get('tshift',0))
-    df.index = df['Time [UTC]']
-    dropcols = list(tdict.values())
-    dropcols.append('Time [UTC]')
-    if 'it' in df.columns:
-        dropcols.append('it')
-    df.drop(columns=dropcols,inplace=True)
+    df = log_reader.read_log(csvfile,tdict=kwargs.get('tdict',LOG_TIME),
+                             skiprows=kwargs.get('skiprows',1),
+                             cache=kwargs.get('cache',True))
+    if kwargs.get('tshift',0)!=0:
+        df.index = df.index+dt.timedelta(minutes=kwargs.get('tshift',0))
     return df
 
 def get_swmf_data(datapath,**kwargs):
@@ -593,24 +585,26 @@ def get_swmf_data(datapath,**kwargs):
         print(f'\t{solarwindname}.log')
     ##SIMULATION INDICES
     if not skip_geo:
-        geoindex = csv_to_pandas(geoindexlog,tshift=kwargs.get('tshift',0))
+        geoindex = csv_to_pandas(geoindexlog,tshift=kwargs.get('tshift',0),
+                                 cache=kwargs.get('cache',True))
     ##SIMULATION LOG (GM)
     if not skip_log:
-        swmflogdata = csv_to_pandas(swmflog,tshift=kwargs.get('tshift',0))
+        swmflogdata = csv_to_pandas(swmflog,tshift=kwargs.get('tshift',0),
+                                    cache=kwargs.get('cache',True))
     ##SUPERMAG LOG (GM)
     if not skip_super:
-        superlogdata = csv_to_pandas(superlog,tshift=kwargs.get('tshift',0))
+        superlogdata = csv_to_pandas(superlog,tshift=kwargs.get('tshift',0),
+                                     cache=kwargs.get('cache',True))
     ##IE SIMULATION LOG
     if not skip_ie:
-        ielogdata = csv_to_pandas(ielog,tshift=kwargs.get('tshift',0))
+        ielogdata = csv_to_pandas(ielog,tshift=kwargs.get('tshift',0),
+                                  cache=kwargs.get('cache',True))
     ##SIMULATION SOLARWIND
     if not skip_sw:
-        coordsys = pd.read_csv(solarwind).loc[2].values[0]
-        sw_tdict = {'year':'year','month':'month','day':'day',
-                    'hour':'hour','minute':'min','second':'sec',
-                    'millisecond':'msec'}
+        coordsys = log_reader.imf_coordsys(solarwind)
         swdata = csv_to_pandas(solarwind,tshift=kwargs.get('tshift',0),
-                                tdict=sw_tdict,skiprows=[0,1,2,4,5,6,7])
+                               tdict=IMF_TIME,skiprows=IMF_SKIPROWS,
+                               cache=kwargs.get('cache',True))
         if coordsys=='GSE':
             print('GSE solarwind data found!!! Converting to GSM...')
             swdata['Time [UTC]'] = swdata.index
@@ -625,54 +619,13 @@ def get_swmf_data(datapath,**kwargs):
             swdata.drop(columns=['Time [UTC]'],inplace=True)
         #swdata=swdata[swdata.index < geoindex.index[-1]]
         #swdata =swdata[swdata.index > geoindex.index[0]]
-        #solar wind dynamic pressure
-        convert = 1.6726e-27*1e6*(1e3)**2*1e9
-        swdata['v']=np.sqrt(swdata['vx']**2+swdata['vy']**2+swdata['vz']**2)
-        swdata['pdyn'] = swdata['density']*swdata['v']**2*convert
-        if kwargs.get('doBetaMa',True):
-            #solar wind plasma beta,beta*,Valfven,Ma
-            swdata['P']=swdata['density']*1.3807e-23*swdata['temperature']*1e15
-            swdata['B']=np.sqrt(swdata['bx']**2+swdata['by']**2+swdata['bz']**2)
-            swdata['Beta'] = swdata['P']/(swdata['B']**2/(4*np.pi*1e-7*1e9))
-            swdata['Beta*'] = (swdata['P']+swdata['pdyn'])/(swdata['B']**2/
-                                                        (4*np.pi*1e-7*1e9))
-            swdata['Va'] = np.sqrt(swdata['B']**2/(4*np.pi)/
-                            swdata['density']/1.67)*1e5
-            swdata['Ma'] = swdata['v']*1e3/swdata['Va']
-        if kwargs.get('doStandoff',True):
-            #Shue standoff distance
-            swdata['r_shue98'], swdata['alpha'] = (
-                                    r0_alpha_1998(swdata['bz'],swdata['pdyn']))
-        if kwargs.get('doCoupls',True):
-            #coupling functions
-            Cmp = 1000 #Followed
-            #https://supermag.jhuapl.edu/info/data.php?page=swdata
-            #term comes from Cai and Clauer[2013].
-            #Note that SuperMAG lists the term as 100,
-            #however from the paper: "From our work,
-            #                       α is estimated to be on order of 10^3"
-            swdata['B_T'] = np.sqrt((swdata['by']*1e-9)**2+(swdata['bz']*1e-9)**2)
-            swdata['M_A'] = (np.sqrt(swdata['pdyn']*1e-9*(4*pi*1e-7))
-                            /swdata['B_T'])
-            swdata['clock'] = np.arctan2(swdata['by'],swdata['bz'])
-            swdata['Newell']=Cmp*((swdata['v']*1e3)**(4/3)*np.sqrt(
-                        (swdata['by']*1e-9)**2+(swdata['bz']*1e-9)**2)**(2/3)*
-                                    abs(np.sin(swdata['clock']/2))**(8/3))
-            l = 7*6371*1000
-            swdata['eps'] = (swdata['B']**2*swdata['v']*
-                                        np.sin(swdata['clock']/2)**4*l**2*
-                                                1e3*1e-9**2 / (4*np.pi*1e-7))
-            # Kan and Lee 1979 Solar wind E-field (from Newell 2007.)
-            swdata['Esw'] = (swdata['v']*(swdata['B_T']*1e9)*
-                            (sin(swdata['clock']/2)**2))
-            #Wang2014
-            swdata['EinWang'] = (3.78e7*swdata['density']**0.24*
-                                swdata['v']**1.47*(swdata['B_T']*1e9)**0.86*
-                                (abs(sin(swdata['clock']/2))**2.70+0.25))
-            #Tenfjord2013
-            swdata['Pstorm'] = (swdata['B_T']**2*swdata['vx']*1e3/(4*pi*1e-7)*
-                            swdata['M_A']*abs(sin(swdata['clock']/2))**4*
-                            135/(5e-5*swdata['bz']**3+1)*6371e3**2)
+        #solar wind dynamic pressure, beta/Ma, standoff and coupling fncs
+        names = list(GROUPS['base'])
+        for flag,group in [('doBetaMa','BetaMa'),('doStandoff','standoff'),
+                           ('doCoupls','coupling')]:
+            if kwargs.get(flag,True):
+                names += GROUPS[group]
+        swdata = compute(swdata,kwargs.get('coupling',names))
     #times Time [UTC]
     if not skip_geo:
         geoindex['times'] = geoindex.index
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Tools for timing the analysis pipeline on synthetic BATSRUS-like fields
+    (dipole + solar wind w a Shue magnetopause), so slowdowns show up before
+    a long production run. Every stage runs the package's numpy engines so
+    neither a tecplot session nor pytecplot is needed
+"""
+import sys
+import json
+import types
+import time
+import resource
+import tracemalloc
+import numpy as np
+import pandas as pd
+#interpackage modules
+from global_energetics.extract.equations import get_dipole_field
+from global_energetics.extract.shue import r_shue, r0_alpha_1998
+from global_energetics.extract import np_equations
+from global_energetics.extract import np_masks
+from global_energetics.extract import isosurface
+from global_energetics.extract.np_integrals import (np_calc_integral,
+                                                   np_sweep_integrals)
+
+#Pipeline stages, same names as the timestamps in get_magnetosphere
+STAGES = ['PREPROC','PREP','GEN3D','SURF','VOL','WRAPUP']
+#Named fixture sizes, number of cells
+SIZES = {'1M':1_000_000,'5M':5_000_000,'20M':20_000_000}
+#Aux data the equations need, like a BATSRUS zone would have
+AUX = {'BTHETATILT':'15.0','GAMMA':'1.6667','TIMEEVENT':'2015/03/17 12:00:00',
+       'phi_max_north':'40','phi_min_north':'-40',
+       'phi_max_south':'40','phi_min_south':'-40'}
+
+def synthetic_field(ncells, **kwargs):
+    """Function builds a uniform grid w a tilted dipole inside a Shue 1998
+        magnetopause and uniform solar wind outside
+    Inputs
+        ncells (int)- approximate number of cells
+        kwargs:
+            xlim, ylim, zlim (tuple)- (-60,20), (-30,30), (-30,30) [Re]
+            Bz, Pdyn (float)- -5 [nT], 2 [nPa] IMF Bz and dynamic pressure
+            n_sw, v_sw (float)- 5 [amu/cm^3], 400 [km/s]
+            aux (dict)- AUX
+            dtype- np.float64
+    Returns
+        data (dict{str:arr})- BATSRUS variable names, flattened
+        shape (tuple)- (I,J,K) of the grid
+    """
+    xlim = kwargs.get('xlim',(-60,20))
+    ylim = kwargs.get('ylim',(-30,30))
+    zlim = kwargs.get('zlim',(-30,30))
+    aux = kwargs.get('aux',AUX)
+    dtype = kwargs.get('dtype',np.float64)
+    # Same spacing in every direction
+    extent = np.array([np.ptp(xlim),np.ptp(ylim),np.ptp(zlim)],dtype=float)
+    dx = (np.prod(extent)/ncells)**(1/3)
+    axes = [np.linspace(lo,hi,max(int(round((hi-lo)/dx)),2),dtype=dtype)
+            for lo,hi in [xlim,ylim,zlim]]
+    shape = tuple(len(a) for a in axes)
+    X,Y,Z = [a.ravel() for a in np.meshgrid(*axes,indexing='ij')]
+    data = {'X [R]':X,'Y [R]':Y,'Z [R]':Z}
+    data['r [R]'] = np.sqrt(X**2+Y**2+Z**2)
+    data['dvol [R]^3'] = np.full(len(X),np.prod([a[1]-a[0] for a in axes]),
+                                 dtype=dtype)
+    # Dipole from the same strings equations.py uses
+    np_equations.eqeval(dict(d.split('=',1) for d in get_dipole_field(aux)),
+                        data)
+    # Shue magnetopause, theta measured from +X
+    r0, alpha = r0_alpha_1998(kwargs.get('Bz',-5),kwargs.get('Pdyn',2))
+    with np.errstate(all='ignore'):
+        theta = np.rad2deg(np.arccos(np.clip(X/data['r [R]'],-1,1)))
+        inside = data['r [R]']<r_shue(r0,alpha,theta)
+    n_sw, v_sw = kwargs.get('n_sw',5), kwargs.get('v_sw',400)
+    data['Rho [amu/cm^3]'] = np.where(inside,0.5,n_sw).astype(dtype)
+    data['U_x [km/s]'] = np.where(inside,0,-v_sw).astype(dtype)
+    data['U_y [km/s]'] = np.zeros(len(X),dtype=dtype)
+    data['U_z [km/s]'] = np.zeros(len(X),dtype=dtype)
+    data['B_x [nT]'] = np.where(inside,data['Bdx'],0).astype(dtype)
+    data['B_y [nT]'] = np.where(inside,data['Bdy'],0).astype(dtype)
+    data['B_z [nT]'] = np.where(inside,data['Bdz'],
+                                kwargs.get('Bz',-5)).astype(dtype)
+    data['P [nPa]'] = np.where(inside,0.5,0.01).astype(dtype)
+    for d in ['x','y','z']:
+        data['J_'+d+' [uA/m^2]'] = np.zeros(len(X),dtype=dtype)
+    # Closed inside L=10, open by hemisphere out to the magnetopause
+    with np.errstate(all='ignore'):
+        lshell = data['r [R]']/(1-(Z/data['r [R]'])**2)
+    data['Status'] = np.where(inside,np.where(lshell<10,3,
+                                              np.where(Z>0,2,1)),0
+                              ).astype(dtype)
+    for name in ['Bdx','Bdy','Bdz']:
+        data.pop(name)
+    return data, shape
+
+def _zone(name, values, **kwargs):
+    """Function wraps arrays so the numpy integrators in surface_tools and
+        volume_tools can read them like a tecplot zone, zone.values(name)
+    Inputs
+        name (str)
+        values (dict{str:arr})- variable:values
+        kwargs:
+            index (int)- 0
+    Returns
+        zone (SimpleNamespace)
+    """
+    n = len(next(iter(values.values())))
+    def get(variable):
+        return types.SimpleNamespace(
+                    as_numpy_array=lambda: values[variable.replace('?','[')])
+    return types.SimpleNamespace(name=name,index=kwargs.get('index',0),
+                                 num_points=n,num_elements=n,values=get)
+
+def run_pipeline(data, shape, **kwargs):
+    """Function runs each stage on one fixture and times it
+    Inputs
+        data (dict{str:arr})- from synthetic_field, modified in place
+        shape (tuple)
+        kwargs:
+            analysis_type (str)- 'energy'
+            mpbetastar (float)- 0.7
+            tail_cap (float)- -20
+            outfile (str)- None, HDF file for WRAPUP (in memory if None)
+    Returns
+        timing (dict{str:dict})- stage:{seconds, cells_per_s, peak_MB}
+        results (dict)- integrated values
+    """
+    ncells = len(data['X [R]'])
+    timing = {}
+    results = {}
+    tracemalloc.start()
+    def stamp(stage, start):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        seconds = time.perf_counter()-start
+        timing[stage] = {'seconds':seconds,'cells_per_s':ncells/seconds,
+                         'peak_MB':peak/2**20}
+        print(f'{stage}--- {seconds:.2f}s ---')
+        return time.perf_counter()
+    try:
+        start = time.perf_counter()
+        #PREPROC: aux and cell size, like validate_preproc
+        aux = dict(AUX)
+        data['Cell Size [Re]'] = np.cbrt(data['dvol [R]^3'])
+        start = stamp('PREPROC',start)
+        #PREP: derived variables from equations.py
+        np_equations.get_global_variables(data,kwargs.get('analysis_type',
+                                                          'energy'),aux=aux)
+        start = stamp('PREP',start)
+        #GEN3D: magnetopause isosurface + volume states
+        beta = kwargs.get('mpbetastar',0.7)
+        cap = kwargs.get('tail_cap',-20)
+        regions = isosurface.isosurfaces(data['X [R]'],data['Y [R]'],
+                                         data['Z [R]'],data['beta_star'],beta,
+                                         shape=shape,inside='below',
+                                         blank=((data['r [R]']<3)|
+                                                (data['X [R]']<cap)))
+        registry = np_masks.new_registry(ncells)
+        getter = data.__getitem__
+        np_masks.define(registry,'{beta_star}<'+str(beta)+' && {r [R]}>3 && '+
+                        '{X [R]}>'+str(cap),getter,name='mp')
+        np_masks.define(registry,'{Status}==3',getter,name='closed_status')
+        np_masks.define(registry,'{Status}==2',getter,name='north')
+        np_masks.define(registry,'{Status}==1',getter,name='south')
+        np_masks.mask_and(registry,['mp','closed_status'],name='closed')
+        np_masks.mask_and(registry,['mp','north'],name='nlobe')
+        np_masks.mask_and(registry,['mp','south'],name='slobe')
+        masks = {name:np_masks.get_mask(registry,name)
+                 for name in ['mp','closed','nlobe','slobe']}
+        start = stamp('GEN3D',start)
+        #SURF: energy flux through the magnetopause, same integrator as
+        #   surface_analysis w useNumpy
+        surface = regions[0]
+        K = isosurface.interpolate(surface,np.stack(
+                         [data['K_'+d+' [W/Re^2]'] for d in ['x','y','z']],
+                         axis=1))[surface['faces']].mean(axis=1)
+        K_net = (K*surface['normal']).sum(axis=1)
+        surfzone = _zone('mp_iso_betastar',
+                         {'Cell Area':surface['area'],
+                          'K_net [W/Re^2]':K_net,
+                          'K_escape [W/Re^2]':np.maximum(K_net,0),
+                          'K_injection [W/Re^2]':np.minimum(K_net,0)})
+        for term,value in np_calc_integral(
+                            {'K_net [W/Re^2]':'K_net [W]',
+                             'K_escape [W/Re^2]':'K_escape [W]',
+                             'K_injection [W/Re^2]':'K_injection [W]'},
+                            surfzone).items():
+            results['mp_'+term] = value[0]
+        results['mp_Area [Re^2]'] = surface['area'].sum()
+        start = stamp('SURF',start)
+        #VOL: energy totals in each region, same as the sweep numpy path
+        data['trueCellVolume'] = data['dvol [R]^3']
+        volumes = np_sweep_integrals(_zone('global_field',data),
+                                     np.array(list(masks.values())),
+                                     analysis_type=kwargs.get(
+                                                 'analysis_type','energy'))
+        for name,df in zip(masks,volumes):
+            for term in df.keys():
+                results[name+'_'+term] = df[term].values[0]
+        start = stamp('VOL',start)
+        #WRAPUP: one row of results written out
+        row = pd.DataFrame(results,index=[pd.Timestamp('2015-03-17 12:00')])
+        if kwargs.get('outfile') is not None:
+            row.to_hdf(kwargs.get('outfile'),key='benchmark',format='table',
+                       append=True)
+        start = stamp('WRAPUP',start)
+    finally:
+        tracemalloc.stop()
+    return timing, results
+
+def run_suite(sizes, **kwargs):
+    """Function times every stage for each fixture size
+    Inputs
+        sizes (list[str or int])- keys of SIZES or number of cells
+        kwargs:
+            repeat (int)- 1, best of this many runs is kept
+            see synthetic_field and run_pipeline
+    Returns
+        report (dict)- size:{'cells','fixture_s','maxrss_MB',stage:{...}}
+    """
+    report = {}
+    for size in sizes:
+        ncells = SIZES.get(size,size) if type(size)==str else size
+        ncells = int(ncells)
+        print(f'\n{size}: building fixture')
+        start = time.perf_counter()
+        data, shape = synthetic_field(ncells,**kwargs)
+        entry = {'cells':len(data['X [R]']),'shape':shape,
+                 'fixture_s':time.perf_counter()-start}
+        for attempt in range(kwargs.get('repeat',1)):
+            timing,results = run_pipeline(dict(data),shape,**kwargs)
+            for stage,t in timing.items():
+                if (stage not in entry or
+                    t['seconds']<entry[stage]['seconds']):
+                    entry[stage] = t
+        # ru_maxrss is kB on linux
+        entry['maxrss_MB'] = resource.getrusage(
+                                   resource.RUSAGE_SELF).ru_maxrss/1024
+        report[str(size)] = entry
+        del data
+    return report
+
+def compare(report, baseline, *, tolerance=0.2, floor=0.01):
+    """Function flags stages that got slower than a saved report
+    Inputs
+        report, baseline (dict)- from run_suite
+        tolerance (float)- 0.2, fraction slower that counts as a regression
+        floor (float)- 0.01, seconds slower needed too, so tiny stages
+                       don't flag on noise
+    Returns
+        regressions (list[str])
+    """
+    regressions = []
+    for size,entry in report.items():
+        for stage in STAGES:
+            if stage in entry and stage in baseline.get(size,{}):
+                new = entry[stage]['seconds']
+                old = baseline[size][stage]['seconds']
+                if new>old*(1+tolerance) and new-old>floor:
+                    regressions.append(f'{size} {stage}: {old:.2f}s -> '+
+                                       f'{new:.2f}s')
+    return regressions
+
+def display(report):
+    """Function prints the report as a table
+    """
+    print('\n{:>6} {:>8} {:>10} {:>14} {:>10}'.format('size','stage',
+                                                 'seconds','cells/s','peak MB'))
+    for size,entry in report.items():
+        for stage in STAGES:
+            t = entry[stage]
+            print('{:>6} {:>8} {:>10.3f} {:>14.3e} {:>10.1f}'.format(
+                  size,stage,t['seconds'],t['cells_per_s'],t['peak_MB']))
+        print('{:>6} {:>8} {:>10.3f} {:>25} {:>.1f}'.format(size,'fixture',
+                                    entry['fixture_s'],'maxrss MB',
+                                    entry['maxrss_MB']))
+
+if __name__ == "__main__":
+    #python -m global_energetics.benchmark -n 1M 5M -o bench.json -b old.json
+    sizes = ['1M']
+    if '-n' in sys.argv:
+        sizes = []
+        for arg in sys.argv[sys.argv.index('-n')+1::]:
+            if arg.startswith('-'):
+                break
+            sizes.append(arg if arg in SIZES else int(float(arg)))
+    repeat = 1
+    if '-r' in sys.argv:
+        repeat = int(sys.argv[sys.argv.index('-r')+1])
+    report = run_suite(sizes,repeat=repeat)
+    display(report)
+    if '-o' in sys.argv:
+        outfile = sys.argv[sys.argv.index('-o')+1]
+        with open(outfile,'w') as f:
+            json.dump(report,f,indent=1)
+        print('Created ',outfile)
+    if '-b' in sys.argv:
+        with open(sys.argv[sys.argv.index('-b')+1],'r') as f:
+            regressions = compare(report,json.load(f))
+        for line in regressions:
+            print('SLOWER: '+line)
+        if regressions:
+            exit(1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for solar wind coupling functions,
+    each one registered w its inputs and units so only the columns asked
+    for (and what they depend on, eg. B_T, clock, pdyn) are ever computed
+"""
+import numpy as np
+from numpy import pi
+import pandas as pd
+#interpackage modules
+from global_energetics.extract.shue import r0_alpha_1998
+
+#Units of the raw solar wind columns, IMF.dat/log/OMNI names w keys
+INPUT_UNITS = {'density':'cm^-3','temperature':'K',
+               'bx':'nT','by':'nT','bz':'nT',
+               'vx':'km/s','vy':'km/s','vz':'km/s'}
+#name:{'inputs','units','func'} filled by register below
+COUPLING = {}
+#What get_swmf_data's do* flags switch on
+GROUPS = {'base':['v','pdyn'],
+          'BetaMa':['P','B','Beta','Beta*','Va','Ma'],
+          'standoff':['r_shue98','alpha'],
+          'coupling':['B_T','M_A','clock','Newell','eps','Esw','EinWang',
+                      'Pstorm']}
+MU0 = 4*pi*1e-7
+#Cai and Clauer[2013], SuperMAG lists 100, however from the paper:
+#   "From our work, α is estimated to be on order of 10^3"
+#   https://supermag.jhuapl.edu/info/data.php?page=swdata
+CMP = 1000
+L_EPS = 7*6371*1000
+
+def register(name, inputs, units):
+    """Decorator adding a function of its inputs' arrays to COUPLING
+    Inputs
+        name (str)- column the function gives
+        inputs (list[str])- raw columns or other registered names
+        units (str)
+    """
+    def decorator(func):
+        COUPLING[name] = {'inputs':list(inputs),'units':units,'func':func}
+        return func
+    return decorator
+
+@register('v',['vx','vy','vz'],'km/s')
+def _v(vx,vy,vz):
+    return np.sqrt(vx**2+vy**2+vz**2)
+
+@register('B',['bx','by','bz'],'nT')
+def _B(bx,by,bz):
+    return np.sqrt(bx**2+by**2+bz**2)
+
+@register('pdyn',['density','v'],'nPa')
+def _pdyn(density,v):
+    return density*v**2*1.6726e-27*1e6*(1e3)**2*1e9
+
+@register('P',['density','temperature'],'nPa')
+def _P(density,temperature):
+    return density*1.3807e-23*temperature*1e15
+
+@register('Beta',['P','B'],'-')
+def _beta(P,B):
+    return P/(B**2/(MU0*1e9))
+
+@register('Beta*',['P','pdyn','B'],'-')
+def _betastar(P,pdyn,B):
+    return (P+pdyn)/(B**2/(MU0*1e9))
+
+@register('Va',['B','density'],'km/s')
+def _va(B,density):
+    return np.sqrt(B**2/(4*pi)/density/1.67)*1e5
+
+@register('Ma',['v','Va'],'-')
+def _ma(v,Va):
+    return v*1e3/Va
+
+@register('B_T',['by','bz'],'T')
+def _bt(by,bz):
+    return np.sqrt((by*1e-9)**2+(bz*1e-9)**2)
+
+@register('M_A',['pdyn','B_T'],'-')
+def _m_a(pdyn,B_T):
+    return np.sqrt(pdyn*1e-9*MU0)/B_T
+
+@register('clock',['by','bz'],'rad')
+def _clock(by,bz):
+    return np.arctan2(by,bz)
+
+@register('sin_halfclock',['clock'],'-')
+def _sin_halfclock(clock):
+    return np.abs(np.sin(clock/2))
+
+@register('Newell',['v','B_T','sin_halfclock'],'Wb/s')
+def _newell(v,B_T,sin_halfclock):
+    #Newell 2007
+    return CMP*(v*1e3)**(4/3)*B_T**(2/3)*sin_halfclock**(8/3)
+
+@register('eps',['B','v','sin_halfclock'],'W')
+def _eps(B,v,sin_halfclock):
+    #Akasofu 1981
+    return B**2*v*sin_halfclock**4*L_EPS**2*1e3*1e-9**2/MU0
+
+@register('Esw',['v','B_T','sin_halfclock'],'km/s nT')
+def _esw(v,B_T,sin_halfclock):
+    #Kan and Lee 1979 solar wind E-field (from Newell 2007)
+    return v*(B_T*1e9)*sin_halfclock**2
+
+@register('EinWang',['density','v','B_T','sin_halfclock'],'W')
+def _einwang(density,v,B_T,sin_halfclock):
+    #Wang2014
+    return (3.78e7*density**0.24*v**1.47*(B_T*1e9)**0.86*
+            (sin_halfclock**2.70+0.25))
+
+@register('Pstorm',['B_T','vx','M_A','sin_halfclock','bz'],'W')
+def _pstorm(B_T,vx,M_A,sin_halfclock,bz):
+    #Tenfjord2013
+    return (B_T**2*vx*1e3/MU0*M_A*sin_halfclock**4*
+            135/(5e-5*bz**3+1)*6371e3**2)
+
+@register('r_shue98',['bz','pdyn'],'Re')
+def _r_shue98(bz,pdyn):
+    return r0_alpha_1998(bz,pdyn)[0]
+
+@register('alpha',['bz','pdyn'],'-')
+def _alpha(bz,pdyn):
+    return r0_alpha_1998(bz,pdyn)[1]
+
+def compute(df, names, **kwargs):
+    """Function adds coupling function columns to a solar wind DataFrame,
+        computing only what names need, each intermediate once. Columns
+        already in df are used as is (eg. OMNI 'v') instead of recomputed
+    Inputs
+        df (DataFrame or dict)- IMF.dat, log or OMNI (dict of arrays) data
+        names (list[str])- registered names, see COUPLING or GROUPS
+        kwargs:
+            keys (dict)- name:column for inputs named differently in df,
+                         eg. {'B':'b'} for OMNI
+            inplace (bool)- True adds the columns to df, False leaves df
+                            alone and returns only the new columns
+    Returns
+        df (DataFrame or dict)- w names added
+    """
+    keys = kwargs.get('keys',{})
+    known = {}
+    def resolve(name, chain=()):
+        if name in known:
+            return known[name]
+        column = keys.get(name,name)
+        if column in df.keys():
+            known[name] = np.asarray(df[column],dtype=np.float64)
+        elif name in COUPLING:
+            if name in chain:
+                raise ValueError(f'circular coupling inputs: {chain}')
+            entry = COUPLING[name]
+            known[name] = entry['func'](*[resolve(i,chain+(name,))
+                                          for i in entry['inputs']])
+        else:
+            raise KeyError(f'{name} not in data or COUPLING, see keys kwarg')
+        return known[name]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        new = {name:resolve(name) for name in names
+               if keys.get(name,name) not in df.keys()}
+    if kwargs.get('inplace',True):
+        for name,values in new.items():
+            df[name] = values
+        return df
+    return pd.DataFrame(new,index=getattr(df,'index',None))
+
+def units(names):
+    """Function gives the units of registered or raw input names
+    """
+    return {n:COUPLING[n]['units'] if n in COUPLING else INPUT_UNITS.get(n)
+            for n in names}
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT or PARAVIEW** for finding R1/R2 field
+    aligned current regions on the structured IE theta/psi grid, a numpy
+    version of pv_ionosphere.id_R1R2_currents
+"""
+import os
+import numpy as np
+import pandas as pd
+try:
+    from numba import jit
+except ImportError:
+    def jit(func):
+        """Without numba label_regions runs as plain (slower) python"""
+        return func
+from concurrent.futures import ProcessPoolExecutor
+#interpackage modules
+from global_energetics.makevideo import get_time
+from global_energetics.extract import idl_reader
+
+#Column name prefixes, .idl files use eg. 'JR_[mA/m^2]', .tec 'J_R [`mA/m^2]'
+NAMES = {'theta':('Theta',),'psi':('Psi',),'jr':('JR','J_R'),'phi':('PHI',)}
+
+@jit#NOTE this restricts the types and methods available so take care
+def label_regions(mask, periodic):
+    """Function labels 4-connected pieces of a 2D mask w union-find
+    Inputs
+        mask (arr[bool])- (ntheta,npsi)
+        periodic (bool)- if the last psi column neighbors the first
+    Returns
+        labels (arr[int])- (ntheta,npsi), -1 outside mask, 0..n-1 inside
+        n (int)- number of regions
+    """
+    nth, nps = mask.shape
+    parent = np.arange(nth*nps)
+    for i in range(nth):
+        for j in range(nps):
+            if not mask[i,j]:
+                continue
+            for (k,l) in ((i+1,j),(i,j+1)):
+                if l==nps and periodic:
+                    l = 0
+                if k>=nth or l>=nps or not mask[k,l]:
+                    continue
+                # find w path halving, then union by smaller root
+                a = i*nps+j
+                while parent[a]!=a:
+                    parent[a] = parent[parent[a]]
+                    a = parent[a]
+                b = k*nps+l
+                while parent[b]!=b:
+                    parent[b] = parent[parent[b]]
+                    b = parent[b]
+                if a<b:
+                    parent[b] = a
+                elif b<a:
+                    parent[a] = b
+    labels = np.full((nth,nps),-1)
+    roots = np.full(nth*nps,-1)
+    n = 0
+    for i in range(nth):
+        for j in range(nps):
+            if not mask[i,j]:
+                continue
+            a = i*nps+j
+            while parent[a]!=a:
+                a = parent[a]
+            if roots[a]<0:
+                roots[a] = n
+                n += 1
+            labels[i,j] = roots[a]
+    return labels, n
+
+def great_circle(theta1, psi1, theta2, psi2):
+    """Function gives the angle between two points w the vincenty formula
+    Inputs
+        theta1, psi1, theta2, psi2 (float)- colatitude and longitude [deg]
+    Returns
+        dsigma (float)- [rad]
+    """
+    th1, th2 = np.deg2rad(90-theta1), np.deg2rad(90-theta2)
+    dpsi = np.deg2rad(psi1-psi2)
+    return np.arctan2(np.sqrt((np.cos(th2)*np.sin(dpsi))**2+
+                              (np.cos(th1)*np.sin(th2)-
+                               np.sin(th1)*np.cos(th2)*np.cos(dpsi))**2),
+                      np.sin(th1)*np.sin(th2)+
+                      np.cos(th1)*np.cos(th2)*np.cos(dpsi))
+
+def _column(headers, key):
+    for i,name in enumerate(headers):
+        if any([name.startswith(p) for p in NAMES[key]]):
+            return i
+    raise KeyError(f'no {key} variable in {headers}')
+
+def _hemisphere(cube, headers, jmax, jmin, **kwargs):
+    """Function finds and classifies the FAC regions of one hemisphere
+    Inputs
+        cube (arr[float])- (ntheta,npsi,nvar) from idl_reader.to_lat_lon
+        headers (list[str])
+        jmax, jmin (float)- Jr extremes used for the thresholds
+        kwargs:
+            see id_R1R2
+    Returns
+        fac (dict)- UP/DOWN_R1/R2 [MA], Theta_R1/R2 [deg], d [rad]
+    """
+    theta = cube[:,0,_column(headers,'theta')]
+    psi = cube[0,:,_column(headers,'psi')]
+    jr = cube[:,:,_column(headers,'jr')]
+    phi = cube[:,:,_column(headers,'phi')]
+    # IE repeats psi=0 as psi=360, drop it and wrap around instead
+    periodic = np.isclose(psi[-1]-psi[0],360)
+    if periodic:
+        psi, jr, phi = psi[0:-1], jr[:,0:-1], phi[:,0:-1]
+    r_iono = kwargs.get('r_iono',1+300/6371)
+    dth = np.abs(np.gradient(np.deg2rad(theta)))
+    dps = np.gradient(np.deg2rad(psi))
+    if periodic:
+        dps[:] = 2*np.pi/len(psi)
+    area = (r_iono**2*np.sin(np.deg2rad(theta))*dth)[:,None]*dps[None,:]
+    TH = np.broadcast_to(theta[:,None],jr.shape)
+    Y = np.sin(np.deg2rad(TH))*np.sin(np.deg2rad(psi))[None,:]
+    north = theta.mean()<90
+    # Colatitude measured away from this hemisphere's pole
+    poledist = TH if north else 180-TH
+    frac = kwargs.get('threshold',0.15)
+    fac = {}
+    stats = {}
+    for polarity,mask in [[1,jr>=frac*jmax],[-1,jr<=frac*jmin]]:
+        labels, n = label_regions(mask,periodic)
+        inside = labels>=0
+        ids = labels[inside]
+        A = np.bincount(ids,weights=area[inside],minlength=n)
+        stats[polarity] = {
+            'labels':labels,'n':n,'A':A,
+            'I':np.bincount(ids,weights=(jr*area)[inside],minlength=n),
+            'D':np.bincount(ids,weights=(poledist*area)[inside],
+                            minlength=n)/A,
+            'Y':np.bincount(ids,weights=(Y*area)[inside],minlength=n)/A,
+            'V':np.bincount(ids,weights=(phi*area)[inside],minlength=n)/A}
+    # Region holding the strongest up/down current is the reference
+    regions = {}
+    for polarity,ext,dusk in [[1,np.argmax,1],[-1,np.argmin,-1]]:
+        s = stats[polarity]
+        if s['n']==0:
+            continue
+        ref = s['labels'].flat[ext(np.where(s['labels']>=0,jr,
+                                            -polarity*np.inf))]
+        for p,other in stats.items():
+            equatorward = other['D']>s['D'][ref]
+            # dusk: R1 is up, dawn: R1 is down, later rule wins like pv
+            match = ((equatorward&(dusk*other['Y']>0))|
+                     (~equatorward&(dusk*other['V']<0)))
+            region = regions.setdefault(p,np.zeros(other['n'],dtype=int))
+            region[match] = 1 if p==polarity else 2
+    for polarity,name in [[1,'UP'],[-1,'DOWN']]:
+        s = stats[polarity]
+        region = regions.get(polarity,np.zeros(s['n'],dtype=int))
+        for R in [1,2]:
+            fac[f'{name}_R{R}'] = s['I'][region==R].sum()*6371**2*1e-6
+    for R in [1,2]:
+        A = sum([stats[p]['A'][regions.get(p,np.zeros(0))==R].sum()
+                 for p in stats])
+        D = sum([(stats[p]['D']*stats[p]['A'])[
+                                      regions.get(p,np.zeros(0))==R].sum()
+                 for p in stats])
+        fac[f'Theta_R{R}'] = (D/A if north else 180-D/A) if A>0 else np.nan
+    # Distance between the potential max and min
+    imax, imin = np.argmax(phi), np.argmin(phi)
+    PS = np.broadcast_to(psi[None,:],jr.shape)
+    fac['d'] = great_circle(TH.flat[imin],PS.flat[imin],
+                            TH.flat[imax],PS.flat[imax])
+    return fac
+
+def id_R1R2(north, south, headers, **kwargs):
+    """Function finds R1/R2 regions in both hemispheres and integrates them
+    Inputs
+        north, south (arr[float])- (ntheta,npsi,nvar) see idl_reader
+        headers (list[str])
+        kwargs:
+            threshold (float)- 0.15, fraction of max/min Jr kept
+            r_iono (float)- 1+300/6371 [Re]
+    Returns
+        FAC (dict)- eg. UP_R1_N, DOWN_R2_S [MA], Theta_R1_N [deg],
+                    d_North [rad], same keys as pv_ionosphere when they exist
+    """
+    ij = _column(headers,'jr')
+    jmax = max(north[:,:,ij].max(),south[:,:,ij].max())
+    jmin = min(north[:,:,ij].min(),south[:,:,ij].min())
+    FAC = {}
+    for cube,hemi,tag in [[north,'N','North'],[south,'S','South']]:
+        for key,value in _hemisphere(cube,headers,jmax,jmin,**kwargs).items():
+            FAC[f'{key}_{tag}' if key=='d' else f'{key}_{hemi}'] = value
+    return FAC
+
+def _fac_one(args):
+    """Function reads one IE file and finds its regions, top level so it
+        pickles for fac_timeseries
+    """
+    infile, kwargs = args
+    if infile.endswith('.tec'):
+        north,south,aux = idl_reader.read_ie_tec(infile)
+    else:
+        north,south,aux = idl_reader.read_idl_ascii(infile)
+    headers = list(north.keys())
+    th, ps = headers[_column(headers,'theta')], headers[_column(headers,'psi')]
+    return id_R1R2(idl_reader.to_lat_lon(north.values,headers,th,ps),
+                   idl_reader.to_lat_lon(south.values,headers,th,ps),
+                   headers,**kwargs)
+
+def fac_timeseries(files, **kwargs):
+    """Function finds R1/R2 currents for every IE file in parallel
+    Inputs
+        files (list[str])- IE .idl or .tec files
+        kwargs:
+            nworkers (int)- os.cpu_count(), 1 to run in this process
+            see id_R1R2
+    Returns
+        FAC (DataFrame)- one row per file, sorted by time
+    """
+    nworkers = kwargs.pop('nworkers',os.cpu_count())
+    jobs = [(f,kwargs) for f in files]
+    if nworkers==1:
+        rows = list(map(_fac_one,jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=nworkers) as executor:
+            rows = list(executor.map(_fac_one,jobs,chunksize=4))
+    FAC = pd.DataFrame(rows,index=[get_time(f) for f in files])
+    FAC.sort_index(inplace=True)
+    return FAC
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for flying virtual satellites through
+    a whole list of 3D outputs at once, each grid is loaded once and every
+    satellite is sampled in one batched locator query
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+#interpackage modules
+from global_energetics.makevideo import get_time
+from global_energetics.extract import plt_reader
+from global_energetics.extract import locator
+
+#Position columns in the satellite location .h5 files, see satellites.py
+COORDS = ['x_gsm','y_gsm','z_gsm']
+
+def load_trajectories(satfiles):
+    """Function reads every satellite from location .h5 files
+    Inputs
+        satfiles (list[str])- HDFStores w one key per satellite, index time
+    Returns
+        trajectories (dict{str:DataFrame})- sat:[x_gsm,y_gsm,z_gsm]
+    """
+    trajectories = {}
+    for satfile in satfiles:
+        with pd.HDFStore(satfile,'r') as locfile:
+            for sat in locfile.keys():
+                trajectories[sat.strip('/')] = locfile[sat][COORDS].sort_index()
+    return trajectories
+
+def _ns(times):
+    return pd.DatetimeIndex(times).values.astype('datetime64[ns]').astype(
+                                                                    np.int64)
+
+def _sample_file(args):
+    """Function samples one source file at all the points given, top level
+        so it pickles for flythrough
+    Inputs
+        args (tuple)- sourcefile, points (M,3), variables, cache_dir
+    Returns
+        names (list[str]), values (arr[float])- (M,nvar), NaN off grid
+    """
+    sourcefile, points, variables, cache_dir = args
+    dataset = plt_reader.read_plt(sourcefile)
+    zone = plt_reader.get_zone(dataset,0)
+    xyz = [plt_reader.zone_values(dataset,c) for c in ['X *','Y *','Z *']]
+    grid = locator.get_grid(*xyz,
+                            connectivity=plt_reader.zone_connectivity(dataset),
+                            shape=zone['shape'],cache_dir=cache_dir)
+    data,aux = plt_reader.load_variables(dataset,variables)
+    names = list(data.keys())
+    if len(points)==0:
+        return names, np.zeros([0,len(names)])
+    values,inside = locator.sample(grid,np.stack([data[n] for n in names],
+                                                 axis=1),points)
+    return names, values
+
+def flythrough(source_files, satfiles, **kwargs):
+    """Function extracts every satellite from every source file in one pass
+    Inputs
+        source_files (list[str])- 3D .plt/.dat outputs
+        satfiles (list[str])- location files, see load_trajectories
+        kwargs:
+            variables (list[str])- None for all, wildcards allowed
+            temporal (bool)- False gives one row per snapshot at the
+                             satellite position then, True gives one row per
+                             trajectory sample between the first and last
+                             snapshot, linear in time between the two
+                             snapshots around it
+            nworkers (int)- os.cpu_count(), 1 to run in this process
+            grid_cache (str)- None, folder to keep grid locators in
+            outfile (str)- None, HDFStore written w one key per satellite
+    Returns
+        vsat (dict{str:DataFrame})- sat:time series of sampled variables
+    """
+    source_files = sorted(source_files,key=get_time)
+    trajectories = load_trajectories(satfiles)
+    stimes = _ns([get_time(f) for f in source_files])
+    temporal = kwargs.get('temporal',False) and len(source_files)>1
+    # Where each satellite is sampled, and from which snapshot(s)
+    plan = {}
+    points = [[] for f in source_files]
+    owners = [[] for f in source_files]
+    for sat,traj in trajectories.items():
+        ttimes = _ns(traj.index)
+        if temporal:
+            keep = (ttimes>=stimes[0])&(ttimes<=stimes[-1])
+            index, xyz = traj.index[keep], traj[COORDS].values[keep]
+            right = np.clip(np.searchsorted(stimes,ttimes[keep],
+                                            side='right'),1,len(stimes)-1)
+            left = right-1
+            weight = ((ttimes[keep]-stimes[left])/
+                      (stimes[right]-stimes[left]))
+        else:
+            index = pd.DatetimeIndex(stimes)
+            xyz = np.stack([np.interp(stimes,ttimes,traj[c].values)
+                            for c in COORDS],axis=1)
+            left = right = np.arange(len(stimes))
+            weight = np.zeros(len(stimes))
+        plan[sat] = (index,xyz,left,right,weight)
+        # Each row is asked for from both snapshots around it
+        for i in np.unique(np.r_[left,right]):
+            rows = np.flatnonzero((left==i)|(right==i))
+            points[i].append(xyz[rows])
+            owners[i].append((sat,rows))
+    jobs = [(f,np.concatenate(p) if p else np.zeros([0,3]),
+             kwargs.get('variables'),kwargs.get('grid_cache'))
+            for f,p in zip(source_files,points)]
+    nworkers = kwargs.get('nworkers',os.cpu_count())
+    if nworkers==1:
+        results = list(map(_sample_file,jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=nworkers) as executor:
+            results = list(executor.map(_sample_file,jobs))
+    names = results[0][0]
+    # Blend the two snapshots around each row, weight is 0 w/o temporal
+    tables = {sat:np.zeros([len(plan[sat][0]),len(names)])
+              for sat in trajectories}
+    for i,(_,values) in enumerate(results):
+        start = 0
+        for sat,rows in owners[i]:
+            index,xyz,left,right,weight = plan[sat]
+            w = weight[rows]
+            c = (np.where(left[rows]==i,1-w,0)+
+                 np.where(right[rows]==i,w,0))[:,None]
+            tables[sat][rows] += np.where(c>0,c*values[start:start+len(rows)],
+                                          0)
+            start += len(rows)
+    vsat = {}
+    for sat,(index,xyz,left,right,weight) in plan.items():
+        df = pd.DataFrame(tables[sat],columns=names,index=index)
+        df[['Xgsm','Ygsm','Zgsm']] = xyz
+        df.index.name = 'time'
+        vsat[sat] = df
+    if kwargs.get('outfile') is not None:
+        with pd.HDFStore(kwargs.get('outfile')) as outfile:
+            for sat,df in vsat.items():
+                outfile[sat] = df
+        print(f'Created {kwargs.get("outfile")}')
+    return vsat
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for keeping the purely geometric
+    variables of a fixed grid (cell volume/size, r, h) between outputs, and
+    the dipole terms until BTHETATILT changes
+"""
+import os
+import tempfile
+import numpy as np
+#interpackage modules
+from global_energetics.extract import np_equations
+from global_energetics.extract.locator import grid_hash
+
+#Node coordinates, everything cached here is built from these
+COORDS = ['X [R]','Y [R]','Z [R]']
+#Grids seen by this process, fingerprint->{'static','tilt','dipole'}
+GEOMETRY = {}
+
+def fingerprint(xyz, *, connectivity=None, shape=None):
+    """Function gives the key for a grid
+    Inputs
+        xyz (dict{str:arr})- node coordinates, keys from COORDS
+        connectivity (arr[int])- FE nodemap, None for ordered
+        shape (tuple(int))- (I,J,K) for ordered
+    Returns
+        key (str)
+    """
+    return grid_hash(*[xyz[c] for c in COORDS],connectivity=connectivity,
+                     shape=shape)
+
+def split_geometric(eqsets, known):
+    """Function splits equations into those that only depend on the grid
+        (and each other) and the ones that also need the field data
+    Inputs
+        eqsets (list[dict])- {lhs:rhs} pairs as in equations()
+        known (list[str])- grid variables, eg. X [R], r [R]
+    Returns
+        geometric (dict), rest (dict)- {lhs:rhs}, order is kept
+    """
+    known = set(known)
+    geometric, rest = {}, {}
+    for eqset in eqsets:
+        graph = np_equations.build_graph(eqset)
+        for lhs,rhs in eqset.items():
+            node = graph[np_equations.strip_name(lhs)]
+            if (node['code'] is not None and
+                all([zone is None for (_,zone) in node['refs']]) and
+                all([dep in known for dep in node['deps']])):
+                geometric[lhs] = rhs
+                known.add(np_equations.strip_name(lhs))
+            else:
+                rest[lhs] = rhs
+    return geometric, rest
+
+def _path(cache_dir, key, part):
+    return os.path.join(cache_dir,'geometry_'+key+part+'.npz')
+
+def _save(path, arrays):
+    """Function writes arrays to .npz under a temp name first so other
+        workers never read a partial file
+    """
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    handle, temp = tempfile.mkstemp(suffix='.npz',dir=os.path.dirname(path))
+    with os.fdopen(handle,'wb') as f:
+        np.savez(f,**arrays)
+    os.replace(temp,path)
+
+def _load(path):
+    with np.load(path) as arrays:
+        return {name:arrays[name] for name in arrays.files}
+
+def _entry(key):
+    """Function returns the in memory entry for a grid, only the latest
+        grid is kept
+    """
+    if key not in GEOMETRY:
+        GEOMETRY.clear()
+        GEOMETRY[key] = {'static':{},'tilt':None,'dipole':{}}
+    return GEOMETRY[key]
+
+def get_static(key, *, cache_dir=None):
+    """Function returns the grid only variables saved for this grid
+    Inputs
+        key (str)- from fingerprint
+        cache_dir (str)- None for in memory only
+    Returns
+        static (dict{str:arr})- empty if nothing is saved yet
+    """
+    entry = _entry(key)
+    if (not entry['static'] and cache_dir is not None and
+        os.path.exists(_path(cache_dir,key,''))):
+        entry['static'] = _load(_path(cache_dir,key,''))
+    return entry['static']
+
+def put_static(key, arrays, *, cache_dir=None):
+    """Function saves grid only variables, added to any already saved
+    Inputs
+        key (str)- from fingerprint
+        arrays (dict{str:arr})
+        cache_dir (str)- None for in memory only
+    """
+    entry = _entry(key)
+    entry['static'].update(arrays)
+    if cache_dir is not None:
+        _save(_path(cache_dir,key,''),entry['static'])
+
+def get_dipole(key, tilt, data, eqset, *, cache_dir=None):
+    """Function returns the tilt dependent terms, only evaluated again when
+        BTHETATILT is different from last time
+    Inputs
+        key (str)- from fingerprint
+        tilt (str)- BTHETATILT aux value the equations were made with
+        data (dict{str:arr})- coordinates + static variables
+        eqset (dict)- geometric equations, see split_geometric
+        cache_dir (str)- None for in memory only
+    Returns
+        dipole (dict{str:arr})
+    """
+    entry = _entry(key)
+    if entry['tilt']==tilt:
+        return entry['dipole']
+    path = None if cache_dir is None else _path(cache_dir,key,'_tilt')
+    if path is not None and os.path.exists(path):
+        saved = _load(path)
+        if str(saved.pop('BTHETATILT'))==tilt:
+            entry['tilt'], entry['dipole'] = tilt, saved
+            return saved
+    local = dict(data)
+    np_equations.eqeval(eqset,local)
+    #Constants (eg. mXhat_x) stay scalars, broadcast when they're used
+    entry['dipole'] = {np_equations.strip_name(lhs):np.asarray(
+                                        local[np_equations.strip_name(lhs)])
+                       for lhs in eqset}
+    entry['tilt'] = tilt
+    if path is not None:
+        _save(path,dict(entry['dipole'],BTHETATILT=np.array(tilt)))
+    return entry['dipole']
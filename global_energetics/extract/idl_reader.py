@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT or SPACEPY** for reading SWMF IE .idl
+    and mag_grid .out files (ascii or binary real4/real8) in one pass, plus
+    a batch reader that stacks many files into one (time,lat,lon,var) array
+"""
+import os
+import struct
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+#interpackage modules
+from global_energetics.makevideo import get_time
+from global_energetics.extract import plt_reader
+
+#Sections of the IE .idl header that hold 'value name' lines
+IDL_HEADERS = ['VALUES','TIME','SIMULATION','DIPOLE']
+
+def _as_number(qty):
+    if qty.isnumeric():
+        return int(qty)
+    try:
+        return float(qty)
+    except ValueError:
+        return qty
+
+def _block(text):
+    """Function parses a block of whitespace separated numbers
+    """
+    return np.array(text.split(),dtype=np.float64)
+
+def read_idl_ascii(infile, **kwargs):
+    """Function reads an ascii IE .idl file, header lines are parsed once
+        and each hemisphere is converted in one go
+    Inputs
+        infile (str)
+    Returns
+        north,south (DataFrame)- data for north and south hemispheres
+        aux (dict)- dictionary of other information
+    """
+    with open(infile,'r') as f:
+        text = f.read()
+    north_at = text.index('BEGIN NORTH')
+    south_at = text.index('BEGIN SOUTH')
+    aux, variables, section = {}, [], None
+    for line in text[0:north_at].splitlines():
+        words = line.split()
+        if len(words)==0:
+            section = None
+        elif section=='VARIABLE':
+            variables.append('_'.join(words[1::]))
+        elif section=='AUX':
+            aux['_'.join(words[1::])] = _as_number(words[0])
+        elif 'VARIABLE' in line:
+            section = 'VARIABLE'
+        elif any([h in line for h in IDL_HEADERS]):
+            section = 'AUX'
+    north_start = text.index('\n',north_at)
+    south_start = text.index('\n',south_at)
+    north = _block(text[north_start:south_at]).reshape(-1,len(variables))
+    south = _block(text[south_start::]).reshape(-1,len(variables))
+    return (pd.DataFrame(north,columns=variables),
+            pd.DataFrame(south,columns=variables),aux)
+
+def read_ie_tec(infile, **kwargs):
+    """Function reads an IE .tec file w plt_reader, no tecplot needed
+    Inputs
+        infile (str)
+        kwargs:
+            variables (list[str])- None for all
+    Returns
+        north,south (DataFrame)- IonN and IonS zones
+        aux (dict)
+    """
+    dataset = plt_reader.read_plt(infile)
+    result = []
+    for zone in ['IonN*','IonS*']:
+        data,aux = plt_reader.load_variables(dataset,kwargs.get('variables'),
+                                             zone=zone)
+        result.append(pd.DataFrame({k:np.array(v) for k,v in data.items()}))
+    return result[0],result[1],dict(aux)
+
+def _records(raw):
+    """Function splits a fortran unformatted sequential file into records
+    Returns
+        records (list[bytes]), endian (str)
+    """
+    endian = '<'
+    if struct.unpack('<i',raw[0:4])[0] not in range(1,10000):
+        endian = '>'
+    records, i = [], 0
+    while i+4<=len(raw):
+        n = struct.unpack(endian+'i',raw[i:i+4])[0]
+        records.append(raw[i+4:i+4+n])
+        i += n+8
+    return records, endian
+
+def read_idl_binary(infile):
+    """Function reads a binary (real4 or real8) SWMF IDL .out file
+    Inputs
+        infile (str)
+    Returns
+        idl (dict)- headline, step, time, grid (n per dim), params (dict),
+                    names (coordinate then variable names),
+                    coords (arr[ndim,n]), values (arr[nvar,n]),
+                    n = prod(grid) in file (fortran) order
+    """
+    with open(infile,'rb') as f:
+        raw = f.read()
+    records, endian = _records(raw)
+    headline = records[0].decode(errors='ignore').strip()
+    real = 'f' if len(records[1])==20 else 'd'
+    step, time, ndim, nparam, nvar = struct.unpack(endian+'i'+real+'iii',
+                                                   records[1])
+    ndim = abs(ndim)
+    grid = np.frombuffer(records[2],dtype=endian+'i4')[0:ndim]
+    dtype = np.dtype(endian+real)
+    i = 3
+    params = np.frombuffer(records[i],dtype=dtype) if nparam>0 else []
+    i += 1 if nparam>0 else 0
+    names = records[i].decode(errors='ignore').split()
+    n = int(np.prod(grid))
+    coords = np.frombuffer(records[i+1],dtype=dtype).reshape(ndim,n)
+    values = np.array([np.frombuffer(r,dtype=dtype)
+                       for r in records[i+2:i+2+nvar]]).reshape(nvar,n)
+    return {'headline':headline,'step':step,'time':time,'grid':grid,
+            'params':dict(zip(names[ndim+nvar::],params)),
+            'names':names[0:ndim+nvar],'coords':coords,'values':values}
+
+def read_maggrid(infile, **kwargs):
+    """Function reads a mag_grid .out file into one array
+    Inputs
+        infile (str)
+        kwargs:
+            type (str)- 'ascii' (default) or 'real4' (binary real4/real8)
+    Returns
+        grid (arr[float])- (nlon*nlat, nheaders)
+        headers (list[str])
+    """
+    if kwargs.get('type','ascii')=='ascii':
+        with open(infile,'r') as f:
+            f.readline()# 1st title
+            f.readline()# 2nd simulation time
+            nlon,nlat = [int(n) for n in f.readline().split()[0:2]]# 3rd
+            headers = f.readline().split()
+            grid = _block(f.read()).reshape(-1,len(headers))
+    else:
+        idl = read_idl_binary(infile)
+        # Lat/Lon labels are swapped, same as the old spacepy based readgrid
+        swap = {'Lat':'Lon','Lon':'Lat'}
+        headers = [swap.get(name,name) for name in idl['names']]
+        grid = np.concatenate([idl['coords'],idl['values']]).T
+    return grid,headers
+
+def to_lat_lon(values, headers, lat, lon):
+    """Function reshapes rows of a structured sphere grid to (lat,lon,var)
+    Inputs
+        values (arr[float])- (nrows, nvar)
+        headers (list[str])
+        lat, lon (str)- names of the two coordinate columns
+    Returns
+        cube (arr[float])- (nlat,nlon,nvar), lat/lon increasing
+    """
+    ilat, ilon = headers.index(lat), headers.index(lon)
+    nlat = len(np.unique(values[:,ilat]))
+    nlon = len(values)//nlat
+    order = np.lexsort((values[:,ilon],values[:,ilat]))
+    return values[order].reshape(nlat,nlon,-1)
+
+def _read_one(args):
+    """Function reads one file for read_batch, top level so it pickles
+    """
+    infile, kind, kwargs = args
+    if kind=='maggrid':
+        grid,headers = read_maggrid(infile,**kwargs)
+        return {'':to_lat_lon(grid,headers,kwargs.get('lat','Lat'),
+                              kwargs.get('lon','Lon'))},headers
+    if kind=='idl':
+        north,south,aux = read_idl_ascii(infile)
+    else:
+        north,south,aux = read_ie_tec(infile,**kwargs)
+    headers = list(north.keys())
+    lat = kwargs.get('lat',headers[0])
+    lon = kwargs.get('lon',headers[1])
+    return {'north':to_lat_lon(north.values,headers,lat,lon),
+            'south':to_lat_lon(south.values,headers,lat,lon)},headers
+
+def read_batch(files, **kwargs):
+    """Function reads many files in parallel into stacked arrays
+    Inputs
+        files (list[str])- all the same kind and grid
+        kwargs:
+            kind (str)- 'maggrid', 'idl' or 'tec', default from extension
+            nworkers (int)- os.cpu_count(), 1 to read in this process
+            lat, lon (str)- coordinate columns, default Lat/Lon for
+                            maggrid and the first two columns for IE
+            type (str)- for maggrid, see read_maggrid
+    Returns
+        batch (dict)- times (list[datetime]), headers (list[str]) and
+                      one (time,lat,lon,var) array per part: 'data' for
+                      maggrid or 'north'/'south' for IE
+    """
+    kind = kwargs.pop('kind',None)
+    if kind is None and len(files)>0:
+        kind = {'.out':'maggrid','.idl':'idl','.tec':'tec'}[
+                                              os.path.splitext(files[0])[1]]
+    nworkers = kwargs.pop('nworkers',os.cpu_count())
+    jobs = [(f,kind,kwargs) for f in files]
+    batch = {'times':[get_time(f) for f in files]}
+    if nworkers==1:
+        results = map(_read_one,jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=nworkers)
+        results = executor.map(_read_one,jobs,chunksize=8)
+    try:
+        for i,(parts,headers) in enumerate(results):
+            if i==0:
+                batch['headers'] = headers
+                for part,cube in parts.items():
+                    batch[part or 'data'] = np.empty((len(files),)+cube.shape)
+            for part,cube in parts.items():
+                batch[part or 'data'][i] = cube
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return batch
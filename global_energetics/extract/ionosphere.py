@@ -28,7 +28,10 @@ from global_energetics.extract.mapping import (port_mapping_to_ie,
                                                reversed_mapping,
                                                surface_condition_map_to_ie)
 from global_energetics.extract import line_tools
+from global_energetics.extract import tracer
+from global_energetics.extract import locator
 from global_energetics.extract import surface_tools
+from global_energetics.extract import idl_reader
 
 def isfloat(num):
     try:
@@ -46,49 +49,7 @@ def read_idl_ascii(infile,**kwargs):
         north,south (DataFrame)- data for north and south hemispheres
         aux (dict)- dictionary of other information
     """
-    headers = ['VALUES','TIME','SIMULATION','DIPOLE']
-    aux = {}
-    variables = []
-    i=0
-    with open(infile,'r') as f:
-        for line in f:
-            if 'TITLE' in line:
-                title = f.readline()
-                i+=1
-            elif 'VARIABLE' in line:
-                value = f.readline()
-                i+=1
-                isblank = all([c==''for c in value.split('\n')[0].split(' ')])
-                while not isblank:
-                    name= '_'.join([c.split('\n')[0] for c in value.split(' ')
-                                                    if c!='\n' and c!=''][1::])
-                    variables.append(name)
-                    value = f.readline()
-                    i+=1
-                    isblank=all([c==''for c in value.split('\n')[0].split(' ')])
-            elif any([h in line for h in headers]):
-                value = f.readline()
-                i+=1
-                isblank = all([c==''for c in value.split('\n')[0].split(' ')])
-                while not isblank:
-                    qty = [c for c in value.split(' ') if c!='\n' and c!=''][0]
-                    name= '_'.join([c.split('\n')[0] for c in value.split(' ')
-                                                    if c!='\n' and c!=''][1::])
-                    if qty.isnumeric(): qty = int(qty)
-                    elif isfloat(qty): qty = float(qty)
-                    aux[name] = qty
-                    value = f.readline()
-                    i+=1
-                    isblank=all([c==''for c in value.split('\n')[0].split(' ')])
-            elif 'BEGIN NORTH' in line:
-                i_ns, northstart = i, line
-            elif 'BEGIN SOUTH' in line:
-                i_ss, southstart = i, line
-            i+=1
-    north = pd.read_csv(infile,sep='\s+',skiprows=i_ns+1,names=variables,
-                        nrows=i_ss)
-    south = pd.read_csv(infile,sep='\s+',skiprows=i_ss+1,names=variables)
-    return north,south,aux
+    return idl_reader.read_idl_ascii(infile,**kwargs)
 
 def calc_shell_variables(ds, **kwargs):
     """Calculates helpful variables such as cell area (labeled as volume)
@@ -238,14 +199,65 @@ def rotate_xyz(zones,angle,**kwargs):
     eq(Bdy_eq,zones=zones)
     eq(Bdz_eq,zones=zones)
 
+def np_trace_status(points,zone,hemi,**kwargs):
+    """Function traces all the points at once w tracer to determine if each
+        point is open or closed, same result variable as trace_status
+    Inputs
+        points (list[tuple])- (x,y,z) of points in zone to check
+        zone
+        hemi (str)- 'North' or 'South'
+        kwargs:
+            stat_var (str)- 'Status'
+            prefix (str)- ''
+            source (Zone)- global_field, 3D zone to trace through
+            r_inner (float)- 2.75, see tracer.trace
+            grid_cache (str)- None, folder to keep grid locators in
+    """
+    pre = kwargs.get('prefix','')
+    stat_var = kwargs.get('stat_var','Status')
+    source = kwargs.get('source',zone.dataset.zone('global_field'))
+    grid = locator.get_grid(source.values('X *').as_numpy_array(),
+                            source.values('Y *').as_numpy_array(),
+                            source.values('Z *').as_numpy_array(),
+                connectivity=(None if source.zone_type==ZoneType.Ordered
+                              else np.array(source.nodemap.array[:]).reshape(
+                                                    source.num_elements,-1)),
+                shape=(source.dimensions
+                       if source.zone_type==ZoneType.Ordered else None),
+                cache_dir=kwargs.get('grid_cache'))
+    bfield = np.stack([source.values(pre+'B_'+d+' *').as_numpy_array()
+                       for d in ['x','y','z']],axis=1)
+    if '_cc' in stat_var:
+        xyz = [zone.values(v).as_numpy_array() for v in ['x_cc','y_cc','z_cc']]
+    else:
+        xyz = [zone.values(v+' *').as_numpy_array() for v in ['X','Y','Z']]
+    # Find the location of every point in the target zone in one pass
+    lookup = {p:i for i,p in enumerate(zip(*xyz))}
+    index = np.array([lookup[tuple(p)] for p in points],dtype=int)
+    # Reverse for North, Forward for South, same as the streamtraces
+    direction = {'North':-1,'South':1}[hemi]
+    result = tracer.trace(grid,bfield,np.array(points).reshape(-1,3),
+                          directions=[direction],
+                          r_inner=kwargs.get('r_inner',2.75))
+    name = {-1:'backward',1:'forward'}[direction]
+    status = zone.values(stat_var).as_numpy_array()
+    status[index] = np.where(result['reason_'+name]==tracer.BODY,3,
+                             {'North':2,'South':1}[hemi])
+    zone.values(stat_var)[:] = status
+
 def trace_status(points,zone,hemi,**kwargs):
     """Function traces all the points in a zone to detrmine if each point is
         open or closed
     Inputs
         zone
         kwargs:
+            useNumpy (bool)- False, trace all points at once w tracer
+                             instead of one tecplot streamtrace per point
+            source (Zone)- global_field, 3D zone traced through (useNumpy)
     Returns
     """
+    if kwargs.get('useNumpy',False):
+        return np_trace_status(points,zone,hemi,**kwargs)
     eq =  tp.data.operate.execute_equation
     pre = kwargs.get('prefix','')
     # set vector settings
@@ -362,24 +374,26 @@ def nearest_neighbor_map(iezone,source,hemi):
         source_status = source_status[(source_theta<0)&(source_theta)>-90]
         source_theta = source_theta[(source_theta<0)&(source_theta)>-90]
         #ietheta_match = ietheta-90
-        source_match = -source_theta+90
-    for i,(th_in,phi_in) in enumerate(zip(ietheta[0:10000],
-                                          iephi[0:10000])):
-        th1 = source_thmatch*pi/180
-        phi1 = source_phi*pi/180
-        th2 = th_in*pi/180
-        phi2 = phi_in*pi/180
-        d = np.sqrt(2*(1-sin(th1)*sin(th2)*cos(phi1-phi2)+cos(th1)*cos(th2)))
-        status_value = source_status[np.where(d==d.min())[0][0]]
-        if hemi=='North' and status_value<3:
-            iezone.values('Status')[i] = 2
-            print(i, 2)
-        elif hemi=='South' and status_value<3:
-            iezone.values('Status')[i] = 1
-            print(i, 1)
-        else:
-            iezone.values('Status')[i] = 3
-            print(i, 3)
+        source_thmatch = -source_theta+90
+    # Same distance as before, nearest source point for every ie point at
+    #  once w a KD tree on the unit sphere
+    th1 = source_thmatch*pi/180
+    phi1 = source_phi*pi/180
+    th2 = pi-ietheta[0:10000]*pi/180
+    phi2 = iephi[0:10000]*pi/180
+    _,index = locator.nearest(np.stack([sin(th1)*cos(phi1),
+                                        sin(th1)*sin(phi1),
+                                        cos(th1)],axis=1),
+                              np.stack([sin(th2)*cos(phi2),
+                                        sin(th2)*sin(phi2),
+                                        cos(th2)],axis=1))
+    status_value = source_status[index]
+    status = iezone.values('Status').as_numpy_array()
+    if hemi=='North':
+        status[0:len(index)] = np.where(status_value<3,2,3)
+    else:
+        status[0:len(index)] = np.where(status_value<3,1,3)
+    iezone.values('Status')[:] = status
     #from IPython import embed; embed()
 
 def sphere2cart_map(spzone,**kwargs):
@@ -434,7 +448,7 @@ def blank_and_trace(zone,hemi,**kwargs):
                       capZone.values('Y *').as_numpy_array(),
                       capZone.values('Z *').as_numpy_array()))
     zone.dataset.delete_zones([capZone])
-    trace_status(points, zone, hemi)
+    trace_status(points, zone, hemi,useNumpy=kwargs.get('useNumpy',False))
 
 def blank_and_interpolate(source,target,hemi):
     eq = tp.data.operate.execute_equation
@@ -524,7 +538,8 @@ def check_edges(zone,hemi,**kwargs):
         z = zone.values('Z *').as_numpy_array()[check_indices]
     points = list(zip(x,y,z))
     trace_status(points,zone,hemi,stat_var=kwargs.get('stat_var','Status_cc'),
-                                  prefix=kwargs.get('prefix',''))
+                                  prefix=kwargs.get('prefix',''),
+                                  useNumpy=kwargs.get('useNumpy',False))
     '''
     # Boost the Status signal post interpolation for firm discrete states
     if hemi=='North':
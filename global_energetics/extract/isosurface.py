@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for extracting isosurfaces from a
+    BATSRUS grid w marching tetrahedra, splitting them into connected
+    regions w union-find and keeping the largest (or all) of them, the
+    numpy version of tecplot's OneZonePerConnectedRegion extraction
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+#interpackage modules
+from global_energetics.extract import locator
+
+#Each hex (corners in locator order, bit0->x bit1->y bit2->z) is split
+# into 6 tets around the 0-7 diagonal, neighbors split shared faces alike
+HEX_TETS = np.array([[0,1,3,7],[0,3,2,7],[0,2,6,7],
+                     [0,6,4,7],[0,4,5,7],[0,5,1,7]])
+TET_EDGES = np.array([[0,1],[0,2],[0,3],[1,2],[1,3],[2,3]])
+
+def _case_table():
+    """Function builds the marching tets table, triangles as edge indices
+    Returns
+        tris (arr[int])- (16,2,3) edges of up to 2 triangles per case, -1
+        ntris (arr[int])- (16,)
+    """
+    edge = {tuple(e):i for i,e in enumerate(TET_EDGES.tolist())}
+    edge.update({(b,a):i for (a,b),i in list(edge.items())})
+    tris = np.full((16,2,3),-1)
+    ntris = np.zeros(16,dtype=int)
+    for case in range(1,15):
+        above = [n for n in range(4) if case>>n&1]
+        below = [n for n in range(4) if not case>>n&1]
+        if len(above)==2:
+            (a,b),(c,d) = above,below
+            quad = [edge[a,c],edge[a,d],edge[b,d],edge[b,c]]
+            tris[case] = [quad[0:3],[quad[0],quad[2],quad[3]]]
+            ntris[case] = 2
+        else:
+            lone = above[0] if len(above)==1 else below[0]
+            tris[case,0] = [edge[lone,n] for n in range(4) if n!=lone]
+            ntris[case] = 1
+    return tris, ntris
+
+TRIS, NTRIS = _case_table()
+
+def cell_nodes(grid):
+    """Function gives the 8 corner nodes of every cell in locator order
+    Inputs
+        grid (dict)- from locator.get_grid
+    Returns
+        nodes (arr[int])- (n_cells,8)
+    """
+    if grid['kind']!='ordered':
+        return grid['nodes']
+    I,J,K = grid['shape']
+    i,j,k = np.meshgrid(np.arange(I-1),np.arange(J-1),np.arange(K-1),
+                        indexing='ij')
+    base = (i+I*(j+J*k)).ravel(order='F')
+    corner = np.array([(b&1)+I*((b>>1)&1)+I*J*((b>>2)&1) for b in range(8)])
+    return base[:,None]+corner[None,:]
+
+def union_find(n, i, j):
+    """Function labels the connected pieces of a graph, union-find done
+        for all edges at once (hook larger root under smaller + compress)
+    Inputs
+        n (int)- number of vertices
+        i, j (arr[int])- edge ends
+    Returns
+        labels (arr[int])- (n,) 0..nlabels-1
+    """
+    parent = np.arange(n)
+    i, j = np.asarray(i,dtype=np.int64), np.asarray(j,dtype=np.int64)
+    while len(i)>0:
+        a, b = parent[i], parent[j]
+        todo = a!=b
+        i, j, a, b = i[todo], j[todo], a[todo], b[todo]
+        if len(i)==0:
+            break
+        np.minimum.at(parent,np.maximum(a,b),np.minimum(a,b))
+        # every vertex points straight at its root again
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand,parent):
+                break
+            parent = grand
+    return np.unique(parent,return_inverse=True)[1]
+
+def extract(xyz, nodes, values, iso, **kwargs):
+    """Function extracts the isosurface values=iso w marching tetrahedra
+    Inputs
+        xyz (arr[float])- (n_nodes,3) node coordinates
+        nodes (arr[int])- (n_cells,8) see cell_nodes
+        values (arr[float])- (n_nodes,) nodal values
+        iso (float)
+        kwargs:
+            blank (arr[bool])- (n_nodes,) cells touching a True node are
+                               skipped, like tecplot value blanking
+            inside (str)- 'above' (default) or 'below', normals point away
+                          from this side of iso
+            weld (float)- 0.5, vertices across a refinement jump closer
+                          than weld*(coarse cell size) count as connected
+    Returns
+        surface (dict)- vertices (V,3), faces (F,3), cells (F,) source
+                        cell of each face, edges (V,2) + t (V,) to
+                        interpolate nodal values, area (F,), normal (F,3)
+                        and center (F,3) cell centered on the faces,
+                        region (F,) connected region, 0 is the largest
+    """
+    values = np.asarray(values,dtype=np.float64)
+    above = values>=iso
+    # Only cells the surface passes through go any further
+    count = above[nodes].sum(axis=1)
+    crossing = (count>0)&(count<8)
+    if kwargs.get('blank') is not None:
+        crossing &= ~np.asarray(kwargs.get('blank'))[nodes].any(axis=1)
+    cells = np.flatnonzero(crossing)
+    tets = nodes[cells][:,HEX_TETS].reshape(-1,4)
+    tetcell = np.repeat(cells,len(HEX_TETS))
+    case = (above[tets]*[1,2,4,8]).sum(axis=1)
+    pairs, facecell, facetet = [], [], []
+    for k in range(2):
+        hit = np.flatnonzero(NTRIS[case]>k)
+        local = TET_EDGES[TRIS[case[hit],k]]#(m,3,2) corners of each edge
+        pairs.append(tets[hit[:,None,None],local])
+        facecell.append(tetcell[hit])
+        facetet.append(hit)
+    pairs = np.concatenate(pairs)#(F,3,2) node pair of each face vertex
+    facecell = np.concatenate(facecell)
+    facetet = np.concatenate(facetet)
+    # One vertex per grid edge, or per node when it sits right on one
+    a, b = pairs[...,0].ravel(), pairs[...,1].ravel()
+    swap = a>b
+    a, b = np.where(swap,b,a), np.where(swap,a,b)
+    t = (iso-values[a])/(values[b]-values[a])
+    t = np.where(t<=1e-12,0,t)
+    a = np.where(t>=1-1e-12,b,a)
+    t = np.where(t>=1-1e-12,0,t)
+    b = np.where(t==0,a,b)
+    keys, first, faces = np.unique(a*len(values)+b,return_index=True,
+                                   return_inverse=True)
+    faces = faces.reshape(-1,3)
+    edges = np.stack([a[first],b[first]],axis=1)
+    t = t[first]
+    vertices = xyz[edges[:,0]]*(1-t)[:,None]+xyz[edges[:,1]]*t[:,None]
+    # Drop faces that collapsed onto a node or an edge
+    keep = ((faces[:,0]!=faces[:,1])&(faces[:,1]!=faces[:,2])&
+            (faces[:,0]!=faces[:,2]))
+    faces, facecell, facetet = faces[keep], facecell[keep], facetet[keep]
+    p0, p1, p2 = [vertices[faces[:,c]] for c in range(3)]
+    cross = np.cross(p1-p0,p2-p0)
+    # Orient each face away from the inside nodes of its tet
+    side = above[tets[facetet]]
+    if kwargs.get('inside','above')=='below':
+        side = ~side
+    inner = ((xyz[tets[facetet]]*side[...,None]).sum(axis=1)/
+             side.sum(axis=1)[:,None])
+    flip = (cross*(inner-p0)).sum(axis=1)>0
+    faces[flip] = faces[flip][:,[0,2,1]]
+    cross[flip] *= -1
+    area = np.linalg.norm(cross,axis=1)/2
+    surface = {'vertices':vertices,'faces':faces,'cells':facecell,
+               'edges':edges,'t':t,'area':area,
+               'normal':cross/np.where(area>0,2*area,1)[:,None],
+               'center':(p0+p1+p2)/3}
+    surface['region'] = _regions(surface,xyz,nodes,**kwargs)
+    return surface
+
+def _regions(surface, xyz, nodes, **kwargs):
+    """Function labels the connected regions of a surface, largest first
+    """
+    faces = surface['faces']
+    nvert = len(surface['vertices'])
+    i = np.concatenate([faces[:,0],faces[:,1]])
+    j = np.concatenate([faces[:,1],faces[:,2]])
+    # Faces on either side of a refinement jump don't share grid edges,
+    #  link each fine vertex to the nearest coarse one if close enough
+    cells = surface['cells']
+    size = np.abs(xyz[nodes[cells,7]]-xyz[nodes[cells,0]]).max(axis=1)
+    vsize = np.full(nvert,np.inf)
+    np.minimum.at(vsize,faces.ravel(),np.repeat(size,3))
+    level = np.unique(np.float32(vsize[np.isfinite(vsize)]))
+    for fine,coarse in zip(level[0:-1],level[1::]):
+        f = np.flatnonzero(np.float32(vsize)==fine)
+        c = np.flatnonzero(np.float32(vsize)==coarse)
+        dist, near = cKDTree(surface['vertices'][c]).query(
+                                surface['vertices'][f],
+                                distance_upper_bound=kwargs.get('weld',0.5)*
+                                                     float(coarse))
+        found = np.isfinite(dist)
+        i = np.concatenate([i,f[found]])
+        j = np.concatenate([j,c[near[found]]])
+    labels = union_find(nvert,i,j)[faces[:,0]] if len(faces)>0 else faces[:,0]
+    # Renumber by size so region 0 has the most faces
+    nfaces = np.bincount(labels)
+    rank = np.empty(len(nfaces),dtype=int)
+    rank[np.argsort(-nfaces,kind='stable')] = np.arange(len(nfaces))
+    return rank[labels]
+
+def select(surface, *, keep='largest', min_faces=0):
+    """Function splits a surface into its connected regions
+    Inputs
+        surface (dict)- from extract
+        keep (str)- 'largest' or 'all'
+        min_faces (int)- 0, regions w fewer faces are dropped
+    Returns
+        regions (list[dict])- same keys as surface, largest first
+    """
+    nregions = surface['region'].max()+1 if len(surface['region'])>0 else 0
+    if keep=='largest':
+        nregions = min(nregions,1)
+    regions = []
+    for r in range(nregions):
+        mine = np.flatnonzero(surface['region']==r)
+        if len(mine)<min_faces:
+            break
+        used, faces = np.unique(surface['faces'][mine],return_inverse=True)
+        region = {key:surface[key][mine] for key in ['cells','area','normal',
+                                                     'center','region']}
+        region.update({key:surface[key][used] for key in ['vertices','edges',
+                                                          't']})
+        region['faces'] = faces.reshape(-1,3)
+        regions.append(region)
+    return regions
+
+def interpolate(surface, values):
+    """Function gives nodal grid values on the surface vertices
+    Inputs
+        surface (dict)- from extract or select
+        values (arr[float])- (n_nodes,) or (n_nodes,k)
+    Returns
+        result (arr[float])- (V,) or (V,k)
+    """
+    values = np.asarray(values)
+    t = surface['t'].reshape((-1,)+(1,)*(values.ndim-1))
+    return (values[surface['edges'][:,0]]*(1-t)+
+            values[surface['edges'][:,1]]*t)
+
+def isosurfaces(x, y, z, values, iso, **kwargs):
+    """Function extracts and splits an isosurface straight from a grid
+    Inputs
+        x,y,z (arr[float])- node coordinates
+        values (arr[float])- nodal, or cell centered (averaged to nodes)
+        iso (float)
+        kwargs:
+            connectivity, shape, cache_dir- see locator.get_grid
+            keep, min_faces- see select
+            blank, inside, weld- see extract
+    Returns
+        regions (list[dict])- see select
+    """
+    grid = locator.get_grid(x,y,z,connectivity=kwargs.get('connectivity'),
+                            shape=kwargs.get('shape'),
+                            cache_dir=kwargs.get('cache_dir'))
+    nodes = cell_nodes(grid)
+    values = np.asarray(values,dtype=np.float64)
+    if len(values)!=len(x) and len(values)==len(nodes):
+        values = (np.bincount(nodes.ravel(),np.repeat(values,8),len(x))/
+                  np.maximum(np.bincount(nodes.ravel(),minlength=len(x)),1))
+    surface = extract(np.stack([x,y,z],axis=1),nodes,values,iso,**kwargs)
+    return select(surface,keep=kwargs.get('keep','largest'),
+                  min_faces=kwargs.get('min_faces',0))
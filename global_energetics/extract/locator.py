@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for finding which cell of a BATSRUS
+    grid (block/octree FEBRICK or ordered) each point is in, trilinear
+    interpolation and k-nearest queries, built once per grid and cached on
+    disk by grid hash since the AMR grid often stays fixed between outputs
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+from scipy.spatial import cKDTree
+
+#Grids already built in this process, keyed by grid_hash
+GRIDS = {}
+
+def build_grid(x, y, z, *, connectivity=None, shape=None, chunksize=2**20):
+    """Function sets up a cell locator w trilinear weights for a grid
+    Inputs
+        x,y,z (arr[float])- node coordinates
+        connectivity (arr[int])- (n_elements,8) 0 based FEBRICK nodemap,
+                                 cells must be axis aligned (BATSRUS)
+        shape (tuple(int))- (I,J,K) for ordered zones instead
+        chunksize (int)- elements processed at a time while building
+    Returns
+        grid (dict)- kind, n_nodes + what locate needs
+    """
+    x, y, z = [np.asarray(v,dtype=np.float64) for v in (x,y,z)]
+    if connectivity is None:
+        I,J,K = shape
+        return {'kind':'ordered','n_nodes':len(x),'shape':(I,J,K),
+                'axes':[x[0:I],y[0:I*J:I],z[0:I*J*K:I*J]]}
+    connectivity = np.asarray(connectivity).reshape(-1,8)
+    n_elements = len(connectivity)
+    lo = np.empty((n_elements,3))
+    size = np.empty(n_elements)
+    nodes = np.empty((n_elements,8),dtype=np.int64)
+    for start in range(0,n_elements,chunksize):
+        conn = connectivity[start:start+chunksize]
+        corners = np.stack([x[conn],y[conn],z[conn]],axis=-1)
+        clo = corners.min(axis=1)
+        chi = corners.max(axis=1)
+        # Put the 8 nodes in canonical order, bit0->x bit1->y bit2->z
+        bits = ((corners>(clo+chi)[:,None,:]/2)*[1,2,4]).sum(axis=-1)
+        nodes[start:start+len(conn)] = np.take_along_axis(conn,
+                                            np.argsort(bits,axis=1),axis=1)
+        lo[start:start+len(conn)] = clo
+        size[start:start+len(conn)] = (chi-clo).max(axis=1)
+    # Each refinement level sits on its own lattice, so a cell is found by
+    #  an integer key lookup per level
+    levels = []
+    level_size = np.unique(np.float32(size))
+    level_of = np.searchsorted(level_size,np.float32(size))
+    for i,dx in enumerate(level_size[::-1]):
+        elements = np.flatnonzero(level_of==len(level_size)-1-i)
+        origin = lo[elements].min(axis=0)
+        ijk = np.rint((lo[elements]-origin)/float(dx)).astype(np.int64)
+        dims = ijk.max(axis=0)+1
+        keys = (ijk[:,0]*dims[1]+ijk[:,1])*dims[2]+ijk[:,2]
+        order = np.argsort(keys,kind='stable')
+        levels.append({'dx':float(dx),'origin':origin,'dims':dims,
+                       'keys':keys[order],'elements':elements[order]})
+    return {'kind':'brick','n_nodes':len(x),'lo':lo,'size':size,
+            'nodes':nodes,'levels':levels[::-1]}
+
+def locate(grid, points):
+    """Function finds the cell + trilinear weights for each point
+    Inputs
+        grid (dict)- from build_grid
+        points (arr[float])- (M,3)
+    Returns
+        nodes (arr[int])- (M,8) node index of each corner
+        weights (arr[float])- (M,8)
+        inside (arr[bool])- (M,) False where the point isn't on the grid
+    """
+    points = np.atleast_2d(points)
+    M = len(points)
+    if grid['kind']=='ordered':
+        I,J,K = grid['shape']
+        index = np.zeros((M,3),dtype=np.int64)
+        frac = np.zeros((M,3))
+        inside = np.ones(M,dtype=bool)
+        for d,axis in enumerate(grid['axes']):
+            i = np.clip(np.searchsorted(axis,points[:,d],side='right')-1,
+                        0,max(len(axis)-2,0))
+            inside &= (points[:,d]>=axis[0])&(points[:,d]<=axis[-1])
+            width = axis[np.minimum(i+1,len(axis)-1)]-axis[i]
+            frac[:,d] = np.where(width>0,(points[:,d]-axis[i])/
+                                         np.where(width>0,width,1),0)
+            index[:,d] = i
+        base = index[:,0]+I*(index[:,1]+J*index[:,2])
+        corner = np.array([(b&1)+I*((b>>1)&1)+I*J*((b>>2)&1)
+                           for b in range(8)])
+        nodes = np.minimum(base[:,None]+corner,grid['n_nodes']-1)
+    else:
+        element = np.full(M,-1,dtype=np.int64)
+        for level in grid['levels']:
+            todo = np.flatnonzero(element<0)
+            if len(todo)==0:
+                break
+            ijk = np.floor((points[todo]-level['origin'])/
+                            level['dx']).astype(np.int64)
+            valid = np.all((ijk>=0)&(ijk<level['dims']),axis=1)
+            todo, ijk = todo[valid], ijk[valid]
+            keys = ((ijk[:,0]*level['dims'][1]+ijk[:,1])*level['dims'][2]+
+                    ijk[:,2])
+            pos = np.minimum(np.searchsorted(level['keys'],keys),
+                             len(level['keys'])-1)
+            found = level['keys'][pos]==keys
+            element[todo[found]] = level['elements'][pos[found]]
+        inside = element>=0
+        element[~inside] = 0
+        frac = np.clip((points-grid['lo'][element])/
+                       grid['size'][element][:,None],0,1)
+        nodes = grid['nodes'][element]
+    bits = np.arange(8)
+    weights = (np.where(bits&1,frac[:,0:1],1-frac[:,0:1])*
+               np.where(bits&2,frac[:,1:2],1-frac[:,1:2])*
+               np.where(bits&4,frac[:,2:3],1-frac[:,2:3]))
+    return nodes, weights, inside
+
+def sample(grid, values, points):
+    """Function interpolates nodal values to points
+    Inputs
+        grid (dict)- from build_grid
+        values (arr[float])- (n_nodes,) or (n_nodes,k)
+        points (arr[float])- (M,3)
+    Returns
+        result (arr[float])- (M,) or (M,k), NaN off the grid
+        inside (arr[bool])
+    """
+    nodes, weights, inside = locate(grid,points)
+    values = np.asarray(values)
+    if values.ndim==1:
+        result = (values[nodes]*weights).sum(axis=1)
+    else:
+        result = np.einsum('mc,mck->mk',weights,values[nodes])
+    result[~inside] = np.nan
+    return result, inside
+
+def grid_hash(x, y, z, *, connectivity=None, shape=None):
+    """Function gives a short hash of the node coordinates + connectivity,
+        the same grid in a later output gives the same hash
+    Inputs
+        x,y,z (arr[float])- node coordinates
+        connectivity (arr[int])- FEBRICK nodemap, None for ordered
+        shape (tuple(int))- (I,J,K) for ordered
+    Returns
+        hash (str)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for v in (x,y,z):
+        h.update(np.ascontiguousarray(v,dtype=np.float32).tobytes())
+    if connectivity is not None:
+        h.update(np.ascontiguousarray(connectivity,dtype=np.int64).tobytes())
+    if shape is not None:
+        h.update(str(tuple(int(s) for s in shape)).encode())
+    return h.hexdigest()
+
+def _save_grid(path, grid):
+    """Function writes a grid dict to .npz (levels flattened by index)
+    """
+    arrays = {'kind':np.array(grid['kind']),'n_nodes':grid['n_nodes']}
+    if grid['kind']=='ordered':
+        arrays['shape'] = np.array(grid['shape'])
+        for d,axis in enumerate(grid['axes']):
+            arrays['axis'+str(d)] = axis
+    else:
+        for name in ['lo','size','nodes']:
+            arrays[name] = grid[name]
+        for i,level in enumerate(grid['levels']):
+            for name,value in level.items():
+                arrays['level'+str(i)+'_'+name] = value
+    # Write under a temp name so other workers never see a partial file
+    handle, temp = tempfile.mkstemp(suffix='.npz',dir=os.path.dirname(path))
+    with os.fdopen(handle,'wb') as f:
+        np.savez(f,**arrays)
+    os.replace(temp,path)
+
+def _load_grid(path):
+    """Function reads a grid dict written by _save_grid
+    """
+    with np.load(path) as arrays:
+        grid = {'kind':str(arrays['kind']),'n_nodes':int(arrays['n_nodes'])}
+        if grid['kind']=='ordered':
+            grid['shape'] = tuple(int(s) for s in arrays['shape'])
+            grid['axes'] = [arrays['axis'+str(d)] for d in range(3)]
+            return grid
+        for name in ['lo','size','nodes']:
+            grid[name] = arrays[name]
+        grid['levels'] = []
+        while 'level'+str(len(grid['levels']))+'_dx' in arrays:
+            i = str(len(grid['levels']))
+            grid['levels'].append({
+                        'dx':float(arrays['level'+i+'_dx']),
+                        'origin':arrays['level'+i+'_origin'],
+                        'dims':arrays['level'+i+'_dims'],
+                        'keys':arrays['level'+i+'_keys'],
+                        'elements':arrays['level'+i+'_elements']})
+    return grid
+
+def get_grid(x, y, z, **kwargs):
+    """Function returns the locator for a grid, reusing one already built
+        in this process or saved in cache_dir before building a new one
+    Inputs
+        x,y,z (arr[float])- node coordinates
+        kwargs:
+            connectivity (arr[int])- FEBRICK nodemap, None for ordered
+            shape (tuple(int))- (I,J,K) for ordered
+            cache_dir (str)- None, folder for grid_<hash>.npz files
+    Returns
+        grid (dict)- see build_grid, w 'hash' added
+    """
+    connectivity = kwargs.get('connectivity')
+    shape = kwargs.get('shape')
+    key = grid_hash(x,y,z,connectivity=connectivity,shape=shape)
+    if key in GRIDS:
+        return GRIDS[key]
+    path = None
+    if kwargs.get('cache_dir') is not None:
+        os.makedirs(kwargs.get('cache_dir'),exist_ok=True)
+        path = os.path.join(kwargs.get('cache_dir'),'grid_'+key+'.npz')
+    if path is not None and os.path.exists(path):
+        grid = _load_grid(path)
+    else:
+        grid = build_grid(x,y,z,connectivity=connectivity,shape=shape)
+        if path is not None:
+            _save_grid(path,grid)
+    grid['hash'] = key
+    # Only the latest grid is kept, outputs rarely switch back and forth
+    GRIDS.clear()
+    GRIDS[key] = grid
+    return grid
+
+def centers(grid):
+    """Function gives cell centers (FEBRICK) or node coordinates (ordered)
+    """
+    if grid['kind']=='ordered':
+        X,Y,Z = np.meshgrid(*grid['axes'],indexing='ij')
+        return np.stack([X.ravel(order='F'),Y.ravel(order='F'),
+                         Z.ravel(order='F')],axis=1)
+    return grid['lo']+grid['size'][:,None]/2
+
+def nearest(source, points, k=1):
+    """Function finds the k nearest source points to each point
+    Inputs
+        source (dict or arr[float])- grid from get_grid (cell centers) or
+                                     (N,3) points
+        points (arr[float])- (M,3)
+        k (int)- number of neighbors
+    Returns
+        distance (arr[float])- (M,) or (M,k)
+        index (arr[int])- (M,) or (M,k) into source
+    """
+    if type(source)==dict:
+        if 'tree' not in source:
+            source['tree'] = cKDTree(centers(source))
+        tree = source['tree']
+    else:
+        tree = cKDTree(np.asarray(source).reshape(-1,3))
+    return tree.query(np.atleast_2d(points),k=k)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for reading SWMF text logs (log_*,
+    geoindex, IE, superindex and IMF.dat) w typed columns and times built
+    in one vectorized step, then kept in a binary sidecar next to the log
+    (feather if pyarrow is around, pickle if not) so later reads skip the
+    text parse entirely until the log's size or mtime changes
+"""
+import os
+import glob
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+#Time columns in SWMF logs, IMF.dat uses year/month/day/hour/min/sec/msec
+LOG_TIME = {'year':'year','month':'mo','day':'dy','hour':'hr','minute':'mn',
+            'second':'sc','millisecond':'msc'}
+IMF_TIME = {'year':'year','month':'month','day':'day','hour':'hour',
+            'minute':'min','second':'sec','millisecond':'msec'}
+IMF_SKIPROWS = [0,1,2,4,5,6,7]
+
+def assemble_times(year, month, day, hour, minute, second):
+    """Function builds datetimes from calendar columns w numpy datetime64
+        arithmetic instead of pd.to_datetime(dict(...)) row parsing
+    Inputs
+        year, month, day, hour, minute, second (arr[int])
+    Returns
+        times (DatetimeIndex)
+    """
+    months = ((np.asarray(year,dtype=np.int64)-1970)*12+
+              np.asarray(month,dtype=np.int64)-1).astype('datetime64[M]')
+    days = (months.astype('datetime64[D]')+
+            (np.asarray(day,dtype=np.int64)-1).astype('timedelta64[D]'))
+    seconds = (np.asarray(hour,dtype=np.int64)*3600+
+               np.asarray(minute,dtype=np.int64)*60+
+               np.asarray(second,dtype=np.int64)).astype('timedelta64[s]')
+    return pd.DatetimeIndex((days+seconds).astype('datetime64[ns]'))
+
+def _parse(path, tdict, skiprows):
+    """Function does the actual text parse, times as index, all else float
+    """
+    names = pd.read_csv(path,sep=r'\s+',skiprows=skiprows,nrows=0).columns
+    dtype = {c:(np.int64 if c in tdict.values() else np.float64)
+             for c in names}
+    try:
+        df = pd.read_csv(path,sep=r'\s+',skiprows=skiprows,dtype=dtype)
+    except (ValueError,TypeError):
+        #eg. Fortran '*****' overflow fields, those become NaN
+        df = pd.read_csv(path,sep=r'\s+',skiprows=skiprows)
+        df = df.apply(pd.to_numeric,errors='coerce')
+    df.index = assemble_times(*[df[tdict[k]] for k in ['year','month','day',
+                                                      'hour','minute',
+                                                      'second']])
+    df.index.name = 'Time [UTC]'
+    dropcols = [c for c in list(tdict.values())+['it'] if c in df.columns]
+    return df.drop(columns=dropcols)
+
+def sidecar(path, **kwargs):
+    """Function gives where the binary copy of a log goes, the name holds
+        the log's size, mtime and parse settings so stale copies never match
+    Inputs
+        path (str)
+        kwargs:
+            tdict, skiprows- see read_log
+            cache_dir (str)- None puts it next to the log
+    Returns
+        sidecar (str)
+    """
+    stat = os.stat(path)
+    key = hashlib.md5(repr((stat.st_size,stat.st_mtime_ns,
+                            kwargs.get('skiprows',1),
+                            sorted(kwargs.get('tdict',LOG_TIME).items()))
+                           ).encode()).hexdigest()[0:12]
+    folder = kwargs.get('cache_dir') or os.path.dirname(os.path.abspath(path))
+    return os.path.join(folder,'.'+os.path.basename(path)+'.'+key+
+                               ('.feather' if feather else '.pkl'))
+
+def _load(cachefile):
+    if feather is not None:
+        df = feather.read_table(cachefile,memory_map=True).to_pandas()
+        return df.set_index('Time [UTC]')
+    return pd.read_pickle(cachefile)
+
+def _save(cachefile, df):
+    # Older copies of the same log are cleared, written tmp first so two
+    #  workers reading the same log never see half a file
+    prefix, key, ext = cachefile.rsplit('.',2)
+    for old in glob.glob(prefix+'.*.'+ext):
+        if old!=cachefile:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    tmp = cachefile+'.'+str(os.getpid())
+    if feather is not None:
+        feather.write_feather(df.reset_index(),tmp,
+                              compression='uncompressed')
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp,cachefile)
+
+def read_log(path, **kwargs):
+    """Function reads an SWMF log into a DataFrame, from the binary sidecar
+        when the log hasn't changed since it was written
+    Inputs
+        path (str)
+        kwargs:
+            tdict (dict)- LOG_TIME, IMF_TIME for IMF.dat
+            skiprows (int or list[int])- 1, IMF_SKIPROWS for IMF.dat
+            cache (bool)- True, False always parses the text and writes no
+                          sidecar
+            cache_dir (str)- None, see sidecar
+    Returns
+        df (DataFrame)- index 'Time [UTC]', time and 'it' columns dropped
+    """
+    tdict = kwargs.get('tdict',LOG_TIME)
+    skiprows = kwargs.get('skiprows',1)
+    if not kwargs.get('cache',True):
+        return _parse(path,tdict,skiprows)
+    if kwargs.get('cache_dir') is not None:
+        os.makedirs(kwargs.get('cache_dir'),exist_ok=True)
+    cachefile = sidecar(path,tdict=tdict,skiprows=skiprows,
+                        cache_dir=kwargs.get('cache_dir'))
+    if os.path.exists(cachefile):
+        try:
+            return _load(cachefile)
+        except Exception as err:
+            warnings.warn(f'rereading {path}, bad cache {cachefile}: {err}')
+    df = _parse(path,tdict,skiprows)
+    try:
+        _save(cachefile,df)
+    except OSError as err:
+        warnings.warn(f'no cache written for {path}: {err}')
+    return df
+
+def imf_coordsys(path):
+    """Function gives the coordinate system an IMF.dat file is written in
+        from its #COORDINATES block, w/o reading the data
+    Inputs
+        path (str)
+    Returns
+        coordsys (str)- eg. 'GSM' (the SWMF default if not given)
+    """
+    with open(path,'r') as f:
+        for line in f:
+            if line.startswith('#COORDINATES'):
+                return next(f).split()[0]
+            if line.startswith('#START'):
+                break
+    return 'GSM'
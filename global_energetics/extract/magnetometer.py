@@ -9,7 +9,9 @@ import numpy as np
 from numpy import (sin,cos,deg2rad,pi)
 import datetime as dt
 import pandas as pd
-from geopack import geopack as gp
+#interpackage modules
+from global_energetics.extract import idl_reader
+from global_energetics.extract import transforms
 
 def sph_to_cart(radius, lat, lon):
     """Function converts spherical coordinates to cartesian coordinates
@@ -298,131 +300,158 @@ def read_station_values(data_path,station_df,now):
     return station_df
 #Function that calculates RSD index
 #Function that projects value from XYZ_gsm into domain
-def read_virtual_SML(datafile):
+def read_virtual_SML(datafile,**kwargs):
     """Function takes 'output.mag' output from SWMF (virtual magnetometers)
-        and calculates the lowest dBn for a comparison to supermag SML
+        and calculates the lowest dBn for a comparison to supermag SML, all
+        times are reduced at once from a (time,station) array
     Inputs
         datafile (str)
+        kwargs:
+            station_file (str)- 'stations.loc', see read_station_locations
+            band (tuple)- (maglat_min,maglat_max) stations used, default all
+            regions (dict)- {name:(mltmin,mltmax)} MLT sectors (hours) inside
+                            band, wraps if mltmin>mltmax, gives <name>L/U
     Returns
-        vsmldata (DataFrame)
+        vsmldata (DataFrame)- vSML, station, mLat, mLon (MLT shift [hr]) of
+                              the minimum station, vSMU and vSME=vSMU-vSML
     """
-    vsmldata = pd.DataFrame(columns=['vSML','station','mLat','mLon'])
     # Read in datafile
     with open(datafile,'r') as f:
         station_ids = f.readline()
         station_ids = station_ids.replace('\n','').split(' ')
     results = pd.read_csv(datafile,sep='\s+',skiprows=[0])
-    # Parse a datetime entry and set to the DataFrame index
-    results.index = [dt.datetime(*t) for t in
-                    results[['year','mo','dy','hr','mn','sc']].values]
-    # Extract unique set up of timesteps
-    timelist = results.index.unique()
-    # Iterate through each timestep
-    for timestamp in timelist:
-        # Get station location in GSM
-        locations = where_stations_now(timestamp)
-        # ID the minimum dBn
-        dBn_minimum = results.loc[timestamp,'dBn'].min()
-        # Update the output DataFrame
-        vsmldata.loc[timestamp,'vSML'] = dBn_minimum
-        # Calculate the id, lat, and lon of the winning station
-        station_num = results.loc[timestamp,'station'][results.loc[timestamp,
-                                                'dBn']==dBn_minimum].values[0]
-        station = station_ids[station_num-1]
-        vsmldata.loc[timestamp,'station'] = station
-        vsmldata.loc[timestamp,'mLat'] = locations.loc[station,'MAGLAT']
-        vsmldata.loc[timestamp,'mLon'] = locations.loc[station,'MLTshift']
+    # Parse all datetimes at once, then lay dBn out as (time,station)
+    stamps = pd.to_datetime(results[['year','mo','dy','hr','mn','sc']].rename(
+                    columns={'mo':'month','dy':'day',
+                             'hr':'hour','mn':'minute','sc':'second'}))
+    itime, timelist = pd.factorize(stamps,sort=True)
+    dBn = np.full([len(timelist),len(station_ids)],np.nan)
+    dBn[itime,results['station'].values-1] = results['dBn'].values
+    # Station table is read once, MLT is a broadcast over time
+    stations = read_station_locations(file_in=kwargs.get('station_file',
+                                                         'stations.loc'))
+    stations = stations.reindex(station_ids)
+    mltshift = stations['MAGLON'].values*12/180
+    ut = (timelist.hour+timelist.minute/60+timelist.second/3600).values
+    mlt = (mltshift[None,:]+ut[:,None])%24
+    maglat = stations['MAGLAT'].values
+    inband = np.ones(len(station_ids),dtype=bool)
+    if 'band' in kwargs:
+        inband = (maglat>=kwargs['band'][0])&(maglat<=kwargs['band'][1])
+    # ID the minimum dBn and the winning station
+    valid = ~np.isnan(dBn)&inband
+    imin = np.argmin(np.where(valid,dBn,np.inf),axis=1)
+    vsmldata = pd.DataFrame(index=timelist)
+    vsmldata['vSML'],vsmldata['vSMU'] = _band_extreme(dBn,valid)
+    vsmldata['station'] = np.array(station_ids,dtype=object)[imin]
+    vsmldata['mLat'] = maglat[imin]
+    vsmldata['mLon'] = mltshift[imin]
+    vsmldata.loc[~valid.any(axis=1),['station','mLat','mLon']] = np.nan
+    vsmldata['vSME'] = vsmldata['vSMU']-vsmldata['vSML']
+    for name,(mltmin,mltmax) in kwargs.get('regions',{}).items():
+        insector = (mlt>=mltmin%24)&(mlt<mltmax%24)
+        if mltmin%24>mltmax%24:
+            insector = (mlt>=mltmin%24)|(mlt<mltmax%24)
+        vsmldata[name+'L'],vsmldata[name+'U'] = _band_extreme(dBn,
+                                                            valid&insector)
     return vsmldata
 
 def readgrid(infile,**kwargs):
-    if kwargs.get('type','ascii')=='ascii':
-        with open(infile,'r')as f:
-            title = f.readline()# 1st
-            simtime_string = f.readline()# 2nd
-            grid_info = f.readline()# 3rd
-            nlon,nlat = [int(n) for n in grid_info[0:-1].split()]
-            headers = f.readline()[0:-1].split()
-            grid = np.zeros([nlon*nlat,len(headers)])
-            for k,line in enumerate(f.readlines()):
-                grid[k,:] = [float(n) for n in line[0:-1].split()]
-    elif kwargs.get('type')=='real4':
-        from spacepy import pybats as bats# Well use the IDLreader from spacepy
-        f = bats.IdlFile(infile)
-        title = f.attrs['header'].split('  ')[0]
-        simtime_string = f.attrs['times'][0]
-        nlon,nlat = np.array(f['grid'])
-        headers = [k for k in f.keys() if 'grid' not in k]
-        grid = np.zeros([nlon*nlat,len(headers)])
-        for i,key in enumerate(headers):
-            if key=='Lat':
-                grid[:,i] = np.array([f['Lon']]*len(f['Lat'])).flatten()
-            elif key=='Lon':
-                grid[:,i] = np.array([[lat]*len(f['Lon'])
-                                         for lat in f['Lat']]).flatten()
-            else:
-                grid[:,i] = f[key].flatten()
-    return grid,headers
+    return idl_reader.read_maggrid(infile,**kwargs)
+
+def geo2gsm_matrices(times):
+    """Function builds the GEO->GSM rotation for every time at once, so
+        whole grids can be rotated w one einsum, see transforms
+    Inputs
+        times (list[datetime])
+    Returns
+        T (arr[float])- (ntimes,3,3), xyz_gsm = T[i] @ xyz_geo
+    """
+    return transforms.matrices(times,'GEO','GSM')
+
+def _band_extreme(dB, mask):
+    """Function gives min and max of dB (time,points) over mask (points)
+        or (time,points), NaN where the mask is empty
+    """
+    masked = np.where(mask,dB,np.nan)
+    empty = ~np.any(np.broadcast_to(mask,dB.shape),axis=1)
+    masked[empty,0] = 0# only to quiet the all-NaN warning, reset below
+    low, high = np.nanmin(masked,axis=1), np.nanmax(masked,axis=1)
+    low[empty], high[empty] = np.nan, np.nan
+    return low, high
+
+def grid_indices(data, headers, times, **kwargs):
+    """Function calculates ground indices from a whole (time x grid) stack
+        of mag_grid data in one pass
+    Inputs
+        data (arr[float])- (ntimes,...,nvar) eg. read_batch['data']
+        headers (list[str])
+        times (list[datetime])
+        kwargs:
+            band (tuple)- (40,80) LatSm range for vSML/vSMU
+            regions (dict)- {name:(latmin,latmax,lonmin,lonmax)} in
+                            LatSm/LonSm deg, lon range wraps if lonmin>lonmax,
+                            gives <name>L (min dBn) and <name>U (max dBn)
+    Returns
+        indices (DataFrame)- MGL columns (dBmin, location and parts at the
+                             grid minimum), vSML, vSMU, and any regions
+    """
+    data = data.reshape(len(times),-1,len(headers))
+    col = {name:data[:,:,i] for i,name in enumerate(headers)}
+    dBn = col['dBn']
+    rows = np.arange(len(times))
+    imin = np.argmin(dBn,axis=1)
+    indices = pd.DataFrame(index=times)
+    indices['dBmin'] = dBn[rows,imin]
+    indices['geoLat'] = col['Lat'][rows,imin]
+    indices['geoLon'] = col['Lon'][rows,imin]
+    indices['smLat'] = col['LatSm'][rows,imin]
+    indices['smLon'] = col['LonSm'][rows,imin]%360
+    xyz_geo = np.array(sph_to_cart(1,indices['geoLat'].values,
+                                     indices['geoLon'].values)).T
+    xyz_gsm = np.einsum('tij,tj->ti',geo2gsm_matrices(times),xyz_geo)
+    indices['gsmX'],indices['gsmY'],indices['gsmZ'] = xyz_gsm.T
+    for key,name in [['dBMhd','dBnMhd'],['dBFac','dBnFac'],
+                     ['dBPed','dBnPed'],['dBHal','dBnHal']]:
+        indices[key] = col[name][rows,imin]
+    latmin,latmax = kwargs.get('band',(40,80))
+    lat, lon = col['LatSm'], col['LonSm']%360
+    indices['vSML'],indices['vSMU'] = _band_extreme(dBn,(lat>=latmin)&
+                                                         (lat<=latmax))
+    for name,(latmin,latmax,lonmin,lonmax) in kwargs.get('regions',{}
+                                                         ).items():
+        inlon = (lon>=lonmin%360)&(lon<=lonmax%360)
+        if lonmin%360>lonmax%360:
+            inlon = (lon>=lonmin%360)|(lon<=lonmax%360)
+        indices[name+'L'],indices[name+'U'] = _band_extreme(dBn,inlon&
+                                                    (lat>=latmin)&(lat<=latmax))
+    return indices
 
 def read_MGL(datapath,**kwargs):
     """Function calculates 'MGL' index using the minimum dB from the whole
-    set of mag_grid files located at the provided path
+    set of mag_grid files located at the provided path, files are read in
+    parallel and every index comes from the same stacked array
     Inputs
         datapath
         kwargs:
-            fileheader
+            filehead (str)- 'mag_grid_'
+            type (str)- 'ascii' or 'real4', see idl_reader.read_maggrid
+            nworkers (int)- processes used to read, see read_batch
+            band, regions- see grid_indices
     Returns
-        MGL
+        MGL (DataFrame)- see grid_indices
     """
-    from global_energetics.makevideo import get_time
     # Check that files are present
-    filelist = glob.glob(os.path.join(datapath,
-                                  kwargs.get('filehead','mag_grid_')+'*.out'))
-    t0 = dt.datetime(1970,1,1)
-    # Initialize dataframe and arrays
-    MGL    = pd.DataFrame()
-    dBmin  = np.zeros([len(filelist)])
-    geoLat = np.zeros([len(filelist)])
-    geoLon = np.zeros([len(filelist)])
-    smLat  = np.zeros([len(filelist)])
-    smLon  = np.zeros([len(filelist)])
-    gsmX   = np.zeros([len(filelist)])
-    gsmY   = np.zeros([len(filelist)])
-    gsmZ   = np.zeros([len(filelist)])
-    dBMhd  = np.zeros([len(filelist)])
-    dBFac  = np.zeros([len(filelist)])
-    dBPed  = np.zeros([len(filelist)])
-    dBHal  = np.zeros([len(filelist)])
-    times  = np.zeros([len(filelist)],dtype='object')
-    for i,infile in enumerate(filelist):
-        print('reading: ',infile)
-        ftime = get_time(infile)
-        ut = (ftime-t0).total_seconds()
-        gp.recalc(ut)
-        grid,headers = readgrid(infile,**kwargs)
-        #grid = pd.read_csv(f,sep='\s+',skiprows=[0,1,2])
-        min_point = np.argmin(grid[:,headers.index('dBn')])
-        dBmin[i] = grid[min_point,headers.index('dBn')]
-        geoLat[i] = grid[min_point,headers.index('Lat')]
-        geoLon[i] = grid[min_point,headers.index('Lon')]
-        smLat[i] = grid[min_point,headers.index('LatSm')]
-        smLon[i] = grid[min_point,headers.index('LonSm')]%360
-        x,y,z = gp.sphcar(1,grid[min_point,headers.index('Lat')],
-                            grid[min_point,headers.index('Lon')],1)
-        gsmX[i],gsmY[i],gsmZ[i] = gp.geogsm(x,y,z,1)
-        dBMhd[i] = grid[min_point,headers.index('dBnMhd')]
-        dBFac[i] = grid[min_point,headers.index('dBnFac')]
-        dBPed[i] = grid[min_point,headers.index('dBnPed')]
-        dBHal[i] = grid[min_point,headers.index('dBnHal')]
-        times[i] = ftime
-    # Gather arrays and sort by time
-    print('sorting...')
-    for key,arr in [['dBmin',dBmin],['geoLat',geoLat],['geoLon',geoLon],
-                    ['smLat',smLat],['smLon',smLon],
-                    ['gsmX',gsmX],['gsmY',gsmY],['gsmZ',gsmZ],
-                    ['dBMhd',dBMhd],['dBFac',dBFac],
-                    ['dBPed',dBPed],['dBHal',dBHal]]:
-        MGL[key] = arr
-    MGL.index = times
+    filelist = sorted(glob.glob(os.path.join(datapath,
+                                  kwargs.get('filehead','mag_grid_')+'*.out')))
+    print(f'reading {len(filelist)} files from {datapath}')
+    batch = idl_reader.read_batch(filelist,kind='maggrid',
+                                  type=kwargs.get('type','ascii'),
+                                  nworkers=kwargs.get('nworkers',
+                                                      os.cpu_count()))
+    print('calculating indices...')
+    MGL = grid_indices(batch['data'],batch['headers'],batch['times'],
+                       **kwargs)
     MGL.sort_index(inplace=True)
     return MGL
 
@@ -478,11 +507,7 @@ def out_to_tec(filein,**kwargs):
         # Pull title
         titleline1 = f.attrs['header'].split('  ')[0]
         title = f'TITLE="{titleline1}"\n'
-        # Setup geopack for coord transform
         ftime = f.attrs['times'][0]
-        t0 = dt.datetime(1970,1,1)
-        ut = (ftime-t0).total_seconds()
-        gp.recalc(ut)
         # Get the structure from lat/lon numbers
         nlon,nlat = np.array(f['grid'])
         # Create tecplot 'ZONE' line
@@ -507,21 +532,11 @@ def out_to_tec(filein,**kwargs):
             else:
                 grid[:,3+i] = f[key].flatten()
         # Recover xyz because for some reason it's gone?
-        gsmX   = np.zeros([len(grid)])
-        gsmY   = np.zeros([len(grid)])
-        gsmZ   = np.zeros([len(grid)])
-        magX   = np.zeros([len(grid)])
-        magY   = np.zeros([len(grid)])
-        magZ   = np.zeros([len(grid)])
-        for i,(lat,lon) in enumerate(zip(grid[:,headers.index('LatSm')+3],
-                                         grid[:,headers.index('LonSm')+3])):
-            #x,y,z = gp.sphcar(1,np.deg2rad(lat+90),np.deg2rad(lon),1)
-            x = 1*np.sin(np.deg2rad(lat+90))*np.cos(np.deg2rad(lon))
-            y = 1*np.sin(np.deg2rad(lat+90))*np.sin(np.deg2rad(lon))
-            z = 1*np.cos(np.deg2rad(lat+90))
-            magX,magY,magZ = gp.magsm(x,y,z,-1)
-            geoX,geoY,geoZ = gp.geomag(magX,magY,magZ,-1)
-            gsmX[i],gsmY[i],gsmZ[i] = gp.geogsm(geoX,geoY,geoZ,1)
+        lat = np.deg2rad(grid[:,headers.index('LatSm')+3]+90)
+        lon = np.deg2rad(grid[:,headers.index('LonSm')+3])
+        xyz_sm = np.stack([np.sin(lat)*np.cos(lon),np.sin(lat)*np.sin(lon),
+                           np.cos(lat)],axis=1)
+        gsmX,gsmY,gsmZ = transforms.transform(xyz_sm,ftime,'SM','GSM').T
         from IPython import embed; embed()
         headers.insert(0,'X')
         headers.insert(1,'Y')
@@ -3,6 +3,7 @@
 """
 import logging as log
 import os,sys,time,warnings
+import itertools
 import numpy as np
 from numpy import abs, pi, cos, sin, sqrt, rad2deg, deg2rad, linspace
 import datetime as dt
@@ -15,7 +16,8 @@ from global_energetics.extract import swmf_access
 from global_energetics.extract import line_tools
 from global_energetics.extract import surface_tools
 from global_energetics.extract.surface_tools import post_proc_interface2
-from global_energetics.extract.volume_tools import volume_analysis
+from global_energetics.extract.volume_tools import (volume_analysis,
+                                                    np_sweep_integrals)
 from global_energetics.extract.mapping import reversed_mapping
 from global_energetics.extract.tec_tools import (streamfind_bisection,
                                                     get_global_variables,
@@ -28,7 +30,8 @@ from global_energetics.extract.tec_tools import (streamfind_bisection,
                                                     get_1D_sw_variables,
                                              get_surfaceshear_variables)
 from global_energetics.write_disp import (write_mesh, write_to_hdf,
-                                          display_progress)
+                                          append_to_store, display_progress)
+from global_energetics import telemetry
 
 def todimensional(dataset, **kwargs):
     """Function modifies dimensionless variables -> dimensional variables
@@ -185,6 +188,7 @@ def show_settings(**kwargs):
     for arg in kwargs:
         display = display+'\t\t'+arg+'+: {}\n'.format(kwargs[arg])
 
+@telemetry.traced()
 def prep_field_data(field_data, **kwargs):
     """Function modifies global field data before 3D objects are ID'd
     Inputs
@@ -275,7 +279,10 @@ def prep_field_data(field_data, **kwargs):
                 field_data.zone('global_field').values('trueCellVolume')[::]=(
                                      target['trueVolume'].sort_index().values)
     #set frame name and calculate global variables
-    if 'r [R]' not in field_data.variable_names:
+    #   sliding_window snapshots come w most of them already derived, so
+    #   only the missing ones are added
+    derived = 'r [R]' in field_data.variable_names
+    if not derived or kwargs.get('window',False):
         main_frame = tp.active_frame()
         print('Calculating global energetic variables')
         main_frame.name = 'main'
@@ -283,7 +290,10 @@ def prep_field_data(field_data, **kwargs):
                              modes=kwargs.get('modes',[]),
                              verbose=kwargs.get('verbose',False),
                              customTerms=kwargs.get('customTerms',{}),
-                            do_interfacing=kwargs.get('do_interfacing',False))
+                            do_interfacing=kwargs.get('do_interfacing',False),
+                             useNumpy=kwargs.get('useNumpy',False),
+                        geometry_cache=kwargs.get('geometry_cache',False),
+                             skip_existing=derived)
         if do_1Dsw or 'bs' in kwargs.get('modes',[]):
             print('Calculating 1D "pristine" Solar Wind variables')
             get_1D_sw_variables(field_data, 30, -30, 121)
@@ -389,6 +399,7 @@ def prep_field_data(field_data, **kwargs):
             reversed_mapping(field_data.zone('future'),'trace_limits',**kwargs)
     return aux, closed_zone
 
+@telemetry.traced()
 def generate_3Dobj(sourcezone, **kwargs):
     """Creates isosurface zone depending on mode setting
     Inputs
@@ -482,6 +493,7 @@ def generate_3Dobj(sourcezone, **kwargs):
     return kwargs #NOTE variable return based on what zones are made!
 
 
+@telemetry.traced()
 def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
     """Function that finds, plots and calculates quantities on
         magnetospheric regions
@@ -501,6 +513,20 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
             integrate_surface, integrate_volume- booleans for analysis
             save_mesh, write_data, disp_result- booleans
             verbose- boolean
+            useNumpy- evaluate nodal equations w numpy instead of tecplot
+            geometry_cache- True or folder to reuse grid geometry between
+                            outputs, see tec_tools.load_geometry
+            window- True if field_data came from sliding_window.to_tecplot,
+                    globals it already has aren't recalculated
+            store- if given, results are appended to this single .h5 run
+                   store instead of one file per snapshot
+            store_queue- if given, results are put on the queue of
+                         write_disp.start_store_writer (parallel runs)
+            store_source- file being analyzed, sent w the results so a
+                          failed write can be marked in the run manifest
+            iso_engine- 'tecplot' (default) or 'numpy', which one extracts
+                        the isosurfaces, see isosurface.py
+            prep- (aux, closed_zone) from prep_field_data to skip it
 
         Types of Surfaces:
         *Betastar magnetopause (iso_betastar mode)
@@ -601,7 +627,11 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
         itr_max = kwargs.get('itr_max', 100)
         tol = kwargs.get('tol', 0.1)
     #prepare field data
-    aux, closed_zone = prep_field_data(field_data,**kwargs)
+    if 'prep' in kwargs:
+        #already done for this data, eg. by sweep_magnetosphere
+        aux, closed_zone = kwargs.pop('prep')
+    else:
+        aux, closed_zone = prep_field_data(field_data,**kwargs)
     #timestamp
     ltime = time.time()-start_time
     print('PREP:--- {:d}min {:.2f}s ---'.format(int(ltime/60),
@@ -635,7 +665,9 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
         for zone in zonelist:
             #integrate power on created surface
             print('\nWorking on: '+zone.name+' surface')
-            surf_results,dists = surface_tools.surface_analysis(zone,**kwargs)
+            with telemetry.span('surface_analysis',zone=zone.name):
+                surf_results,dists = surface_tools.surface_analysis(zone,
+                                                                    **kwargs)
             if ('mp_' in zone.name) and ('inner' not in zone.name):
                 #Add x_subsolar
                 surf_results['X_subsolar [Re]'] = float(aux['x_subsolar'])
@@ -716,8 +748,9 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
             if 'Br 'not in state:
                 region = zonelist[i]
                 print('\nWorking on: '+region.name+' volume')
-                energies = volume_analysis(field_data.variable(state),
-                                           **kwargs)
+                with telemetry.span('volume_analysis',zone=region.name):
+                    energies = volume_analysis(field_data.variable(state),
+                                               **kwargs)
                 '''
                 if kwargs.get('do_central_diff',False):
                     # Drop the non-motional terms
@@ -841,8 +874,15 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
                                             eventtime.year,eventtime.month,
                                             eventtime.day,eventtime.hour,
                                             eventtime.minute,eventtime.second))
-        write_to_hdf(outputpath+'/energeticsdata/GM/energetics_'+
-                        datestring+'.h5', data_to_write)
+        with telemetry.span('write',keys=len(data_to_write)):
+            if kwargs.get('store_queue') is not None:
+                kwargs.get('store_queue').put((kwargs.get('store_source'),
+                                               data_to_write))
+            elif kwargs.get('store') is not None:
+                append_to_store(kwargs.get('store'), data_to_write)
+            else:
+                write_to_hdf(outputpath+'/energeticsdata/GM/energetics_'+
+                            datestring+'.h5', data_to_write)
         if kwargs.get('save_surface_flux_dist',False):
             write_to_hdf(outputpath+'/fluxdistribution/GM/fluxdistribution__'+
                          datestring+'.h5', distribution_data)
@@ -859,5 +899,101 @@ def get_magnetosphere(field_data, *, mode='iso_betastar', **kwargs):
                                            np.mod(ltime,60)))
     return mp_mesh, data_to_write
 
+#kwargs that change what prep_field_data finds (closed region, mapping)
+PREP_KEYS = ['tail_cap','inner_r','lshelllim']
+
+def sweep_magnetosphere(field_data, *, sweep, **kwargs):
+    """Function runs get_magnetosphere for every combination of thresholds
+        on one dataset, global variables are found once, prep_field_data
+        once per PREP_KEYS combination, and only the states/surfaces made
+        for each combination are rebuilt
+    Inputs
+        field_data- tecplot DataSet object with 3D field data
+        sweep (dict{str:list})- kwarg:values, eg. {'mpbetastar':[0.5,0.7]}
+        kwargs:
+            see get_magnetosphere, write_data and outputpath are applied
+            to the combined results, written to
+            outputpath/sweepdata/sweep_<time>.h5
+    Returns
+        results (dict{str:DataFrame})- same keys as get_magnetosphere w one
+                                       row per combination, swept values
+                                       added as columns
+    """
+    keys = ([k for k in PREP_KEYS if k in sweep]+
+            [k for k in sweep if k not in PREP_KEYS])
+    combos = [dict(zip(keys,values)) for values in
+              itertools.product(*[sweep[k] for k in keys])]
+    #Volume terms of every state are done together at the end if possible
+    np_volume = ('truegridfile' in kwargs and
+                 kwargs.get('integrate_volume',True) and
+                 not kwargs.get('do_cms',False) and
+                 not kwargs.get('do_interfacing',False))
+    settings = dict(kwargs,write_data=False)
+    if np_volume:
+        settings['integrate_volume'] = False
+    _,eventtime,_ = validate_preproc(field_data,
+                                     kwargs.get('mode','iso_betastar'),
+                                     kwargs.get('source','swmf'),
+                                     kwargs.get('outputpath','output/'),
+                                     kwargs.get('do_cms',False),
+                                     kwargs.get('verbose',True),
+                                     kwargs.get('do_trace',False),
+                                     kwargs.get('tshift',0))
+    globalzone = field_data.zone('global_field')
+    rows, masks, prepped = {}, {}, None
+    for combo in combos:
+        run = dict(settings,**combo)
+        prepkey = tuple(combo.get(k) for k in PREP_KEYS)
+        if prepkey!=prepped:
+            if prepped is not None:
+                #closed region depends on these, have prep find it again
+                aux = globalzone.aux_data
+                for key in ['x_subsolar','x_nexl','inner_l']:
+                    if key in aux:
+                        del aux[key]
+                field_data.delete_zones([z for z in
+                                         field_data.zones('*lcb*')])
+            prep = prep_field_data(field_data,**run)
+            prepped = prepkey
+            nzones = field_data.num_zones
+            nvars = field_data.num_variables
+        with telemetry.span('sweep_point',**combo):
+            mesh,data = get_magnetosphere(field_data,**run,prep=prep)
+        for key,df in data.items():
+            rows.setdefault(key,[]).append(df.assign(**combo))
+        newzones = [field_data.zone(i) for i in range(nzones,
+                                                      field_data.num_zones)]
+        newvars = [field_data.variable(i) for i in range(nvars,
+                                                 field_data.num_variables)]
+        if np_volume:
+            for zone in newzones:
+                if (zone.name in field_data.variable_names and
+                    'inner' not in zone.name):
+                    masks.setdefault(zone.name,[]).append((combo,
+                        globalzone.values(zone.name).as_numpy_array()==1))
+        #Only these differ between combinations, clear them for the next
+        field_data.delete_zones(newzones)
+        if newvars!=[]:
+            field_data.delete_variables(newvars)
+    for name,regions in masks.items():
+        with telemetry.span('sweep_volume',zone=name,n=len(regions)):
+            volumes = np_sweep_integrals(globalzone,
+                                         np.array([m for _,m in regions]),
+                                 analysis_type=kwargs.get('analysis_type',
+                                                          'energy'))
+        for (combo,_),energies in zip(regions,volumes):
+            energies['Time [UTC]'] = eventtime
+            rows.setdefault(name+'_volume',[]).append(energies.assign(**combo))
+    results = {key:pd.concat(dfs,ignore_index=True)
+               for key,dfs in rows.items()}
+    if kwargs.get('write_data',True) and results!={}:
+        #Kept out of energeticsdata/GM so it never joins the per snapshot
+        # run store, see multiproc_main cleanup
+        eventtime = pd.Timestamp(eventtime)
+        write_to_hdf(kwargs.get('outputpath','output/')+
+                     '/sweepdata/sweep_'+
+                     eventtime.strftime('%Y%m%d_%H%M%S')+'.h5',results)
+    return results
+
 if __name__ == "__main__":
     pass#TODO could make this a simple (!and fast) test function...
@@ -26,7 +26,8 @@ from global_energetics.extract.tec_tools import (integrate_tecplot,mag2gsm,
 from global_energetics.extract.equations import (get_dipole_field)
 from global_energetics.extract import line_tools
 from global_energetics.extract import surface_tools
-from global_energetics.extract.shared_tools import check_bin
+from global_energetics.extract.shared_tools import (check_bin,
+                                                    check_bin_subset)
 
 '''MOVED TO SHAREDTOOLS
 def check_bin(x,theta_1,phi_1,inbin,state):
@@ -72,68 +73,70 @@ def check_bin(x,theta_1,phi_1,inbin,state):
         contested = True
     return quadbins, contested
 '''
-#@jit(forceobj=True, looplift=True)
 def calc_map(state,ntheta,nphi,x,theta_1,phi_1,daynight):
+    """Function sets daynight (+1/-1) for each closed cell based on the
+        mean X of the cells that map to the same theta/phi footpoint bin
+    Inputs
+        state (arr[float] or 1)- only cells ==1 are classified
+        ntheta, nphi (int)- number of coarse bin edges
+        x (arr[float])- volume weighted X
+        theta_1, phi_1 (arr[float])- footpoint of each cell
+        daynight (arr[float])- updated in place
+    Return
+        daynight
+    """
     # Create an initial set of coarse bins
     theta_bins = np.linspace(0,90,ntheta)
     phi_bins = np.linspace(0,360,nphi)
-    k=0
+    # Sort candidate cells by theta once, then each theta row by phi, so
+    #  every bin is a contiguous slice instead of a full length mask
+    cells = np.flatnonzero(np.broadcast_to(state==1,theta_1.shape))
+    cells = cells[np.argsort(theta_1[cells],kind='stable')]
+    sorted_theta = theta_1[cells]
+    rows = {}
     # Iterate through each bin
     for i,thHigh in enumerate(theta_bins[1::]):
         for j,phHigh in enumerate(phi_bins[1::]):
             thLow = theta_bins[i-1]
             phLow = phi_bins[j-1]
-            inbins = ((state==1)&
-                      (theta_1<thHigh)&
-                      (theta_1>thLow)&
-                      (phi_1<phHigh)&
-                      (phi_1>phLow))
-            if np.any(inbins):
+            if (thLow,thHigh) not in rows:
+                row = cells[np.searchsorted(sorted_theta,thLow,side='right'):
+                            np.searchsorted(sorted_theta,thHigh,side='left')]
+                row = row[np.argsort(phi_1[row],kind='stable')]
+                rows[(thLow,thHigh)] = (row,phi_1[row])
+            row, row_phi = rows[(thLow,thHigh)]
+            # Back in index order so means match a masked selection
+            inbins = np.sort(row[np.searchsorted(row_phi,phLow,side='right'):
+                                 np.searchsorted(row_phi,phHigh,side='left')])
+            if len(inbins)>0:
                 # Subdivide bin until 4 subquadrants agree
                 finished_bins = []
                 contested_bins = [inbins]
+                #NOTE i is reused as the while counter, this moves thLow for
+                #     the rest of the row, kept so daynight doesn't change
                 i=0
                 while len(contested_bins)>0:
                     i+=1
                     old_contested_bins = contested_bins
                     contested_bins = []
                     for b in old_contested_bins:
-                        qs, contested = check_bin(x,theta_1,phi_1,b,state)
+                        qs, contested = check_bin_subset(x,theta_1,phi_1,b)
                         if not contested:
                             finished_bins.append(b)
                         else:
                             for q in qs:
                                 contested_bins.append(q)
-                    #if i>1 and kwargs.get('verbose',False):
-                    #    print(i)
                     if i>5:
                         for q in qs:
                             finished_bins.append(q)
                         contested_bins = []
                 # Now actually set the values using the finished_bin list
                 for inbin in finished_bins:
-                    dayside,nightside,split = 0,0,False
-                    k+=1
-                    #if kwargs.get('debug',False):
-                    #    mapID[inbins] = k
-                    if x[inbin].mean()>0:
-                        dayside = 1
-                    if x[inbin].mean()<0:
-                        nightside = 1
-                    if dayside*nightside>0:
-                        split = True
-                    if not split:
-                        if dayside:
-                            daynight[inbin] = 1
-                        elif nightside:
-                            daynight[inbin] = -1
-                    else:
-                        daynight[inbins] = -999
-                    #if kwargs.get('verbose',False):
-                    #    print(k,thLow,thHigh,
-                    #      phLow,phHigh,
-                    #      x[inbins].min(),x[inbins].max(),
-                    #      '\tday:',dayside,'\tnight:',nightside)
+                    mean = x[inbin].mean()
+                    if mean>0:
+                        daynight[inbin] = 1
+                    elif mean<0:
+                        daynight[inbin] = -1
     return daynight
 
 def reversed_mapping(gmzone,state_var,**kwargs):
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for evaluating the tecplot style
+    equation strings from equations.py over in memory numpy arrays
+"""
+import re
+import warnings
+import numpy as np
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+#interpackage modules
+from global_energetics.extract.equations import equations
+
+#Tecplot function name -> (numpy name, numexpr name or None if unsupported)
+FUNCTIONS = {'sqrt':('np.sqrt','sqrt'),
+             'sin':('np.sin','sin'),
+             'cos':('np.cos','cos'),
+             'tan':('np.tan','tan'),
+             'asin':('np.arcsin','arcsin'),
+             'acos':('np.arccos','arccos'),
+             'atan':('np.arctan','arctan'),
+             'atan2':('np.arctan2','arctan2'),
+             'abs':('np.abs','abs'),
+             'exp':('np.exp','exp'),
+             'log':('np.log','log'),
+             'ln':('np.log','log'),
+             'alog':('np.log','log'),
+             'log10':('np.log10','log10'),
+             'alog10':('np.log10','log10'),
+             'floor':('np.floor',None),
+             'ceil':('np.ceil',None),
+             'trunc':('np.trunc',None),
+             'sign':('np.sign',None),
+             'max':('np.maximum',None),
+             'min':('np.minimum',None)}
+CONSTANTS = {'pi':repr(np.pi)}
+#Derivative functions need the grid, these stay on the tecplot side
+UNSUPPORTED = ['ddx','ddy','ddz']
+
+TOKEN = re.compile(r'''\s*(?:
+                    (?P<var>\{[^}]*\})(?:\[(?P<zone>\d+)\])?|
+                    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|
+                    (?P<name>[A-Za-z_][A-Za-z_0-9]*)|
+                    (?P<op>\*\*|==|!=|<=|>=|&&|\|\||[-+*/^()<>,!])
+                    )''', re.VERBOSE)
+
+def tokenize(expr):
+    """Function splits a tecplot equation string into tokens
+    Inputs
+        expr (str)- eg. '{Rho [amu/cm^3]}*sqrt({U_x [km/s]}**2)'
+    Returns
+        tokens (list[tuple])- (kind,value,zone)
+    """
+    tokens, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = TOKEN.match(expr,pos)
+        if match is None or match.end()==pos:
+            raise SyntaxError('cannot parse "'+expr[pos::]+'" in '+expr)
+        kind = match.lastgroup if match.lastgroup!='zone' else 'var'
+        if match.group('var'):
+            zone = match.group('zone')
+            tokens.append(('var',match.group('var')[1:-1].strip(),
+                           int(zone) if zone else None))
+        else:
+            tokens.append((kind,match.group(kind),None))
+        pos = match.end()
+    return tokens
+
+def parse(expr, *, backend='numpy'):
+    """Function parses tecplot equation syntax into a python expression
+    Inputs
+        expr (str)- right hand side of a tecplot equation
+        backend (str)- 'numpy' or 'numexpr'
+    Returns
+        source (str)- python/numexpr source using placeholders v0,v1...
+        refs (list[tuple])- (variable name, zone number or None) for each vN
+    """
+    state = {'tokens':tokenize(expr),'pos':0,'refs':[],'backend':backend,
+             'expr':expr}
+    source,_ = _parse_or(state)
+    if state['pos']!=len(state['tokens']):
+        raise SyntaxError('unexpected "'+str(_peek(state)[1])+'" in '+expr)
+    return source, state['refs']
+
+def _peek(state):
+    if state['pos']<len(state['tokens']):
+        return state['tokens'][state['pos']]
+    return (None,None,None)
+
+def _take(state,value=None):
+    token = _peek(state)
+    if value is not None and token[1]!=value:
+        raise SyntaxError('expected "'+value+'" in '+state['expr'])
+    state['pos']+=1
+    return token
+
+def _as_bool(node,state):
+    """Function makes sure an operand is boolean for logical operators
+    """
+    source,is_bool = node
+    return source if is_bool else '('+source+'!=0)'
+
+def _parse_or(state):
+    left = _parse_and(state)
+    while _peek(state)[1]=='||':
+        _take(state)
+        right = _parse_and(state)
+        if state['backend']=='numpy':
+            left = ('np.logical_or('+_as_bool(left,state)+','+
+                                     _as_bool(right,state)+')',True)
+        else:
+            left = ('('+_as_bool(left,state)+'|'+
+                        _as_bool(right,state)+')',True)
+    return left
+
+def _parse_and(state):
+    left = _parse_cmp(state)
+    while _peek(state)[1]=='&&':
+        _take(state)
+        right = _parse_cmp(state)
+        if state['backend']=='numpy':
+            left = ('np.logical_and('+_as_bool(left,state)+','+
+                                      _as_bool(right,state)+')',True)
+        else:
+            left = ('('+_as_bool(left,state)+'&'+
+                        _as_bool(right,state)+')',True)
+    return left
+
+def _parse_cmp(state):
+    left = _parse_add(state)
+    while _peek(state)[1] in ['==','!=','<','>','<=','>=']:
+        op = _take(state)[1]
+        right = _parse_add(state)
+        left = ('('+left[0]+op+right[0]+')',True)
+    return left
+
+def _parse_add(state):
+    left = _parse_mul(state)
+    while _peek(state)[1] in ['+','-']:
+        op = _take(state)[1]
+        right = _parse_mul(state)
+        left = ('('+left[0]+op+right[0]+')',False)
+    return left
+
+def _parse_mul(state):
+    left = _parse_unary(state)
+    while _peek(state)[1] in ['*','/']:
+        op = _take(state)[1]
+        right = _parse_unary(state)
+        left = ('('+left[0]+op+right[0]+')',False)
+    return left
+
+def _parse_unary(state):
+    op = _peek(state)[1]
+    if op in ['-','+']:
+        _take(state)
+        operand = _parse_unary(state)
+        return ('('+op+operand[0]+')',False)
+    if op=='!':
+        _take(state)
+        operand = _parse_unary(state)
+        if state['backend']=='numpy':
+            return ('np.logical_not('+_as_bool(operand,state)+')',True)
+        return ('(~'+_as_bool(operand,state)+')',True)
+    return _parse_power(state)
+
+def _parse_power(state):
+    base = _parse_atom(state)
+    if _peek(state)[1] in ['**','^']:
+        _take(state)
+        exponent = _parse_unary(state)#right associative
+        return ('('+base[0]+'**'+exponent[0]+')',False)
+    return base
+
+def _parse_atom(state):
+    kind,value,zone = _take(state)
+    if kind=='num':
+        return (repr(float(value)),False)
+    if kind=='var':
+        ref = (value,zone)
+        if ref not in state['refs']:
+            state['refs'].append(ref)
+        return ('v'+str(state['refs'].index(ref)),False)
+    if value=='(':
+        node = _parse_or(state)
+        _take(state,')')
+        return ('('+node[0]+')',node[1])
+    if kind=='name':
+        name = value.lower()
+        if _peek(state)[1]!='(':
+            if name in CONSTANTS:
+                return (CONSTANTS[name],False)
+            raise SyntaxError('unknown name "'+value+'" in '+state['expr'])
+        _take(state,'(')
+        args = [_parse_or(state)]
+        while _peek(state)[1]==',':
+            _take(state)
+            args.append(_parse_or(state))
+        _take(state,')')
+        if name=='if':
+            if len(args)!=3:
+                raise SyntaxError('IF takes 3 arguments in '+state['expr'])
+            prefix = 'np.where(' if state['backend']=='numpy' else 'where('
+            return (prefix+_as_bool(args[0],state)+','+args[1][0]+','+
+                                                     args[2][0]+')',False)
+        if name in UNSUPPORTED:
+            raise NotImplementedError(value+'() needs grid derivatives, '+
+                                      'not available in numpy engine')
+        if name not in FUNCTIONS:
+            raise SyntaxError('unknown function "'+value+'" in '+
+                              state['expr'])
+        function = FUNCTIONS[name][0 if state['backend']=='numpy' else 1]
+        if function is None:
+            raise NotImplementedError(value+'() not in numexpr')
+        if name in ['max','min'] and len(args)>2:
+            #fold MAX(a,b,c) -> maximum(maximum(a,b),c)
+            source = args[0][0]
+            for arg in args[1::]:
+                source = function+'('+source+','+arg[0]+')'
+            return (source,False)
+        return (function+'('+','.join([a[0] for a in args])+')',False)
+    raise SyntaxError('unexpected "'+str(value)+'" in '+state['expr'])
+
+def strip_name(lhs):
+    """Function removes tecplot braces from left hand side, '{r [R]}'->'r [R]'
+    """
+    return lhs.strip().strip('{}').strip()
+
+def build_graph(eqsets):
+    """Function builds the dependency graph for a set of equations
+    Inputs
+        eqsets (dict or list[dict])- {lhs:rhs} pairs as in equations()
+    Returns
+        graph (dict{str:dict})- name:{'rhs','source','refs','deps','code'}
+                                 in the same order as given
+    """
+    if type(eqsets)==dict:
+        eqsets = [eqsets]
+    graph = {}
+    for eqset in eqsets:
+        for lhs,rhs in eqset.items():
+            name = strip_name(lhs)
+            node = {'rhs':rhs}
+            try:
+                node['source'],node['refs'] = parse(rhs)
+                node['code'] = compile(node['source'],name,'eval')
+            except NotImplementedError as err:
+                node['source'],node['refs'],node['code'] = None,[],None
+                node['error'] = str(err)
+            #Only same zone references count as dependencies
+            node['deps'] = [r[0] for r in node['refs'] if r[1] is None]
+            try:
+                node['ne_source'],_ = parse(rhs,backend='numexpr')
+            except (NotImplementedError,SyntaxError):
+                node['ne_source'] = None
+            graph[name] = node
+    return graph
+
+def resolve(graph, targets, available):
+    """Function finds the minimum ordered list of equations to evaluate
+    Inputs
+        graph (dict)- from build_graph
+        targets (list[str])- variables wanted
+        available (list[str])- variables already present in the data
+    Returns
+        order (list[str])- evaluation order, dependencies first
+    """
+    order, visiting = [], set()
+    def visit(name):
+        if name in order or (name in available and name not in targets):
+            return
+        if name not in graph:
+            if name in available:
+                return
+            raise KeyError('"'+name+'" is neither in the data nor defined '+
+                           'by an equation')
+        if name in visiting:
+            raise ValueError('circular equation dependency at '+name)
+        visiting.add(name)
+        for dep in graph[name]['deps']:
+            if dep!=name:
+                visit(dep)
+        visiting.discard(name)
+        order.append(name)
+    for target in targets:
+        visit(target)
+    return order
+
+def evaluate(graph, data, *, targets=None, zones=None, use_numexpr=False,
+             **kwargs):
+    """Function evaluates equations over arrays, results are added to data
+    Inputs
+        graph (dict)- from build_graph
+        data (dict{str:ndarray})- variables for the zone, modified in place
+        targets (list[str])- default all lhs in graph, only these and their
+                             dependencies are calculated
+        zones (list[dict])- data for each tecplot zone number (1 based) for
+                            '{var}[n]' style references
+        use_numexpr (bool)- False, use numexpr where it supports the eq
+        kwargs:
+            verbose (bool)
+    Returns
+        data (dict{str:ndarray})
+    """
+    if targets is None:
+        targets = list(graph.keys())
+    targets = [strip_name(t) for t in targets]
+    order = resolve(graph, targets, list(data.keys()))
+    use_numexpr = use_numexpr and numexpr is not None
+    with np.errstate(all='ignore'):
+        for name in order:
+            node = graph[name]
+            if node['code'] is None:
+                raise NotImplementedError(name+': '+node['error'])
+            local = {}
+            for i,(ref,zone) in enumerate(node['refs']):
+                if zone is None:
+                    local['v'+str(i)] = data[ref]
+                else:
+                    if zones is None:
+                        raise KeyError(name+' references zone ['+str(zone)+
+                                       '] but no zones were given')
+                    local['v'+str(i)] = zones[zone-1][ref]
+            if use_numexpr and node['ne_source'] is not None:
+                data[name] = numexpr.evaluate(node['ne_source'],
+                                              local_dict=local)
+            else:
+                data[name] = eval(node['code'],{'np':np},local)
+            if kwargs.get('verbose',False):
+                print('evaluated {'+name+'}')
+    return data
+
+def eqeval(eqset, data, **kwargs):
+    """Function is the numpy counterpart of tec_tools.eqeval
+    Inputs
+        eqset (dict{str:str})- lhs:rhs pairs
+        data (dict{str:ndarray})- modified in place
+        kwargs- see evaluate
+    Returns
+        data
+    """
+    return evaluate(build_graph(eqset), data, **kwargs)
+
+def select_eqsets(analysis_type, **kwargs):
+    """Function picks equation sets the same way get_global_variables does
+    Inputs
+        analysis_type (str)- eg. 'energy_mass_mag'
+        kwargs:
+            is3D (bool)- True
+            modes (list[str])
+            customTerms (dict)
+            add_eqset (list[str])
+            verbose (bool)
+    Returns
+        names (list[str])- keys of equations() to use, in evaluation order
+    """
+    names = []
+    if kwargs.get('verbose',False)or('test'in
+                                     kwargs.get('customTerms',{}).keys()):
+        names.append('interface_testing')
+    if kwargs.get('is3D',True):
+        names += ['basic3d','dipole_coord','dipole']
+    names.append('basic_physics')
+    if ('OCFLB' in analysis_type or analysis_type=='all') and (
+                                                kwargs.get('is3D',True)):
+        names.append('fieldmapping')
+    if 'energy' in analysis_type or analysis_type=='all':
+        names.append('volume_energy')
+    if 'mass' in analysis_type or analysis_type=='all':
+        names.append('volume_mass')
+    if 'virial' in analysis_type or analysis_type=='all':
+        names += ['virial_intermediate','virial_volume_energy']
+    if ('biotsavart' in analysis_type) or analysis_type=='all':
+        names.append('biot_savart')
+    if 'energy' in analysis_type or analysis_type=='all':
+        names.append('energy_flux')
+    if 'wave' in analysis_type or analysis_type=='all':
+        names.append('wave_energy')
+    if 'reconnect' in analysis_type:
+        names.append('reconnect')
+    if 'ffj' in analysis_type:
+        names += ['ffj_setup','ffj']
+    if 'trackIM' in analysis_type:
+        names.append('trackIM')
+    if 'bs' in kwargs.get('modes',[]):
+        names.append('entropy')
+    for name in kwargs.get('add_eqset',[]):
+        if name not in names: names.append(name)
+    return names
+
+def get_global_variables(data, analysis_type, **kwargs):
+    """Function is the numpy counterpart of tec_tools.get_global_variables
+    Inputs
+        data (dict{str:ndarray})- 3D field data, modified in place
+        analysis_type (str)
+        kwargs:
+            aux (dict)- zone aux data, needed for dipole terms
+            targets (list[str])- only compute these (+ dependencies)
+            global_eq (dict)- any extra lhs:rhs pairs
+            zones (list[dict])- other zones for '[n]' references
+            use_numexpr (bool)
+            see select_eqsets
+    Returns
+        data (dict{str:ndarray})
+    """
+    alleq = equations(aux=kwargs.get('aux'),is3D=kwargs.get('is3D',True))
+    eqsets = [alleq[n] for n in select_eqsets(analysis_type,**kwargs)
+              if n in alleq and type(alleq[n])==dict]
+    if 'global_eq' in kwargs:
+        eqsets.append(kwargs.get('global_eq'))
+    #Cell size comes from the grid rather than an equation
+    if 'Cell Size [Re]' not in data and kwargs.get('is3D',True):
+        if 'dvol [R]^3' in data:
+            data['Cell Size [Re]'] = np.cbrt(data['dvol [R]^3'])
+        elif 'Cell Volume' in data:
+            data['Cell Size [Re]'] = np.cbrt(data['Cell Volume'])
+        else:
+            warnings.warn('no cell volume found, Cell Size [Re] skipped',
+                          UserWarning)
+    graph = build_graph(eqsets)
+    targets = kwargs.pop('targets',[n for n in graph
+                                        if graph[n]['code'] is not None])
+    if kwargs.get('only_dipole',False):#use the dipole as the whole field
+        evaluate(graph,data,targets=['Bdx','Bdy','Bdz'],**kwargs)
+        data['B_x [nT]'] = data['Bdx']
+        data['B_y [nT]'] = data['Bdy']
+        data['B_z [nT]'] = data['Bdz']
+    return evaluate(graph, data, targets=targets, **kwargs)
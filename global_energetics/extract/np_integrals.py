@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for the numpy integration path,
+    surface terms w their conditions and volume terms over many regions
+    at once. Zones only need values(name).as_numpy_array() so tecplot
+    zones and plain arrays (see benchmark) both work
+"""
+import numpy as np
+import pandas as pd
+#interpackage modules
+from global_energetics.extract import np_masks
+from global_energetics import telemetry
+
+#Threshold independent volume terms for each analysis type, term:result
+VOLUME_TERMS = {'energy':{'uB [J/Re^3]':'uB [J]',
+                          'uHydro [J/Re^3]':'uHydro [J]'},
+                'mass':{'M [kg/Re^3]':'M [kg]'},
+                'virial':{'Virial Ub [J/Re^3]':'Virial Ub [J]',
+                          'Virial 2x Uk [J/Re^3]':'Virial 2x Uk [J]',
+                          'rhoU_r [Js/Re^3]':'rhoU_r [Js]',
+                          'Pth [J/Re^3]':'Pth [J]'}}
+
+def energy_to_dB(energy, *, conversion=-8e13):
+    """Function converts energy term to magnetic perturbation term w factor
+   Inputs
+        energy(tuple(tuple)- (str,[float]) term to be converted
+        virial_conversion(float)- -8e13, conversion factor based on dipole
+    Outputs
+        (dict{str:float})
+    """
+    return {'[nT]'.join(energy[0].split('[J]')):[energy[1][0]/conversion]}
+
+def energy_post_integr(results, **kwargs):
+    """Creates dictionary of key:value combos of existing results
+    Inputs
+        results(dict{str:[value]})
+        kwargs:
+            do_cms
+    Outputs
+        newterms(dict{str:[value]})
+    """
+    newterms = {}
+    df = pd.DataFrame(results)
+    #Combine MAG and HYDRO back into total energy
+    uB = df[[k for k in df.keys() if ('uB' in k)and('uB_dipole'not in k)]]
+    ub = df[[k for k in df.keys() if 'u_db' in k]]
+    uH = df[[k for k in df.keys() if 'Hydro' in k]]
+    if (not uB.empty) and (not uH.empty):
+        u1_values = uB.values + uH.values #including dipole field
+        u1_keys =['Utot'.join(k.split('uB'))for k in df.keys()if('uB' in k)and
+                                                        ('uB_dipole'not in k)]
+        for k in enumerate(u1_keys):df[k[1]]=u1_values[0][k[0]]
+    if (not ub.empty) and (not uH.empty):
+        u2_values = ub.values + uH.values #disturbance energy
+        u2_keys=['Utot2'.join(k.split('u_db'))for k in df.keys()if'u_db'in k]
+        for k in enumerate(u2_keys):df[k[1]]=u2_values[0][k[0]]
+    if kwargs.get('do_cms', False):
+        #Combine 'acquisitions' and 'forfeitures' back into net
+        acqus = df[[k for k in df.keys()if 'acqu' in k]]
+        forfs = df[[k for k in df.keys()if 'forf' in k]]
+        net_values = acqus.values+forfs.values
+        net_keys = ['_net'.join(k.split('_acqu')) for k in df.keys()
+                    if 'acqu' in k]
+        for k in enumerate(net_keys):df[k[1]]=net_values[0][k[0]]
+    for key in df.keys(): newterms[key] = [df[key].values[0]]
+    return newterms
+
+def virial_post_integr(results,**kwargs):
+    """Creates dictionary of key:value combos of existing results
+    Inputs
+        results(dict{str:[value]})
+    Outputs
+        newterms(dict{str:[value]})
+    """
+    newterms = {}
+    #Virial volume terms
+    newterms.update({'Virial Volume Total [J]':
+                                          [results['Virial 2x Uk [J]'][0]+
+                                            results['Virial Ub [J]'][0]]})
+    if kwargs.get('do_cms', False):
+        df = pd.DataFrame(results)
+        #Combine 'acquisitions' and 'forfeitures' back into net
+        acqus = df[[k for k in df.keys()if 'acqu' in k]]
+        forfs = df[[k for k in df.keys()if 'forf' in k]]
+        net_values = acqus.values+forfs.values
+        net_keys = ['_net'.join(k.split('_acqu')) for k in df.keys()
+                    if 'acqu' in k]
+        for k in enumerate(net_keys):df[k[1]]=net_values[0][k[0]]
+    #Convert from J to nT
+    for newterm in newterms.copy().items():
+        newterms.update(energy_to_dB(newterm))
+    return newterms
+
+def condition_pieces(conditions,**kwargs):
+    """Function gives the pieces of the condition for a list of condition
+        keys, variables in {} w/o a [zone] so np_masks can evaluate them
+        directly and conditional_mod can add the zone on top
+    Inputs
+        conditions (list[str,str,...])- keys for conditions will be AND
+        kwargs:
+            inner_r, L, target- same as conditional_mod
+    Returns
+        pieces (list[str])- eg. ['{status_cc}==3','{Tail}==1']
+    """
+    pieces = []
+    #OPEN CLOSED and CONTESTED
+    if (any(['open' in c for c in conditions]) or
+        any(['closed' in c for c in conditions]) or
+        any(['contested' in c for c in conditions])):
+        if (any(['not open' in c for c in conditions]) or
+            any(['closed' in c for c in conditions])):
+            pieces.append('{status_cc}==3')#closed
+        elif any(['N' in c for c in conditions]):
+            pieces.append('{status_cc}==2')#north
+        elif any(['S' in c for c in conditions]):
+            pieces.append('{status_cc}==1')#south
+        elif any(['contested' in c for c in conditions]):
+            pieces.append('{status_cc}>1 && {status_cc}!=2 && '+
+                          '{status_cc}!=3')#contest
+        else:
+            pieces.append('{status_cc}<3 && {status_cc}>0')#open-open
+    #TAIL
+    if any(['tail' in c for c in conditions]):
+        if 'not tail' in conditions:
+            pieces.append('{Tail}<1')
+        else:
+            pieces.append('{Tail}==1')
+    #INNER BOUNDARY
+    if any(['on_innerbound' in c for c in conditions]):
+        if 'not on_innerbound' in conditions:
+            pieces.append('abs({r [R]}-'+str(kwargs.get('inner_r',3))+')>'+
+                          '{Cell Size [Re]}*1')
+        else:
+            pieces.append('abs({r [R]}-'+str(kwargs.get('inner_r',3))+')<'+
+                          '{Cell Size [Re]}*0.75')
+    #L7
+    if any(['L7' in c for c in conditions]):
+        if '<L7' in conditions:
+            pieces.append('{Lshell}<'+str(kwargs.get('L',7)))
+        elif '>L7' in conditions:
+            pieces.append('{Lshell}>'+str(kwargs.get('L',7)))
+        elif '=L7' in conditions:
+            pieces.append('abs({Lshell}-'+str(kwargs.get('L',7))+')<'+
+                          '{Cell Size [Re]}*1')
+    #DAY/NIGHT (of dipole axis)
+    if 'day' in conditions:
+        pieces.append('{Xd [R]}>0')
+    elif 'night' in conditions:
+        pieces.append('{Xd [R]}<0')
+    #DAY/NIGHT MAPPED
+    if 'daymapped' in conditions:
+        if 'lobe' in kwargs.get('target'):
+            pieces.append('{daymapped_'+kwargs.get('target')+'}>0')
+        else:
+            pieces.append('{daynight}==1')
+    if 'nightmapped' in conditions:
+        if 'lobe' in kwargs.get('target'):
+            pieces.append('{nightmapped_'+kwargs.get('target')+'}>0')
+        else:
+            pieces.append('{daynight}<1')
+    #Y+-
+    if 'y+' in conditions:
+        pieces.append('{Y [R]}>0')
+    if 'y-' in conditions:
+        pieces.append('{Y [R]}<0')
+    return pieces
+
+def np_cell_values(zone,name,n):
+    """Pulls variable from zone as a numpy array of length n, nodal values
+        are averaged onto the cells when n is the number of elements
+    Inputs
+        zone(Zone)- tecplot zone
+        name(str)- variable name
+        n(int)- length of the weights the values will be integrated against
+    Returns
+        values(numpy array)
+    """
+    values = zone.values(name.replace('[','?')).as_numpy_array()
+    if len(values)==n:
+        return values
+    elif len(values)==zone.num_points and n==zone.num_elements:
+        nodemap = np.array(zone.nodemap.array[:]).reshape(n,-1)
+        return values[nodemap].mean(axis=1)
+    else:
+        raise ValueError('Cannot integrate '+name+' ('+str(len(values))+
+                         ') against weights ('+str(n)+') on '+zone.name)
+
+def np_registry(zone,n,np_cache):
+    """Gets the np_masks registry for zone, creating it if needed
+    Inputs
+        zone(Zone)- tecplot zone where the condition variables live
+        n(int)- number of cells being integrated
+        np_cache(dict)- holds registries and cell values between calls
+    Returns
+        registry(dict)- see np_masks.new_registry
+        get(function)- variable name -> cached cell values
+    """
+    if ('registry',zone.index) not in np_cache:
+        np_cache[('registry',zone.index)] = np_masks.new_registry(n,
+                                                           zone=zone.name)
+    def get(name):
+        key = (zone.index,name)
+        if key not in np_cache:
+            np_cache[key] = np_cell_values(zone,name,n)
+        return np_cache[key]
+    return np_cache[('registry',zone.index)], get
+
+def np_condition(zone,conditions,n,**kwargs):
+    """Numpy version of the IF(...) conditions written by conditional_mod
+        each piece is evaluated once per zone and kept in a np_masks
+        registry, then the pieces are AND'd together
+    Inputs
+        zone(Zone)- tecplot zone where the condition variables live
+        conditions (list[str,str,...])- keys for conditions will be AND
+        n(int)- number of cells being integrated
+        kwargs:
+            np_cache(dict)- holds the registry for each zone
+            inner_r, L, target- same as conditional_mod
+    Returns
+        name(str)- key of the combined mask in the registry
+        registry(dict)- see np_masks.new_registry
+    """
+    registry, get = np_registry(zone,n,kwargs.get('np_cache',{}))
+    pieces = condition_pieces(conditions,**kwargs)
+    names = [np_masks.define(registry,piece,get) for piece in pieces]
+    return np_masks.mask_and(registry,names), registry
+
+def np_calc_integral(integrands, zone, **kwargs):
+    """Calls numpy integration for S(term*weight) for all terms at once,
+        terms are stacked into a (n_terms,n_cells) matrix and integrated
+        with a single product against the cell weights
+    Inputs
+        integrands(dict{str:str})- name pre:post integration
+        zone(Zone)- tecplot zone object where integration is performed
+        kwargs:
+            weight(str)- 'Cell Area', variable used for dA or dV
+            np_terms(dict)- from conditional_mod/get_volume_trades, terms
+                            w/o a tecplot variable
+            np_cache(dict)- cell values shared w np_condition
+            chunksize(int)- 2**25, max number of matrix elements at once
+    Outputs
+        result(dict{str:[float]})
+    """
+    weights = zone.values(kwargs.get('weight','Cell Area').replace('[','?')
+                          ).as_numpy_array()
+    n = len(weights)
+    np_terms = kwargs.get('np_terms',{})
+    np_cache = kwargs.get('np_cache',{})
+    terms = [t for t in integrands.items()]
+    telemetry.count('integrals',len(terms))
+    nrows = max(1,int(kwargs.get('chunksize',2**25)/n))
+    result = {}
+    for i in range(0,len(terms),nrows):
+        chunk = terms[i:i+nrows]
+        stack = np.zeros((len(chunk),n))
+        for row,(pre,post) in enumerate(chunk):
+            if pre in np_terms and 'trade' in np_terms[pre]:
+                #+value if from->to (past->future), -value if to->from
+                spec = np_terms[pre]
+                past,present,future = [zone.dataset.zone(i-1)
+                                       for i in spec['source_list']]
+                states = []
+                for z,state in [(past,spec['trade'][0]),
+                                (future,spec['trade'][1]),
+                                (future,spec['trade'][0]),
+                                (past,spec['trade'][1])]:
+                    registry,get = np_registry(z,n,np_cache)
+                    states.append(np_masks.define(registry,state,get))
+                key = ('trade',spec['trade'],tuple(spec['source_list']))
+                if key not in np_cache:
+                    r_past = np_registry(past,n,np_cache)[0]
+                    r_future = np_registry(future,n,np_cache)[0]
+                    gain = (np_masks.get_mask(r_past,states[0])&
+                            np_masks.get_mask(r_future,states[1]))
+                    loss = (np_masks.get_mask(r_future,states[2])&
+                            np_masks.get_mask(r_past,states[3]))&~gain
+                    np_cache[key] = gain.astype(float)-loss
+                stack[row] = (np_cell_values(present,spec['base'],n)*
+                              np_cache[key]/spec['tdelta'])
+            elif pre in np_terms:
+                spec = np_terms[pre]
+                source = zone.dataset.zone(spec['source'])
+                key = (zone.index,spec['base'])
+                if key not in np_cache:
+                    np_cache[key] = np_cell_values(zone,spec['base'],n)
+                #Same mask is reused for every term w the same conditions
+                maskkey = (source.index,tuple(spec['conditions']),
+                           tuple(sorted(spec['kwargs'].items())))
+                if maskkey not in np_cache:
+                    name,registry = np_condition(source,spec['conditions'],
+                                                 n,np_cache=np_cache,
+                                                 **spec['kwargs'])
+                    np_cache[maskkey] = np_masks.get_mask(registry,name)
+                np.copyto(stack[row],np_cache[key],where=np_cache[maskkey])
+            else:
+                stack[row] = np_cell_values(zone,pre,n)
+        for (pre,post),value in zip(chunk,stack.dot(weights)):
+            result[post] = [value]
+    return result
+
+def np_sweep_integrals(zone, masks, **kwargs):
+    """Function integrates the VOLUME_TERMS over many regions at once, the
+        weighted terms are read once and each region is one more product
+    Inputs
+        zone (Zone)- global_field
+        masks (arr[bool])- (n_regions,n_points) state==1 of each region
+        kwargs:
+            analysis_type (str)- 'energy'
+            weight (str)- 'trueCellVolume', nodal volume of each point
+    Returns
+        results (list[DataFrame])- one per region, same terms as
+                                   volume_analysis w/o trades or d/dt
+    """
+    analysis_type = kwargs.get('analysis_type','energy')
+    terms = {}
+    for key,typeterms in VOLUME_TERMS.items():
+        if key in analysis_type:
+            terms.update(typeterms)
+    weights = zone.values(kwargs.get('weight','trueCellVolume')
+                          ).as_numpy_array()
+    stack = np.stack([zone.values(term.replace('[','?')).as_numpy_array()*
+                      weights for term in terms]+[weights])
+    telemetry.count('integrals',len(stack)*len(masks))
+    results = []
+    for mask in masks:
+        values = stack.dot(mask.astype(np.float64))
+        result = {post:[value] for post,value in zip(terms.values(),values)}
+        result['Volume [Re^3]'] = [values[-1]]
+        if 'virial' in analysis_type:
+            result.update(virial_post_integr(result))
+        if 'energy' in analysis_type:
+            result.update(energy_post_integr(result))
+        results.append(pd.DataFrame(result))
+    return results
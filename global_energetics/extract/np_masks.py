@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for keeping track of region masks
+    (open/closed/tail/day etc.) as packed bitsets, so each condition is
+    only evaluated once per zone and timestep
+"""
+import numpy as np
+#interpackage modules
+from global_energetics.extract import np_equations
+
+#Number of set bits in each possible byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)],dtype=np.uint8)
+
+def new_registry(n, **kwargs):
+    """Function creates an empty mask registry for one zone+timestep
+    Inputs
+        n (int)- number of cells (or nodes) the masks are defined over
+        kwargs:
+            any extra info to keep w the registry, eg. zone='ms_mp'
+    Returns
+        registry (dict)- {'n','info','masks','counts'}
+    """
+    return {'n':n,'info':kwargs,'masks':{},'counts':{}}
+
+def pack(mask):
+    """Function packs boolean array into uint8 bits
+    """
+    return np.packbits(np.asarray(mask,dtype=bool))
+
+def add_mask(registry, name, mask):
+    """Function stores a boolean mask under name
+    Inputs
+        registry (dict)- from new_registry
+        name (str)- key for the mask
+        mask (array[bool])- length must match registry['n']
+    Returns
+        name (str)
+    """
+    mask = np.asarray(mask,dtype=bool)
+    if mask.shape!=(registry['n'],):
+        raise ValueError('mask '+name+' has shape '+str(mask.shape)+
+                         ', registry expects ('+str(registry['n'])+',)')
+    registry['masks'][name] = pack(mask)
+    registry['counts'][name] = int(np.count_nonzero(mask))
+    return name
+
+def _add_packed(registry, name, bits):
+    """Function stores already packed bits, clearing any padding bits
+    """
+    pad = len(bits)*8-registry['n']
+    if pad:
+        bits[-1] &= np.uint8((0xFF<<pad)&0xFF)
+    registry['masks'][name] = bits
+    registry['counts'][name] = int(POPCOUNT[bits].sum(dtype=np.int64))
+    return name
+
+def define(registry, expr, getter, *, name=None):
+    """Function evaluates a tecplot style condition once and stores it
+    Inputs
+        registry (dict)- from new_registry
+        expr (str)- condition eg. '{status_cc}==3 && {Tail}<1'
+        getter (function)- variable name -> array of length registry['n']
+        name (str)- key for the mask, default is expr itself
+    Returns
+        name (str)
+    """
+    if name is None:
+        name = expr
+    if name in registry['masks']:
+        return name
+    source, refs = np_equations.parse(expr)
+    if any([zone is not None for (_,zone) in refs]):
+        raise ValueError('zone references not supported in mask '+expr+
+                         ', use a separate registry for each zone')
+    local = {'v'+str(i):getter(ref) for i,(ref,_) in enumerate(refs)}
+    with np.errstate(all='ignore'):
+        mask = eval(source,{'np':np},local)
+    return add_mask(registry,name,np.broadcast_to(mask,(registry['n'],)))
+
+def mask_and(registry, names, *, name=None):
+    """Function stores the intersection of existing masks
+    Inputs
+        registry (dict)- from new_registry
+        names (list[str])- keys to AND together
+        name (str)- key for result, default '(a)&(b)&...'
+    Returns
+        name (str)
+    """
+    if name is None:
+        name = '&'.join(['('+n+')' for n in names])
+    if name not in registry['masks']:
+        if len(names)==0:
+            return add_mask(registry,name,np.ones(registry['n'],dtype=bool))
+        bits = registry['masks'][names[0]].copy()
+        for n in names[1::]:
+            np.bitwise_and(bits,registry['masks'][n],out=bits)
+        _add_packed(registry,name,bits)
+    return name
+
+def mask_or(registry, names, *, name=None):
+    """Function stores the union of existing masks
+    Inputs
+        registry (dict)- from new_registry
+        names (list[str])- keys to OR together
+        name (str)- key for result, default '(a)|(b)|...'
+    Returns
+        name (str)
+    """
+    if name is None:
+        name = '|'.join(['('+n+')' for n in names])
+    if name not in registry['masks']:
+        if len(names)==0:
+            return add_mask(registry,name,np.zeros(registry['n'],dtype=bool))
+        bits = registry['masks'][names[0]].copy()
+        for n in names[1::]:
+            np.bitwise_or(bits,registry['masks'][n],out=bits)
+        _add_packed(registry,name,bits)
+    return name
+
+def mask_not(registry, name, *, new=None):
+    """Function stores the complement of an existing mask
+    Inputs
+        registry (dict)- from new_registry
+        name (str)- key to invert
+        new (str)- key for result, default '~(name)'
+    Returns
+        new (str)
+    """
+    if new is None:
+        new = '~('+name+')'
+    if new not in registry['masks']:
+        _add_packed(registry,new,np.invert(registry['masks'][name]))
+    return new
+
+def get_mask(registry, name):
+    """Function unpacks stored mask back to a boolean array
+    """
+    return np.unpackbits(registry['masks'][name],
+                         count=registry['n']).astype(bool)
+
+def count(registry, name):
+    """Function returns number of cells in the mask
+    """
+    return registry['counts'][name]
+
+def describe(registry):
+    """Function returns summary string of every mask and its cell count
+    """
+    lines = ['{:<50}{:>12}{:>9}'.format('Region','Cells','%')]
+    for name,num in registry['counts'].items():
+        lines.append('{:<50}{:>12d}{:>9.2f}'.format(name[0:50],num,
+                                        100*num/max(registry['n'],1)))
+    return '\n'.join(lines)
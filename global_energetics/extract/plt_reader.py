@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for reading BATSRUS .plt/.dat output
+    Headers are parsed up front, variable blocks are only touched when they
+    are asked for (memory mapped for uncompressed binary files)
+"""
+import io
+import gzip
+import struct
+import fnmatch
+import datetime as dt
+import numpy as np
+
+#Tecplot binary (TDV112) constants
+ZONE_MARKER = 299.0
+GEOM_MARKER = 399.0
+TEXT_MARKER = 499.0
+CUSTOMLABEL_MARKER = 599.0
+USERREC_MARKER = 699.0
+DATASETAUX_MARKER = 799.0
+VARAUX_MARKER = 899.0
+EOH_MARKER = 357.0
+ZONETYPES = {0:'ORDERED',1:'FELINESEG',2:'FETRIANGLE',3:'FEQUADRILATERAL',
+             4:'FETETRAHEDRON',5:'FEBRICK',6:'FEPOLYGON',7:'FEPOLYHEDRON'}
+NODES_PER_ELEMENT = {'FELINESEG':2,'FETRIANGLE':3,'FEQUADRILATERAL':4,
+                     'FETETRAHEDRON':4,'FEBRICK':8}
+DATAFORMATS = {1:'f4',2:'f8',3:'i4',4:'i2',5:'u1'}
+
+def _read_int(f,endian,n=1):
+    """Function reads n int32 values from open binary file
+    """
+    values = struct.unpack(endian+str(n)+'i',f.read(4*n))
+    return values[0] if n==1 else list(values)
+
+def _read_float(f,endian):
+    return struct.unpack(endian+'f',f.read(4))[0]
+
+def _read_double(f,endian):
+    return struct.unpack(endian+'d',f.read(8))[0]
+
+def _read_string(f,endian):
+    """Function reads a Tecplot binary string (one int32 per character)
+    """
+    chars = []
+    while True:
+        c = _read_int(f,endian)
+        if c==0:
+            return ''.join(chars)
+        chars.append(chr(c))
+
+def _open(filename, raw=None):
+    """Function opens file for binary reading, or the bytes of a gzipped
+        file already decompressed by read_plt
+    """
+    if raw is not None:
+        return io.BytesIO(raw)
+    return open(filename,'rb')
+
+def read_plt(filename):
+    """Function reads the header of a tecplot .plt (binary) or .dat (ascii)
+        file without loading any of the variable data
+    Inputs
+        filename (str)- path to .plt/.dat file, may be gzipped (.gz)
+    Returns
+        dataset (dict)- keys:
+                filename, title, variables (list[str]), aux (dict),
+                zones (list[dict])- name, zonetype, n_nodes, n_elements,
+                                    shape, solution_time, aux, locations,
+                                    blocks (byte offsets of each variable),
+                                    cache (arrays already loaded)
+    """
+    #gzipped files are decompressed once, header and data use the same copy
+    raw = None
+    if filename.endswith('.gz'):
+        with gzip.open(filename,'rb') as f:
+            raw = f.read()
+    with _open(filename,raw) as f:
+        magic = f.read(8)
+    if magic.startswith(b'#!TDV'):
+        dataset = _read_binary_header(filename,raw)
+        if raw is not None:
+            dataset['_buffer'] = np.frombuffer(raw,dtype=np.uint8)
+    else:
+        dataset = _read_ascii_header(filename,raw)
+    dataset['filename'] = filename
+    return dataset
+
+def _read_binary_header(filename, raw=None):
+    """Function parses header + zone data descriptors of TDV112 binary file
+    Inputs
+        filename (str)
+        raw (bytes)- decompressed contents of a gzipped file, see _open
+    Returns
+        dataset (dict)- see read_plt
+    """
+    dataset = {'title':'','variables':[],'aux':{},'variable_aux':{},
+               'zones':[],'format':'binary'}
+    with _open(filename,raw) as f:
+        version = f.read(8).decode()
+        if version != '#!TDV112':
+            raise ValueError(filename+': unsupported tecplot binary version '+
+                             version+', only #!TDV112 is handled')
+        endian = '<'
+        if _read_int(f,endian)!=1:
+            endian = '>'
+        dataset['endian'] = endian
+        dataset['filetype'] = _read_int(f,endian)
+        dataset['title'] = _read_string(f,endian)
+        nvar = _read_int(f,endian)
+        dataset['variables'] = [_read_string(f,endian) for i in range(nvar)]
+        #Header section
+        while True:
+            marker = _read_float(f,endian)
+            if marker==ZONE_MARKER:
+                dataset['zones'].append(_read_zone_header(f,endian,nvar))
+            elif marker==DATASETAUX_MARKER:
+                name = _read_string(f,endian)
+                _read_int(f,endian)#value format, always string
+                dataset['aux'][name] = _read_string(f,endian)
+            elif marker==VARAUX_MARKER:
+                varindex = _read_int(f,endian)
+                name = _read_string(f,endian)
+                _read_int(f,endian)
+                dataset['variable_aux'].setdefault(varindex,{})[name]=(
+                                                     _read_string(f,endian))
+            elif marker==EOH_MARKER:
+                break
+            else:
+                raise ValueError(filename+': header record {} '.format(marker)+
+                                 'not supported (geometry/text/labels)')
+        #Data section, record where each block lives but don't read it
+        for zone in dataset['zones']:
+            _read_zone_data_descriptor(f,endian,zone,dataset)
+    for i,zone in enumerate(dataset['zones']):
+        zone['index'] = i
+    return dataset
+
+def _read_zone_header(f,endian,nvar):
+    """Function reads a single zone record from the header section
+    """
+    zone = {'aux':{},'blocks':{},'cache':{},'minmax':{}}
+    zone['name'] = _read_string(f,endian)
+    zone['parent'] = _read_int(f,endian)
+    zone['strand'] = _read_int(f,endian)
+    zone['solution_time'] = _read_double(f,endian)
+    _read_int(f,endian)#not used
+    zone['zonetype'] = ZONETYPES[_read_int(f,endian)]
+    if _read_int(f,endian)==1:
+        zone['locations'] = _read_int(f,endian,nvar)
+        if nvar==1: zone['locations'] = [zone['locations']]
+    else:
+        zone['locations'] = [0]*nvar
+    raw_neighbors = _read_int(f,endian)
+    n_misc_neighbors = _read_int(f,endian)
+    if raw_neighbors or n_misc_neighbors:
+        raise ValueError('zone '+zone['name']+': face neighbor records '+
+                         'are not supported')
+    if zone['zonetype']=='ORDERED':
+        zone['shape'] = tuple(_read_int(f,endian,3))
+        zone['n_nodes'] = int(np.prod(zone['shape']))
+        zone['n_elements'] = int(np.prod([max(n-1,1)
+                                          for n in zone['shape']]))
+    elif zone['zonetype'] in NODES_PER_ELEMENT:
+        zone['shape'] = None
+        zone['n_nodes'] = _read_int(f,endian)
+        zone['n_elements'] = _read_int(f,endian)
+        _read_int(f,endian,3)#reserved cell dims
+    else:
+        raise ValueError('zone '+zone['name']+': '+zone['zonetype']+
+                         ' zones are not supported')
+    while _read_int(f,endian)==1:
+        name = _read_string(f,endian)
+        _read_int(f,endian)
+        zone['aux'][name] = _read_string(f,endian)
+    return zone
+
+def _read_zone_data_descriptor(f,endian,zone,dataset):
+    """Function reads the data section preamble for a zone, storing the
+        byte offsets of every variable block and skipping over the data
+    """
+    nvar = len(dataset['variables'])
+    marker = _read_float(f,endian)
+    if marker!=ZONE_MARKER:
+        raise ValueError('zone '+zone['name']+': bad data section marker')
+    formats = _read_int(f,endian,nvar)
+    if nvar==1: formats = [formats]
+    passive = [0]*nvar
+    if _read_int(f,endian):
+        passive = _read_int(f,endian,nvar)
+        if nvar==1: passive = [passive]
+    shared = [-1]*nvar
+    if _read_int(f,endian):
+        shared = _read_int(f,endian,nvar)
+        if nvar==1: shared = [shared]
+    zone['shared_connectivity'] = _read_int(f,endian)
+    for i,name in enumerate(dataset['variables']):
+        if not passive[i] and shared[i]==-1:
+            zone['minmax'][name] = (_read_double(f,endian),
+                                    _read_double(f,endian))
+    offset = f.tell()
+    for i,name in enumerate(dataset['variables']):
+        if passive[i]:
+            zone['blocks'][name] = ('passive',None,None)
+            continue
+        if shared[i]!=-1:
+            zone['blocks'][name] = ('shared',shared[i],None)
+            continue
+        if formats[i] not in DATAFORMATS:
+            raise ValueError(name+': bit packed data is not supported')
+        dtype = np.dtype(endian+DATAFORMATS[formats[i]])
+        count = _block_size(zone,i)
+        zone['blocks'][name] = (offset,dtype,count)
+        offset += dtype.itemsize*count
+    if (zone['zonetype']!='ORDERED' and zone['shared_connectivity']==-1):
+        nper = NODES_PER_ELEMENT[zone['zonetype']]
+        zone['connectivity'] = (offset,np.dtype(endian+'i4'),
+                                (zone['n_elements'],nper))
+        offset += 4*zone['n_elements']*nper
+    else:
+        zone['connectivity'] = None
+    f.seek(offset)
+
+def _block_size(zone,varindex):
+    """Function returns number of values stored for a variable in a zone
+    """
+    if zone['locations'][varindex]==1:
+        return zone['n_elements']
+    return zone['n_nodes']
+
+def _read_ascii_header(filename, raw=None):
+    """Function parses the header lines of an ascii tecplot .dat file, the
+        numeric data is parsed on first access (ascii can't be skipped)
+    Inputs
+        filename (str)
+        raw (bytes)- see _read_binary_header
+    Returns
+        dataset (dict)- see read_plt
+    """
+    dataset = {'title':'','variables':[],'aux':{},'variable_aux':{},
+               'zones':[],'format':'ascii'}
+    with _open(filename,raw) as f:
+        lines = f.read().decode().splitlines()
+    dataset['_lines'] = lines
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        key = line.split('=')[0].strip().upper()
+        if line=='' or line.startswith('#'):
+            i+=1
+        elif key=='TITLE':
+            dataset['title'] = line.split('=',1)[1].strip().strip('"')
+            i+=1
+        elif key=='VARIABLES':
+            #Variable names may continue onto the following lines
+            text = line.split('=',1)[1]
+            while (i+1<len(lines) and lines[i+1].strip().startswith('"')):
+                i+=1
+                text += ' '+lines[i]
+            dataset['variables'] = _quoted(text)
+            i+=1
+        elif key.startswith('DATASETAUXDATA'):
+            name,value = _ascii_aux(line)
+            dataset['aux'][name] = value
+            i+=1
+        elif key.startswith('ZONE'):
+            zone,i = _read_ascii_zone(lines,i,len(dataset['variables']))
+            zone['index'] = len(dataset['zones'])
+            dataset['zones'].append(zone)
+        else:
+            i+=1
+    return dataset
+
+def _quoted(text):
+    """Function splits a string of "quoted" "names" into a list
+    """
+    if '"' in text:
+        return [t for t in text.split('"')[1::2]]
+    return [t.strip() for t in text.replace(',',' ').split()]
+
+def _ascii_aux(line):
+    """Function parses 'AUXDATA NAME="VALUE"' into (NAME,VALUE)
+    """
+    body = line.split(None,1)[1]
+    name, value = body.split('=',1)
+    return name.strip(), value.strip().strip('"')
+
+def _ascii_zone_params(text):
+    """Function parses the KEY=VALUE pairs on a ZONE line
+    """
+    params = {}
+    for token in _split_params(text):
+        if '=' in token:
+            k,v = token.split('=',1)
+            params[k.strip().upper()] = v.strip().strip('"')
+    return params
+
+def _split_params(text):
+    """Function splits on commas/whitespace while respecting quotes
+    """
+    tokens, current, quoted = [], '', False
+    for c in text:
+        if c=='"':
+            quoted = not quoted
+            current += c
+        elif (c in ', \t') and not quoted:
+            if current: tokens.append(current)
+            current = ''
+        else:
+            current += c
+    if current: tokens.append(current)
+    #Glue back any "KEY = VALUE" that were spread out
+    glued = []
+    for t in tokens:
+        if glued and (t=='=' or glued[-1].endswith('=') or t.startswith('=')):
+            glued[-1] += t
+        else:
+            glued.append(t)
+    return glued
+
+def _read_ascii_zone(lines,i,nvar):
+    """Function reads a ZONE header block, returning the zone descriptor
+        and the line index where the numeric data starts
+    """
+    zone = {'aux':{},'blocks':{},'cache':{},'minmax':{},'strand':0,
+            'parent':-1,'solution_time':0.,'locations':[0]*nvar,
+            'shared_connectivity':-1}
+    text = lines[i].strip()[4:]
+    i+=1
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.upper().startswith('AUXDATA'):
+            name,value = _ascii_aux(line)
+            zone['aux'][name] = value
+        elif line=='' or not (line[0].isdigit() or line[0] in '-+.'):
+            text += ' '+line
+        else:
+            break
+        i+=1
+    params = _ascii_zone_params(text)
+    zone['name'] = params.get('T','')
+    zone['solution_time'] = float(params.get('SOLUTIONTIME',0))
+    zonetype = params.get('ZONETYPE',params.get('ET','ORDERED')).upper()
+    if zonetype in ['BRICK','TRIANGLE','QUADRILATERAL','TETRAHEDRON']:
+        zonetype = 'FE'+zonetype
+    if zonetype=='FELINESEG' or zonetype=='LINESEG':
+        zonetype = 'FELINESEG'
+    zone['zonetype'] = zonetype
+    packing = params.get('DATAPACKING',params.get('F','POINT')).upper()
+    zone['packing'] = 'BLOCK' if 'BLOCK' in packing else 'POINT'
+    if 'VARLOCATION' in params:
+        loc = params['VARLOCATION'].strip('()')
+        for group in loc.split(')'):
+            if 'CELLCENTERED' not in group.upper(): continue
+            indices = group.split('[')[-1].split(']')[0]
+            for rng in indices.split(','):
+                if '-' in rng:
+                    lo,hi = [int(n) for n in rng.split('-')]
+                    for k in range(lo,hi+1): zone['locations'][k-1] = 1
+                elif rng.strip():
+                    zone['locations'][int(rng)-1] = 1
+    if zonetype=='ORDERED':
+        zone['shape'] = tuple(int(params.get(k,1)) for k in ['I','J','K'])
+        zone['n_nodes'] = int(np.prod(zone['shape']))
+        zone['n_elements'] = int(np.prod([max(n-1,1)
+                                          for n in zone['shape']]))
+    else:
+        zone['shape'] = None
+        zone['n_nodes'] = int(params.get('NODES',params.get('N',0)))
+        zone['n_elements'] = int(params.get('ELEMENTS',params.get('E',0)))
+    zone['data_start'] = i
+    return zone, i
+
+def _load_ascii_zone(dataset,zone):
+    """Function parses the numeric section of an ascii zone into the cache
+    """
+    lines = dataset['_lines']
+    nvar = len(dataset['variables'])
+    counts = [_block_size(zone,k) for k in range(nvar)]
+    nvalues = sum(counts)
+    nper = NODES_PER_ELEMENT.get(zone['zonetype'],0)
+    nconn = zone['n_elements']*nper
+    #Pull just enough lines to cover the values + connectivity
+    values, conn, i = [], [], zone['data_start']
+    nread = 0
+    while nread < nvalues and i < len(lines):
+        row = np.fromstring(lines[i],sep=' ')
+        values.append(row); nread += row.size; i+=1
+    values = np.concatenate(values)[0:nvalues]
+    nread = 0
+    while nread < nconn and i < len(lines):
+        row = np.fromstring(lines[i],sep=' ',dtype=np.int64)
+        conn.append(row); nread += row.size; i+=1
+    if zone['packing']=='POINT':
+        values = values.reshape(-1,nvar)
+        for k,name in enumerate(dataset['variables']):
+            zone['cache'][name] = values[:,k].copy()
+    else:
+        start = 0
+        for k,name in enumerate(dataset['variables']):
+            zone['cache'][name] = values[start:start+counts[k]]
+            start += counts[k]
+    if nconn:
+        #ascii connectivity is 1 based
+        zone['cache']['__connectivity__'] = (np.concatenate(conn)[0:nconn]
+                                              .reshape(-1,nper)-1)
+
+def _get_buffer(dataset):
+    """Function returns a memory map of the full binary file, kept for
+        reuse (gzipped files get theirs from read_plt)
+    """
+    if '_buffer' not in dataset:
+        dataset['_buffer'] = np.memmap(dataset['filename'],dtype=np.uint8,
+                                       mode='r')
+    return dataset['_buffer']
+
+def find_variable(dataset, pattern):
+    """Function matches tecplot style variable patterns, eg. 'X *' or 'B_x*'
+    Inputs
+        dataset (dict)- from read_plt
+        pattern (str)- exact name or wildcard
+    Returns
+        name (str)- full variable name
+    """
+    if pattern in dataset['variables']:
+        return pattern
+    matches = fnmatch.filter(dataset['variables'],pattern)
+    if len(matches)==0:
+        raise KeyError(pattern+' not in '+str(dataset['variables']))
+    return matches[0]
+
+def get_zone(dataset, zone=0):
+    """Function returns zone dict from index or name (wildcards allowed)
+    """
+    if type(zone)==dict:
+        return zone
+    if type(zone)==str:
+        for z in dataset['zones']:
+            if fnmatch.fnmatch(z['name'],zone):
+                return z
+        raise KeyError(zone+' not in '+
+                       str([z['name'] for z in dataset['zones']]))
+    return dataset['zones'][zone]
+
+def zone_values(dataset, variable, zone=0, *, copy=False):
+    """Function returns array of a single variable, only this block is read
+    Inputs
+        dataset (dict)- from read_plt
+        variable (str)- name or wildcard pattern
+        zone (int/str)- zone index or name
+        copy (bool)- False, if True return an in memory copy not a memmap
+    Returns
+        values (ndarray)
+    """
+    z = get_zone(dataset, zone)
+    name = find_variable(dataset, variable)
+    if name not in z['cache']:
+        if dataset['format']=='ascii':
+            _load_ascii_zone(dataset,z)
+        else:
+            offset,dtype,count = z['blocks'][name]
+            if offset=='passive':
+                varindex = dataset['variables'].index(name)
+                z['cache'][name] = np.zeros(_block_size(z,varindex))
+            elif offset=='shared':
+                return zone_values(dataset,name,dtype,copy=copy)
+            else:
+                buffer = _get_buffer(dataset)
+                z['cache'][name] = buffer[offset:offset+dtype.itemsize*count
+                                                            ].view(dtype)
+    if copy:
+        return np.array(z['cache'][name])
+    return z['cache'][name]
+
+def zone_connectivity(dataset, zone=0):
+    """Function returns (n_elements, nodes_per_element) 0 based node list
+    Inputs
+        dataset (dict)- from read_plt
+        zone (int/str)- zone index or name
+    Returns
+        connectivity (ndarray[int])- None for ordered zones
+    """
+    z = get_zone(dataset, zone)
+    if z['zonetype']=='ORDERED':
+        return None
+    if '__connectivity__' not in z['cache']:
+        if dataset['format']=='ascii':
+            _load_ascii_zone(dataset,z)
+        elif z['connectivity'] is None:
+            return zone_connectivity(dataset,z['shared_connectivity'])
+        else:
+            offset,dtype,shape = z['connectivity']
+            buffer = _get_buffer(dataset)
+            nbytes = dtype.itemsize*shape[0]*shape[1]
+            z['cache']['__connectivity__'] = buffer[offset:offset+nbytes
+                                                  ].view(dtype).reshape(shape)
+    return z['cache']['__connectivity__']
+
+def load_variables(filename, variables=None, *, zone=0):
+    """Function reads only the requested variables of a .plt/.dat file
+    Inputs
+        filename (str or dict)- file path or already parsed dataset
+        variables (list[str])- None for all, wildcards allowed
+        zone (int/str)- zone index or name
+    Returns
+        data (dict{str:ndarray})- variable name:values
+        aux (dict)- zone aux data (TIMEEVENT, BTHETATILT, etc.)
+    """
+    if type(filename)==dict:
+        dataset = filename
+    else:
+        dataset = read_plt(filename)
+    if variables is None:
+        variables = dataset['variables']
+    data = {}
+    for var in variables:
+        name = find_variable(dataset,var)
+        data[name] = zone_values(dataset,name,zone)
+    return data, get_zone(dataset,zone)['aux']
+
+def read_aux_time(aux, *, key='TIMEEVENT'):
+    """Function parses SWMF time string from aux data, mirrors the tecplot
+        based swmf_access.swmf_read_time
+    Inputs
+        aux (dict)- zone aux data, see load_variables
+        key (str)- typically is TIMEEVENT
+    Returns
+        datetime object of the event time
+    """
+    if key not in aux:
+        return dt.datetime(2000,1,1,0,0,0)
+    date,clock = aux[key].strip().split(' ')[0:2]
+    year,month,day = [int(d) for d in date.split('/')]
+    hour,minute,second = clock.split(':')[0:3]
+    return dt.datetime(year,month,day,int(hour),int(minute),
+                       int(second.split('.')[0]))
+
+def describe(dataset):
+    """Function returns a short summary string of the parsed file
+    """
+    lines = [dataset.get('filename','')+' ('+dataset['format']+')',
+             '\tvariables: '+', '.join(dataset['variables'])]
+    for z in dataset['zones']:
+        lines.append('\tzone {}: {} {} nodes:{} elements:{}'.format(
+                     z['index'],z['name'],z['zonetype'],z['n_nodes'],
+                     z['n_elements']))
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    import sys
+    for infile in sys.argv[1::]:
+        print(describe(read_plt(infile)))
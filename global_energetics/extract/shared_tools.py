@@ -50,3 +50,35 @@ def check_bin(x,theta_1,phi_1,inbin,state):
     else:
         contested[0] = 1
     return quadbins, contested[0]
+
+def check_bin_subset(x,theta_1,phi_1,inbin):
+    """Function checks 4 quadrants of bin to determine contestation, same
+        as check_bin but only looks at the cells in the bin
+    Inputs
+        x (arr[float])
+        theta_1 (arr[float])
+        phi_1 (arr[float])
+        inbin (arr[int])- sorted indices of the (state==1) cells in the bin
+    Return
+        qs (list[arr[int]]) - quadrants of the original bin
+        contested (bool) - if the quads agree about daynight
+    """
+    theta = theta_1[inbin]
+    phi = phi_1[inbin]
+    thHigh, thLow = theta.max(), theta.min()
+    phHigh, phLow = phi.max(), phi.min()
+    thMid = (thHigh+thLow)/2
+    phMid = (phHigh+phLow)/2
+    q1 = (theta<thHigh)&(theta>thMid)&(phi<phMid)&(phi>phLow)
+    q2 = (theta<thMid)&(theta>thLow)&(phi<phMid)&(phi>phLow)
+    q3 = (theta<thMid)&(theta>thLow)&(phi<phHigh)&(phi>phMid)
+    q4 = (theta<thHigh)&(theta>thMid)&(phi<phHigh)&(phi>phMid)
+    quadbins = [inbin[q] for q in [q1,q2,q3,q4] if np.any(q)]
+    signs = np.array([sign(x[q].mean()) for q in quadbins])
+    if signs.size == 0:
+        contested = False
+    elif (signs.all()) or (signs.max()==0):
+        contested = False
+    else:
+        contested = True
+    return quadbins, contested
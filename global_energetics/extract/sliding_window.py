@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Sliding window over consecutive snapshots, each .plt file is read once
+    and kept in memory while it's needed as past/present/future for the
+    time derivatives (do_cms)
+"""
+import collections
+import numpy as np
+try:
+    import tecplot as tp
+    from tecplot.constant import ZoneType, ValueLocation
+except ImportError:
+    tp = None
+#interpackage modules
+from global_energetics import makevideo, prefetch
+from global_energetics.extract import plt_reader
+from global_energetics.extract import np_equations
+
+#Names used by get_magnetosphere for the three time levels
+ZONENAMES = ['past','global_field','future']
+
+def partition(files, nchunks, *, halo=1, all_files=None):
+    """Function splits time sorted files into contiguous chunks, each with
+        halo snapshots on either side so only the edges are read twice
+    Inputs
+        files (list[str])- files to analyze, sorted by makevideo.time_sort
+        nchunks (int)- number of chunks, usually the number of workers
+        halo (int)- neighbors needed on each side, 1 for central diff
+        all_files (list[str])- full sorted list to take neighbors from,
+                               default is files
+    Returns
+        chunks (list[dict])- {'centers':files to analyze,
+                              'files':files to read, in time order}
+    """
+    if all_files is None:
+        all_files = files
+    index = {f:i for i,f in enumerate(all_files)}
+    nchunks = max(1,min(nchunks,len(files)))
+    bounds = np.linspace(0,len(files),nchunks+1).astype(int)
+    chunks = []
+    for start,end in zip(bounds[0:-1],bounds[1::]):
+        centers = files[start:end]
+        needed = set()
+        for f in centers:
+            i = index[f]
+            needed.update(range(max(0,i-halo),min(len(all_files),i+halo+1)))
+        chunks.append({'centers':centers,
+                       'files':[all_files[i] for i in sorted(needed)]})
+    return chunks
+
+def load_snapshot(filename, **kwargs):
+    """Function reads a single snapshot into memory w plt_reader
+    Inputs
+        filename (str)
+        kwargs:
+            variables (list[str])- None for all, wildcards allowed
+            zone (int/str)- 0
+            analysis_type (str)- if given, global variables are derived
+                                 once here w np_equations
+            see np_equations.get_global_variables
+    Returns
+        snapshot (dict)- filename, time, data, aux, zonetype, shape,
+                         n_nodes, n_elements, connectivity
+    """
+    dataset = plt_reader.read_plt(filename)
+    zone = plt_reader.get_zone(dataset,kwargs.get('zone',0))
+    data, aux = plt_reader.load_variables(dataset,kwargs.get('variables'),
+                                          zone=kwargs.get('zone',0))
+    connectivity = plt_reader.zone_connectivity(dataset,zone)
+    snapshot = {'filename':filename,
+                'time':makevideo.get_time(filename),
+                'data':{k:np.array(v) for k,v in data.items()},
+                'aux':dict(aux),
+                'zonetype':zone['zonetype'],
+                'shape':zone['shape'],
+                'n_nodes':zone['n_nodes'],
+                'n_elements':zone['n_elements'],
+                'connectivity':(np.array(connectivity)
+                                if connectivity is not None else None)}
+    if 'analysis_type' in kwargs:
+        np_equations.get_global_variables(snapshot['data'],
+                                         kwargs.get('analysis_type'),
+                                         aux=snapshot['aux'],
+                                         **{k:kwargs[k] for k in
+                                            ['only_dipole','global_eq',
+                                             'targets','use_numexpr',
+                                             'is3D','modes','customTerms',
+                                             'add_eqset']
+                                            if k in kwargs})
+    return snapshot
+
+def new_window(size=3):
+    """Function creates empty ring buffer of snapshots
+    Inputs
+        size (int)- 3 for past/present/future
+    Returns
+        window (dict)- {'size','snapshots','nread'}
+    """
+    return {'size':size,'snapshots':collections.deque(maxlen=size),
+            'nread':0}
+
+def advance(window, filename, **kwargs):
+    """Function reads the next snapshot, the oldest one falls off the end
+    Inputs
+        window (dict)- from new_window
+        filename (str)
+        kwargs- see load_snapshot
+    Returns
+        window (dict)
+    """
+    window['snapshots'].append(load_snapshot(filename,**kwargs))
+    window['nread']+=1
+    return window
+
+def walk(files, centers=None, **kwargs):
+    """Generator that reads each file once and yields the past/present/
+        future snapshots for every center, ends of the list reuse the
+        nearest snapshot (same as gl-cdiff)
+    Inputs
+        files (list[str])- time sorted files to read, see partition
+        centers (list[str])- files to yield for, default all of files
+        kwargs:
+            prefetch (int)- 0, if >0 number of snapshots decoded ahead
+                            in a background thread
+            see load_snapshot
+    Yields
+        triplet (list[dict])- [past, present, future] snapshots
+    """
+    if centers is None:
+        centers = files
+    centers = set(centers)
+    window = new_window(3)
+    if kwargs.get('prefetch',0):
+        #Decode the next files in the background while this one is used
+        fetcher = prefetch.start(files,depth=kwargs.get('prefetch'),
+                                 loader=lambda f: load_snapshot(f,**kwargs))
+        source = prefetch.items(fetcher)
+    else:
+        fetcher = None
+        source = ((f,load_snapshot(f,**kwargs)) for f in files)
+    try:
+        for i,(filename,snapshot) in enumerate(source):
+            window['snapshots'].append(snapshot)
+            window['nread']+=1
+            snapshots = window['snapshots']
+            if i==0:
+                continue
+            #Now window ends w files[i], so the present is files[i-1]
+            present = snapshots[-2]
+            if present['filename'] in centers:
+                past = snapshots[-3] if len(snapshots)==3 else present
+                yield [past,present,snapshots[-1]]
+    finally:
+        if fetcher is not None:
+            prefetch.stop(fetcher)
+    if len(files)>0:
+        #Last file has no future, reuse it
+        snapshots = window['snapshots']
+        if snapshots[-1]['filename'] in centers:
+            past = snapshots[-2] if len(snapshots)>1 else snapshots[-1]
+            yield [past,snapshots[-1],snapshots[-1]]
+
+def to_tecplot(triplet, **kwargs):
+    """Function loads in memory snapshots into a new tecplot layout w the
+        zone names get_magnetosphere expects, no files are read
+    Inputs
+        triplet (list[dict])- [past, present, future] from walk
+        kwargs:
+            zonenames (list[str])- default ZONENAMES
+    Returns
+        field_data (tecplot Dataset)
+    """
+    if tp is None:
+        raise ImportError('to_tecplot requires pytecplot')
+    zonenames = kwargs.get('zonenames',ZONENAMES)
+    tp.new_layout()
+    variables = [v for v in triplet[1]['data']]
+    field_data = tp.active_frame().create_dataset('window',variables)
+    for name,snapshot in zip(zonenames,triplet):
+        locations = []
+        for var in variables:
+            if (len(snapshot['data'][var])!=snapshot['n_nodes'] and
+                len(snapshot['data'][var])==snapshot['n_elements']):
+                locations.append(ValueLocation.CellCentered)
+            else:
+                locations.append(ValueLocation.Nodal)
+        if snapshot['zonetype']=='ORDERED':
+            zone = field_data.add_ordered_zone(name,snapshot['shape'],
+                                               locations=locations)
+        else:
+            zone = field_data.add_fe_zone(
+                            getattr(ZoneType,{'FELINESEG':'FELineSeg',
+                                              'FETRIANGLE':'FETriangle',
+                                              'FEQUADRILATERAL':'FEQuad',
+                                              'FETETRAHEDRON':'FETetra',
+                                              'FEBRICK':'FEBrick'}[
+                                                     snapshot['zonetype']]),
+                            name,snapshot['n_nodes'],snapshot['n_elements'],
+                            locations=locations)
+            zone.nodemap[:] = snapshot['connectivity']
+        for i,var in enumerate(variables):
+            zone.values(i)[:] = snapshot['data'][var]
+        for key,value in snapshot['aux'].items():
+            zone.aux_data[key] = value
+    return field_data
@@ -2,6 +2,7 @@
 """Functions for analyzing surfaces from field data
 """
 import os
+import re
 import sys
 import time
 import numpy as np
@@ -21,6 +22,12 @@ from global_energetics.extract.tec_tools import (integrate_tecplot,
                                                     make_alt_trade_eq,
                                                     dump_to_pandas)
 from global_energetics.extract.view_set import variable_blank
+from global_energetics.extract import np_masks
+from global_energetics.extract.np_integrals import (condition_pieces,
+                                                   energy_to_dB,
+                                                   np_cell_values,
+                                                   np_calc_integral)
+from global_energetics import telemetry
 
 def central_diff(dataframe,dt,**kwargs):
     """Takes central difference of the columns of a dataframe
@@ -373,6 +380,9 @@ def conditional_mod(zone,integrands,conditions,modname,**kwargs):
         integrands(dict{str:str})- (static) in/output terms to calculate
         conditions (list[str,str,...])- keys for conditions will be AND
         modname (str)- name for output ie:'Flank','PSB','Downtail_lobes'
+        kwargs:
+            np_terms(dict)- if given, no tecplot variables are made, terms
+                            are recorded here for np_calc_integral instead
     Outputs
         interfaces(dict{str:str})- dictionary of terms w/ pre:post integral
     """
@@ -393,89 +403,26 @@ def conditional_mod(zone,integrands,conditions,modname,**kwargs):
         else:
             #value_location = ValueLocation.Nodal
             value_location = ValueLocation.CellCentered
-        #OPEN CLOSED and CONTESTED
-        if (any(['open' in c for c in conditions]) or
-            any(['closed' in c for c in conditions]) or
-            any(['contested' in c for c in conditions])):
-            if (any(['not open' in c for c in conditions]) or
-                any(['closed' in c for c in conditions])):
-                new_eq+='({status_cc}['+condition_source+']==3) &&'#closed
-            elif any(['N' in c for c in conditions]):
-                new_eq+=('({status_cc}['+condition_source+']==2)&&')#north
-            elif any(['S' in c for c in conditions]):
-                new_eq+=('({status_cc}['+condition_source+']==1) &&')#south
-            elif any(['contested' in c for c in conditions]):
-                new_eq+=('({status_cc}['+condition_source+']>1 && '+
-                          '{status_cc}['+condition_source+']!=2 && '+
-                          '{status_cc}['+condition_source+']!=3) &&')#contest
-            else:
-                new_eq+=('({status_cc}['+condition_source+']<3 && '+
-                          '{status_cc}['+condition_source+']>0) &&')#open-open
-        #TAIL
-        if any(['tail' in c for c in conditions]):
-            if 'not tail' in conditions:
-                new_eq+='({Tail}['+condition_source+']<1) &&'
-            else:
-                new_eq+='({Tail}['+condition_source+']==1) &&'
-        #INNER BOUNDARY
-        if any(['on_innerbound' in c for c in conditions]):
-            if 'not on_innerbound' in conditions:
-                new_eq+=('(abs({r [R]}['+condition_source+']-'+
-                               str(kwargs.get('inner_r',3))+')>'+
-                           '{Cell Size [Re]}['+condition_source+']*1) &&')
-            else:
-                new_eq+=('(abs({r [R]}['+condition_source+']-'+
-                               str(kwargs.get('inner_r',3))+')<'+
-                           '{Cell Size [Re]}['+condition_source+']*0.75) &&')
-        #L7
-        if any(['L7' in c for c in conditions]):
-            if '<L7' in conditions:
-                new_eq+=('({Lshell}['+condition_source+']<'+
-                                            str(kwargs.get('L',7))+') &&')
-            elif '>L7' in conditions:
-                new_eq+=('({Lshell}['+condition_source+']>'+
-                                            str(kwargs.get('L',7))+') &&')
-            elif '=L7' in conditions:
-                new_eq+=('(abs({Lshell}['+condition_source+']-'+
-                                            str(kwargs.get('L',7))+')<'+
-                               '{Cell Size [Re]}['+condition_source+']*1)&&')
-                #NOTE 0.75*cell size worked for everyone but L7,
-                #       which was optimized at 1*cell size
-        #DAY/NIGHT (of dipole axis)
-        if ('day' in conditions) or ('night' in conditions):
-            if 'day' in conditions:
-                new_eq+='({Xd [R]}['+condition_source+']>0) &&'#Dayside
-            elif 'night' in conditions:
-                new_eq+='({Xd [R]}['+condition_source+']<0) &&'#Nightside
-        #DAY/NIGHT MAPPED (need th,phi detailed mapping output)
-        if ('daymapped' in conditions) or ('nightmapped' in conditions):
-            if 'daymapped' in conditions:
-                if 'lobe' in kwargs.get('target'):
-                    new_eq+=('({daymapped_'+kwargs.get('target')+'}'+
-                              '['+condition_source+']>0)&&')
-                else:
-                    new_eq+=('({daynight}'+
-                              '['+condition_source+']==1)&&')
-            if 'nightmapped' in conditions:
-                if 'lobe' in kwargs.get('target'):
-                    new_eq+=('({nightmapped_'+kwargs.get('target')+'}'+
-                              '['+condition_source+']>0)&&')
-                else:
-                    new_eq+=('({daynight}'+
-                              '['+condition_source+']<1)&&')
-        #Y+-
-        if ('y+' in conditions) or ('y-' in conditions):
-            if 'y+' in conditions:
-                new_eq+='({Y [R]}['+condition_source+']>0) &&'#Dusk
-            if 'y-' in conditions:
-                new_eq+='({Y [R]}['+condition_source+']<0) &&'#Dawn
+        pieces = [re.sub(r'(\{[^}]*\})',r'\1['+condition_source+']',
+                         piece)
+                  for piece in condition_pieces(conditions,**kwargs)]
         #Write out the equation modifications
         if any([a in c for c in conditions for a in
                            ['open','closed','tail','on_innerbound','L7',
                             'daymapped','nightmapped','y']]):
-            #chop hanging && and close up condition
-            new_eq=('&&'.join(new_eq.split('&&')[0:-1])+',{'+term[0]+'}['+
-                                                  str(zone.index+1)+'],0)')
+            new_eq+=(' && '.join(['('+piece+')' for piece in pieces])+
+                       ',{'+term[0]+'}['+str(zone.index+1)+'],0)')
+            if 'np_terms' in kwargs:
+                #Skip tecplot, np_calc_integral builds the mask itself
+                kwargs['np_terms'][name+modname] = {
+                        'base':term[0],
+                        'source':int(condition_source)-1,
+                        'conditions':conditions,
+                        'kwargs':{k:kwargs[k] for k in ['inner_r','L',
+                                                        'target']
+                                  if k in kwargs}}
+                mods.update({name+modname:outputname+modname+units})
+                continue
             try:
                 eq(new_eq,zones=[zone],value_location=value_location)
                 mods.update({name+modname:outputname+modname+units})
@@ -767,16 +714,6 @@ def get_interface_integrands(zone,integrands,**kwargs):
     return interfaces
 
 
-def energy_to_dB(energy, *, conversion=-8e13):
-    """Function converts energy term to magnetic perturbation term w factor
-   Inputs
-        energy(tuple(tuple)- (str,[float]) term to be converted
-        virial_conversion(float)- -8e13, conversion factor based on dipole
-    Outputs
-        (dict{str:float})
-    """
-    return {'[nT]'.join(energy[0].split('[J]')):[energy[1][0]/conversion]}
-
 def calc_integral(term, zone, **kwargs):
     """Calls tecplot integration for term
     Inputs
@@ -803,6 +740,7 @@ def calc_integral(term, zone, **kwargs):
         scalars = zone.values(term[0]).as_numpy_array()
         volumes = zone.values('trueCellVolume').as_numpy_array()
         value = np.dot(scalars,volumes)
+        telemetry.count('integrals')
     else:
         value = integrate_tecplot(variable, zone,
                       VariableOption=kwargs.get('VariableOption','Scalar'))
@@ -830,41 +768,6 @@ def save_distribution(variable_str,zone,**kwargs):
                     'cell cetered, skipping save')
         return None, 0
 
-#TODO: see if this can be wrapped with numba @jit
-def np_calc_integral(terms, volumes, scalars, **kwargs):
-    """Calls numpy integration for S(term*volume)
-    Inputs
-        term(tuple(str:str))- name pre:post integration
-        volumes
-        scalars
-        kwargs:
-            None
-    Outputs
-        result(dict{str:float})
-    """
-    result = {term[1]:[value]}
-    if kwargs.get('VariableOption','Scalar')=='Scalar':
-        if '[' in term[0]:
-            variable_name = term[0].split('[')[0]+'*'
-        else:
-            variable_name = term[0]
-        variable = zone.dataset.variable(variable_name)
-    else:
-        variable = None
-        if kwargs.get('useNumpy',False):
-            volumes = zone.values('trueCellVolume').as_numpy_array()
-            value = np.sum(volumes)
-    if (kwargs.get('useNumpy',False) and
-        kwargs.get('VariableOption','Scalar')=='Scalar'):
-        scalars = zone.values(term[0]).as_numpy_array()
-        volumes = zone.values('trueCellVolume').as_numpy_array()
-        value = np.dot(scalars,volumes)
-    else:
-        value = integrate_tecplot(variable, zone,
-                      VariableOption=kwargs.get('VariableOption','Scalar'))
-    result = {term[1]:[value]}
-    return result
-
 def get_mag_dict(zone,**kwargs):
     """Creates dictionary of terms to be integrated for magnetic flux
     Inputs
@@ -1051,6 +954,7 @@ def surface_analysis(zone, **kwargs):
             blank_value(float)- 3, blanking values used in condition
             blank_operator(RelOp)- RelOp.LessThan, tecplot constant obj
             customTerms(dict{str:str})- any one-off integrations
+            useNumpy(bool)- False, integrate w np_calc_integral
     Outputs
         surface_power- power, or integrated energy flux at the given surface
         flux_dists(DataFrame)- (optional) export flux distribution
@@ -1080,6 +984,8 @@ def surface_analysis(zone, **kwargs):
     #initialize empty dictionary that will make up the results of calc
     integrands, results, eq = {}, {}, tp.data.operate.execute_equation
     flux_dists = {}
+    if kwargs.get('useNumpy',False):
+        kwargs['np_terms'], kwargs['np_cache'] = {}, {}
     ###################################################################
     #Core integral terms
     if 'virial' in analysis_type:
@@ -1119,8 +1025,15 @@ def surface_analysis(zone, **kwargs):
         print('{:<30}{:<35}{:<9}'.format('******','****','*****'))
     print(integrands)
     print(core_integrands)
+    if kwargs.get('useNumpy',False):
+        results.update(np_calc_integral(integrands, zone, **kwargs))
+        if kwargs.get('verbose',False):
+            for key,registry in kwargs['np_cache'].items():
+                if key[0]=='registry':
+                    print(np_masks.describe(registry))
     for term in integrands.items():
-        results.update(calc_integral(term, zone))
+        if not kwargs.get('useNumpy',False):
+            results.update(calc_integral(term, zone))
         if kwargs.get('verbose',False):
             print('{:<30}{:<35}{:>.3}'.format(
                       zone.name,term[1],results[term[1]][0]))
@@ -1154,7 +1067,10 @@ def surface_analysis(zone, **kwargs):
                                           area_error))
     ###################################################################
     #Non scalar integrals (empty integrands)
-    if kwargs.get('doSurfaceArea', True):
+    if kwargs.get('doSurfaceArea', True) and kwargs.get('useNumpy',False):
+        results.update({'Area [Re^2]':[np.sum(np_cell_values(zone,
+                                      'Cell Area',zone.num_elements))]})
+    elif kwargs.get('doSurfaceArea', True):
         results.update(calc_integral((' ','Area [Re^2]'), zone,
                         VariableOption='LengthAreaVolume'))
         if kwargs.get('verbose',False):
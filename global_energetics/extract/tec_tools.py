@@ -16,6 +16,11 @@ from tecplot.exception import *
 import pandas as pd
 #Interpackage modules
 from global_energetics.extract.equations import (equations,rotation)
+from global_energetics.extract import np_equations
+from global_energetics.extract import geometry_cache
+from global_energetics.extract import isosurface
+from global_energetics.extract import locator
+from global_energetics import telemetry
 from global_energetics.extract import shue
 from global_energetics.extract.shue import (r_shue, r0_alpha_1997,
                                                     r0_alpha_1998)
@@ -1875,8 +1880,10 @@ def make_alt_trade_eq(from_state,to_state,tagname,tstep,**kwargs):
     return '{name'+tagname+'} = '+tradestr
 
 def eqeval(eqset,**kwargs):
-    for lhs,rhs in eqset.items():
-        tp.data.operate.execute_equation(lhs+'='+rhs,
+    with telemetry.span('eqeval',first=next(iter(eqset),''),engine='tecplot'):
+        telemetry.count('equations',len(eqset))
+        for lhs,rhs in eqset.items():
+            tp.data.operate.execute_equation(lhs+'='+rhs,
                               zones=kwargs.get('zones'),
                               value_location=kwargs.get('value_location'),
                               ignore_divide_by_zero=True)
@@ -1890,6 +1897,123 @@ def eqeval(eqset,**kwargs):
             from IPython import embed; embed()
         '''
 
+def np_eqeval(eqset,**kwargs):
+    """Evaluates a set of nodal equations with the numpy engine and loads
+        the results back into tecplot, avoids a tecplot pass over the grid
+        for every single equation
+    Inputs
+        eqset (dict{str:str})- lhs:rhs pairs
+        kwargs:
+            zones (list[int/Zone])- default all zones
+    """
+    with telemetry.span('eqeval',first=next(iter(eqset),''),engine='numpy'):
+        _np_eqeval(eqset,**kwargs)
+
+def _np_eqeval(eqset,**kwargs):
+    ds = tp.active_frame().dataset
+    graph = np_equations.build_graph(eqset)
+    #Anything the engine can't do goes through tecplot as normal
+    if (kwargs.get('value_location') is not None or
+        any([graph[n]['code'] is None for n in graph]) or
+        any([r[1] is not None for n in graph for r in graph[n]['refs']])):
+        eqeval(eqset,**kwargs)
+        return
+    inputs = []
+    for name in graph:
+        inputs+=[d for d in graph[name]['deps']if d not in graph
+                                                 and d not in inputs]
+    if kwargs.get('zones') is None:
+        zones = [z for z in ds.zones()]
+    else:
+        zones = [ds.zone(z) if type(z)==int else z
+                 for z in kwargs.get('zones')]
+    for zone in zones:
+        data = {}
+        for name in inputs:
+            data[name] = zone.values(name).as_numpy_array()
+        if any([len(v)!=zone.num_points for v in data.values()]):
+            #Mixed value locations, let tecplot handle the interpolation
+            eqeval(eqset,zones=[zone])
+            continue
+        np_equations.evaluate(graph,data)
+        telemetry.count('equations',len(graph))
+        for name in graph:
+            if name not in ds.variable_names:
+                ds.add_variable(name)
+            zone.values(name)[:] = np.broadcast_to(data[name],
+                                                   (zone.num_points,))
+
+def load_geometry(field_data, alleq, **kwargs):
+    """Function sets Cell Size, r, h and the tilt dependent dipole terms
+        from geometry_cache, tecplot/numpy only work out what isn't cached
+    Inputs
+        field_data- tecplot Dataset class containing 3D field data
+        alleq (dict)- from equations(aux=aux)
+        kwargs:
+            aux- aux data w BTHETATILT, default from global_field
+            cache_dir (str)- None for in memory only
+    Returns
+        rest (dict)- dipole_coord equations that need the field data (U_*)
+    """
+    cc = ValueLocation.CellCentered
+    cache_dir = kwargs.get('cache_dir')
+    aux = kwargs.get('aux')
+    if aux is None:
+        aux = field_data.zone('global_field').aux_data
+    static_names = [np_equations.strip_name(lhs)
+                    for lhs in alleq['basic3d']]
+    geometric, rest = geometry_cache.split_geometric(
+                         [alleq[k] for k in ['dipole_coord','dipole']
+                                                           if k in alleq],
+                                     geometry_cache.COORDS+static_names)
+    have_volume = False
+    for zone in field_data.zones():
+        xyz = {c:zone.values(c).as_numpy_array()
+               for c in geometry_cache.COORDS}
+        if zone.zone_type==ZoneType.Ordered:
+            key = geometry_cache.fingerprint(xyz,shape=zone.dimensions)
+        else:
+            key = geometry_cache.fingerprint(xyz,
+                                connectivity=np.array(zone.nodemap.array[:]))
+        static = geometry_cache.get_static(key,cache_dir=cache_dir)
+        new = {}
+        if not all([n in static for n in static_names]):
+            local = dict(xyz)
+            np_equations.eqeval(alleq['basic3d'],local)
+            new.update({n:local[n] for n in static_names})
+        if zone.name=='global_field' and 'Cell Size [Re]' not in static:
+            if 'dvol [R]^3' in field_data.variable_names:
+                volume = zone.values('dvol [R]^3').as_numpy_array()
+            else:
+                if not have_volume:
+                    tp.macro.execute_extended_command('CFDAnalyzer3',
+                                          'CALCULATE FUNCTION = '+
+                                          'CELLVOLUME VALUELOCATION = '+
+                                          'CELLCENTERED')
+                    have_volume = True
+                volume = zone.values('Cell Volume').as_numpy_array()
+            new['Cell Volume'] = volume
+            new['Cell Size [Re]'] = volume**(1/3)
+        if new:
+            geometry_cache.put_static(key,new,cache_dir=cache_dir)
+            static = geometry_cache.get_static(key,cache_dir=cache_dir)
+        values = {n:static[n] for n in static_names}
+        if zone.name=='global_field':
+            values['Cell Size [Re]'] = static['Cell Size [Re]']
+        if geometric:
+            values.update(geometry_cache.get_dipole(key,aux['BTHETATILT'],
+                                                dict(xyz,**values),geometric,
+                                                cache_dir=cache_dir))
+        for name,value in values.items():
+            location = cc if name=='Cell Size [Re]' else None
+            if name not in field_data.variable_names:
+                field_data.add_variable(name,locations=location)
+            size = len(zone.values(name))
+            zone.values(name)[:] = np.broadcast_to(value,(size,))
+    if have_volume:
+        field_data.delete_variables([field_data.variable('Cell Volume')])
+    return rest
+
 def get_global_variables(field_data, analysis_type, **kwargs):
     """Function calculates values for energetics tracing
     Inputs
@@ -1897,15 +2021,37 @@ def get_global_variables(field_data, analysis_type, **kwargs):
         kwargs:
             aux- if dipole equations and corresponding energies are wanted
             is3D- if all 3 dimensions are present
+            useNumpy- evaluate nodal equation sets w numpy (np_eqeval)
+            geometry_cache- False, True or a folder, reuse Cell Size, r, h
+                            and dipole terms of an unchanged grid (and
+                            tilt), see load_geometry
+            skip_existing- False, if True variables already in field_data
+                           (eg. derived by sliding_window) aren't redone
     """
     alleq = equations(aux=kwargs.get('aux'))
     cc = ValueLocation.CellCentered
     nodal = ValueLocation.Nodal
     eq = tp.data.operate.execute_equation
+    if kwargs.get('skip_existing',False):
+        have = set(field_data.variable_names)
+    else:
+        have = set()
+    def fresh(evaluate):
+        def run(eqset,**kw):
+            todo = {lhs:rhs for lhs,rhs in eqset.items()
+                    if np_equations.strip_name(lhs) not in have}
+            if todo:
+                evaluate(todo,**kw)
+        return run
+    tec_eqeval = fresh(eqeval)
+    if kwargs.get('useNumpy',False):
+        nodal_eqeval = fresh(np_eqeval)
+    else:
+        nodal_eqeval = tec_eqeval
     #Testing variables
     if kwargs.get('verbose',False)or('test'in
                                      kwargs.get('customTerms',{}).keys()):
-        eqeval(alleq['interface_testing'])
+        tec_eqeval(alleq['interface_testing'])
     #General equations
     if (any([var.find('J_')!=-1 for var in field_data.variable_names])and
         any([var.find('`mA')!=-1 for var in field_data.variable_names])):
@@ -1913,8 +2059,21 @@ def get_global_variables(field_data, analysis_type, **kwargs):
         field_data.variable('J_y*').name = 'J_y [uA/m^2]'
         field_data.variable('J_z*').name = 'J_z [uA/m^2]'
     #Useful spatial variables
-    if kwargs.get('is3D',True):
-        tp.macro.execute_extended_command('CFDAnalyzer3',
+    if kwargs.get('is3D',True) and kwargs.get('geometry_cache',False):
+        if type(kwargs.get('geometry_cache'))==str:
+            cache_dir = kwargs.get('geometry_cache')
+        else:
+            cache_dir = None
+        nodal_eqeval(load_geometry(field_data,alleq,cache_dir=cache_dir,
+                                   aux=kwargs.get('aux')))
+        if kwargs.get('only_dipole',False):#use the dipole as the whole field
+            eqeval({'{B_x [nT]}':'{Bdx}',
+                    '{B_y [nT]}':'{Bdy}',
+                    '{B_z [nT]}':'{Bdz}'})
+    elif kwargs.get('is3D',True):
+        new_size = 'Cell Size [Re]' not in have
+        if new_size:
+            tp.macro.execute_extended_command('CFDAnalyzer3',
                                           'CALCULATE FUNCTION = '+
                                           'CELLVOLUME VALUELOCATION = '+
                                           'CELLCENTERED')
@@ -1922,12 +2081,12 @@ def get_global_variables(field_data, analysis_type, **kwargs):
             aux = kwargs.get('aux')
         else:
             aux = field_data.zone('global_field').aux_data
-        eqeval(alleq['basic3d'])
-        if 'dvol [R]^3' in field_data.variable_names:
+        nodal_eqeval(alleq['basic3d'])
+        if new_size and 'dvol [R]^3' in field_data.variable_names:
             eq('{Cell Size [Re]}={dvol [R]^3}**(1/3)',
                                  zones=[field_data.zone('global_field')],
                                  value_location=cc)
-        else:
+        elif new_size:
             tp.macro.execute_extended_command('CFDAnalyzer3',
                                       'CALCULATE FUNCTION = '+
                                       'CELLVOLUME VALUELOCATION = '+
@@ -1935,35 +2094,36 @@ def get_global_variables(field_data, analysis_type, **kwargs):
             eq('{Cell Size [Re]}={Cell Volume}**(1/3)',
                                  zones=[field_data.zone('global_field')],
                                  value_location=cc)
-        eqeval(alleq['dipole_coord'])
-        eqeval(alleq['dipole'])
+        nodal_eqeval(alleq['dipole_coord'])
+        nodal_eqeval(alleq['dipole'])
         #eqeval(alleq['dipole'],value_location=cc)
-        field_data.delete_variables([field_data.variable('Cell Volume')])
+        if new_size:
+            field_data.delete_variables([field_data.variable('Cell Volume')])
         if kwargs.get('only_dipole',False):#use the dipole as the whole field
             eqeval({'{B_x [nT]}':'{Bdx}',
                     '{B_y [nT]}':'{Bdy}',
                     '{B_z [nT]}':'{Bdz}'})
     else:
         if 'XY_zone_index' in kwargs:
-            eqeval(alleq['basic2d_XY'],
+            tec_eqeval(alleq['basic2d_XY'],
                    zones=[kwargs.get('XY_zone_index',1),
                           kwargs.get('XYTri_index',6)])
         else:
-            eqeval(alleq['basic2d_XZ'],
+            tec_eqeval(alleq['basic2d_XZ'],
                    zones=[kwargs.get('XZ_zone_index',0),
                           kwargs.get('XZTri_index',2)])
     #Physical quantities including Pdyn,Beta's,Bmag,Cs:
-    eqeval(alleq['basic_physics'])
+    nodal_eqeval(alleq['basic_physics'])
     #Fieldlinemaping
     if ('OCFLB' in analysis_type or analysis_type=='all') and (
                                                 kwargs.get('is3D',True)):
-        eqeval(alleq['fieldmapping'])
+        nodal_eqeval(alleq['fieldmapping'])
     #Volumetric energy terms
     if 'energy' in analysis_type or analysis_type=='all':
-        eqeval(alleq['volume_energy'])
+        nodal_eqeval(alleq['volume_energy'])
     #Volumetric mass term (kg/Re^3)
     if 'mass' in analysis_type or analysis_type=='all':
-        eqeval(alleq['volume_mass'])
+        nodal_eqeval(alleq['volume_mass'])
     #eqeval(alleq['volume_energy'],value_location=cc)
     if kwargs.get('do_interfacing',False) and ('phi_1 [deg]' in
                                                field_data.variable_names):
@@ -1972,29 +2132,29 @@ def get_global_variables(field_data, analysis_type, **kwargs):
         #eqeval(alleq['daynightmapping'],value_location=cc)
     #Virial volume terms
     if 'virial' in analysis_type or analysis_type=='all':
-        eqeval(alleq['virial_intermediate'],value_location=cc)
-        eqeval(alleq['virial_volume_energy'],value_location=cc)
+        tec_eqeval(alleq['virial_intermediate'],value_location=cc)
+        tec_eqeval(alleq['virial_volume_energy'],value_location=cc)
     #Biot savart
     if ('biotsavart' in analysis_type) or analysis_type=='all':
-        eqeval(alleq['biot_savart'],value_location=cc)
+        tec_eqeval(alleq['biot_savart'],value_location=cc)
     #Energy flux
     if 'energy' in analysis_type or analysis_type=='all':
-        eqeval(alleq['energy_flux'])
+        nodal_eqeval(alleq['energy_flux'])
         #eqeval(alleq['energy_flux'],value_location=cc)
     if 'wave' in analysis_type or analysis_type=='all':
-        eqeval(alleq['wave_energy'],value_location=cc)
+        tec_eqeval(alleq['wave_energy'],value_location=cc)
     #Reconnection variables
     if 'reconnect' in analysis_type:
-        eqeval(alleq['reconnect'])
+        nodal_eqeval(alleq['reconnect'])
         #eqeval(alleq['reconnect'],value_location=cc)
     if 'ffj' in analysis_type:
-        eqeval(alleq['ffj_setup'],value_location=nodal)
-        eqeval(alleq['ffj'],value_location=cc)
+        tec_eqeval(alleq['ffj_setup'],value_location=nodal)
+        tec_eqeval(alleq['ffj'],value_location=cc)
     #trackIM
-    if'trackIM'in analysis_type:eqeval(alleq['trackIM'],value_location=cc)
+    if'trackIM'in analysis_type:tec_eqeval(alleq['trackIM'],value_location=cc)
     #specific entropy
     if 'bs' in kwargs.get('modes',[]):
-        eqeval(alleq['entropy'],value_location=cc)
+        tec_eqeval(alleq['entropy'],value_location=cc)
     #plasmasheet
     if 'plasmasheet' in kwargs.get('modes',[]):
         pass
@@ -2002,9 +2162,9 @@ def get_global_variables(field_data, analysis_type, **kwargs):
     #user_selected
     if 'add_eqset' in kwargs:
         for eq in [eq for eq in alleq if eq in kwargs.get('add_eqset')]:
-            eqeval(alleq[eq],value_location=cc)
+            tec_eqeval(alleq[eq],value_location=cc)
     if 'global_eq' in kwargs:
-        eqeval(kwargs.get('global_eq'))
+        nodal_eqeval(kwargs.get('global_eq'))
 
 def integrate_tecplot(var, zone, *, VariableOption='Scalar'):
     """Function to calculate integral of variable on a 3D exterior surface
@@ -2028,6 +2188,7 @@ def integrate_tecplot(var, zone, *, VariableOption='Scalar'):
                          "ExcludeBlanked='T' "+
                          " PlotResults='F' ")
     #integrate
+    telemetry.count('integrals')
     tp.macro.execute_extended_command(command_processor_id='CFDAnalyzer4',
                                       command=integrate_command)
     #access data via aux data variable that saves last total integr qty
@@ -2102,15 +2263,23 @@ def setup_isosurface(iso_value, varindex, zonename, *,
                      contindex=7, isoindex=7, global_key='global_field',
                                             blankvar='',blankvalue=3,
                                               blankop=RelOp.LessThan,
-                                              keep_zones='largest'):
+                                              keep_zones='largest',
+                                              engine='tecplot'):
     """Function creates an isosurface and then extracts and names the zone
     Inputs
         iso_value
         varindex, contindex, isoindex- storage locations on tecplot side
         zonename
+        engine (str)- 'tecplot', or 'numpy' to extract w isosurface.py and
+                      only load the result into tecplot
     Outputs
         newzone- primary zone created (w/ max elements)
     """
+    if engine=='numpy':
+        return np_setup_isosurface(iso_value, varindex, zonename,
+                                   global_key=global_key, blankvar=blankvar,
+                                   blankvalue=blankvalue, blankop=blankop,
+                                   keep_zones=keep_zones)
     ds = tp.active_frame().dataset
     plt = tp.active_frame().plot()
     #hide all zones not matching global_key
@@ -2174,6 +2343,80 @@ def setup_isosurface(iso_value, varindex, zonename, *,
     else:
         return ds.zone(-1)
 
+def np_setup_isosurface(iso_value, varindex, zonename, *,
+                        global_key='global_field', blankvar='', blankvalue=3,
+                        blankop=RelOp.LessThan, keep_zones='largest',
+                        grid_cache=None):
+    """Function extracts an isosurface w marching tets in numpy and loads
+        the connected region(s) as FETriangle zones, same result as
+        setup_isosurface w/o touching the plot/isosurface/blanking state
+    Inputs
+        see setup_isosurface
+        grid_cache (str)- None, folder to keep grid locators in
+    Outputs
+        newzone- primary zone created, or list of zones for keep_zones='all'
+    """
+    ds = tp.active_frame().dataset
+    source = ds.zone(global_key)
+    ordered = source.zone_type==ZoneType.Ordered
+    xyz = [source.values(c+' *').as_numpy_array() for c in ['X','Y','Z']]
+    grid = locator.get_grid(*xyz,
+                connectivity=(None if ordered else
+                              np.array(source.nodemap.array[:]).reshape(
+                                                    source.num_elements,-1)),
+                shape=(source.dimensions if ordered else None),
+                cache_dir=grid_cache)
+    nodes = isosurface.cell_nodes(grid)
+    values = source.values(varindex).as_numpy_array()
+    if len(values)!=source.num_points:
+        values = (np.bincount(nodes.ravel(),np.repeat(values,8),
+                              source.num_points)/
+                  np.maximum(np.bincount(nodes.ravel(),
+                                         minlength=source.num_points),1))
+    blank = None
+    if blankvar != '':
+        compare = {RelOp.LessThan:np.less,
+                   RelOp.LessThanOrEqual:np.less_equal,
+                   RelOp.GreaterThan:np.greater,
+                   RelOp.GreaterThanOrEqual:np.greater_equal,
+                   RelOp.EqualTo:np.equal,
+                   RelOp.NotEqualTo:np.not_equal}[blankop]
+        blank = compare(source.values(blankvar).as_numpy_array(),blankvalue)
+        if len(blank)!=source.num_points:
+            #cell centered condition, blank the corners of those cells
+            blank = np.bincount(nodes[blank].ravel(),
+                                minlength=source.num_points)>0
+    print('creating isosurface of {}={:.2f}'.format(
+                                    ds.variable(varindex).name,iso_value))
+    surface = isosurface.extract(np.stack(xyz,axis=1),nodes,values,
+                                 iso_value,blank=blank)
+    regions = isosurface.select(surface,keep=('all' if keep_zones=='all'
+                                              else 'largest'))
+    if keep_zones!='all' and (regions==[] or len(regions[0]['faces'])<=200):
+        return None
+    names = ([zonename] if keep_zones!='all' else
+             [zonename+': region '+str(i+1) for i in range(len(regions))])
+    locations = [source.values(i).location for i in range(ds.num_variables)]
+    newzones = []
+    for name,region in zip(names,regions):
+        zone = ds.add_fe_zone(ZoneType.FETriangle,name,
+                              len(region['vertices']),len(region['faces']),
+                              locations=locations)
+        zone.nodemap[:] = region['faces']
+        for i,location in enumerate(locations):
+            if source.values(i).passive:
+                continue
+            sourcevalues = source.values(i).as_numpy_array()
+            if location==ValueLocation.CellCentered:
+                zone.values(i)[:] = sourcevalues[region['cells']]
+            else:
+                zone.values(i)[:] = isosurface.interpolate(region,
+                                                           sourcevalues)
+        newzones.append(zone)
+    if keep_zones=='all':
+        return newzones
+    return ds.zone(zonename)
+
 def calc_state(mode, zones, **kwargs):
     """Function selects which state calculation method to use
     Inputs
@@ -2361,7 +2604,8 @@ def calc_state(mode, zones, **kwargs):
         if kwargs.get('create_zone',True):
             upstream = setup_isosurface(1,state_index,zonename,
                                         blankvar = 'X *',
-                                        blankvalue=kwargs.get('tail_cap',-20))
+                                        blankvalue=kwargs.get('tail_cap',-20),
+                                     engine=kwargs.get('iso_engine','tecplot'))
         #TEMPORARY REROUTE FOR BOW SHOCK MODE
         #   Bow shock detection finds upstream edge where sw properties are
         #   still unshocked, to work around we will:
@@ -2438,11 +2682,13 @@ def calc_state(mode, zones, **kwargs):
     if 'iso_betastar' in mode and kwargs.get('create_zone',True):
         #Generate outersurface with blanking the inner boundary
         zone = setup_isosurface(1, state_index, zonename,blankvar='r *',
-                                blankvalue=kwargs.get('inner_r',3))
+                                blankvalue=kwargs.get('inner_r',3),
+                                engine=kwargs.get('iso_engine','tecplot'))
         #Sphere at fixed radius
         innerzone = setup_isosurface(kwargs.get('inner_r',3),
                             dataset.variable('r *').index,
-                                     zonename+'innerbound',blankvar='')
+                                     zonename+'innerbound',blankvar='',
+                                     engine=kwargs.get('iso_engine','tecplot'))
         #PALEO update subsolar point
         new_subsolar = zone.values('X *').max()
         if 'x_subsolar' in zones[i_primary].aux_data:
@@ -2455,7 +2701,8 @@ def calc_state(mode, zones, **kwargs):
                                     zonename,
                                     blankvar=kwargs.get('blankvar',''),
                                     blankvalue=kwargs.get('blankvalue',3),
-                              keep_zones=kwargs.get('keep_zones','largest'))
+                              keep_zones=kwargs.get('keep_zones','largest'),
+                              engine=kwargs.get('iso_engine','tecplot'))
             if 'sphere' in mode and kwargs.get('sp_rmin',0)>0:
                 # Should have an outer an inner shell as top two largest
                 sizes = [z.num_points for z in newzones]
@@ -2486,13 +2733,15 @@ def calc_state(mode, zones, **kwargs):
             zone = setup_isosurface(iso_value, state_index, zonename,
                                     blankvar=kwargs.get('blankvar',''),
                                     blankvalue=kwargs.get('blankvalue',3),
-                              keep_zones=kwargs.get('keep_zones','largest'))
+                              keep_zones=kwargs.get('keep_zones','largest'),
+                              engine=kwargs.get('iso_engine','tecplot'))
             if 'sphere' in mode and kwargs.get('sp_rmin',0)>0:
                 innerzone = setup_isosurface(kwargs.get('sp_rmin',0),
                                     state_index, zonename+'_inner',
                                     blankvar=kwargs.get('blankvar',''),
                                     blankvalue=kwargs.get('blankvalue',3),
-                              keep_zones=kwargs.get('keep_zones','largest'))
+                              keep_zones=kwargs.get('keep_zones','largest'),
+                              engine=kwargs.get('iso_engine','tecplot'))
             else:
                 innerzone = None
     else:
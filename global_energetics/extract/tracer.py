@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT** for tracing many field lines at once
+    through BATSRUS output (block/octree FEBRICK or ordered grids) w an
+    adaptive RK45 step, instead of one Tecplot streamtrace per seed
+"""
+import numpy as np
+#interpackage modules
+from global_energetics.extract.locator import locate
+
+#Reasons a line stopped
+RUNNING, BODY, OUTSIDE, MAXLENGTH, NULL = 0, 1, 2, 3, 4
+
+#Dormand-Prince 5(4) coefficients
+DP_A = [[],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+DP_E = DP_B-np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200,
+                      187/2100, 1/40])
+
+def _direction(grid, bfield, points, sign):
+    """Function gives unit vector along sign*B at points, w a flag for
+        points that can't be used (off grid or B=0)
+    """
+    nodes, weights, inside = locate(grid,points)
+    b = np.einsum('mc,mck->mk',weights,bfield[nodes])
+    bmag = np.sqrt((b**2).sum(axis=1))
+    good = inside&(bmag>0)&np.isfinite(bmag)
+    b[good] *= (sign/bmag[good])[:,None]
+    b[~good] = 0
+    return b, good, inside
+
+def _crossing(p0, p1, r):
+    """Function gives where the segment p0->p1 first crosses radius r
+    """
+    d = p1-p0
+    a = (d**2).sum(axis=1)
+    b = 2*(p0*d).sum(axis=1)
+    c = (p0**2).sum(axis=1)-r**2
+    with np.errstate(all='ignore'):
+        t = (-b-np.sqrt(np.maximum(b**2-4*a*c,0)))/(2*a)
+    t = np.where(np.isfinite(t),np.clip(t,0,1),1)
+    return p0+t[:,None]*d
+
+def trace_direction(grid, bfield, seeds, sign, **kwargs):
+    """Function traces every seed along sign*B until each line ends
+    Inputs
+        grid (dict)- from build_grid
+        bfield (arr[float])- (n_nodes,3) magnetic field at nodes
+        seeds (arr[float])- (M,3)
+        sign (int)- +1 along B, -1 against
+        kwargs:
+            see trace
+    Returns
+        end (arr[float])- (M,3) last point of each line
+        reason (arr[int])- BODY, OUTSIDE, MAXLENGTH or NULL
+        length (arr[float])- (M,) arc length [same units as grid]
+    """
+    r_inner = kwargs.get('r_inner',2.75)
+    tol = kwargs.get('tol',1e-3)
+    hmin = kwargs.get('hmin',1e-3)
+    hmax = kwargs.get('hmax',1.0)
+    max_length = kwargs.get('max_length',500)
+    max_steps = kwargs.get('max_steps',10000)
+    p = np.array(seeds,dtype=np.float64).reshape(-1,3)
+    M = len(p)
+    h = np.full(M,float(kwargs.get('h0',0.1)))
+    length = np.zeros(M)
+    reason = np.full(M,RUNNING)
+    # Seeds that start inside r_inner only end there after leaving it
+    outside_body = (p**2).sum(axis=1)>=r_inner**2
+    k1, good, inside = _direction(grid,bfield,p,sign)
+    reason[~inside] = OUTSIDE
+    reason[inside&~good] = NULL
+    active = np.flatnonzero(reason==RUNNING)
+    for step in range(max_steps):
+        if len(active)==0:
+            break
+        pa, ha = p[active], h[active]
+        k = [k1[active]]
+        ok = np.ones(len(active),dtype=bool)
+        offgrid = np.zeros(len(active),dtype=bool)
+        for stage in range(1,7):
+            trial = pa+ha[:,None]*sum([a*ki for a,ki in
+                                       zip(DP_A[stage],k) if a!=0])
+            ks, good, inside = _direction(grid,bfield,trial,sign)
+            ok &= good
+            offgrid |= ~inside
+            k.append(ks)
+        new = pa+ha[:,None]*sum([b*ki for b,ki in zip(DP_B,k) if b!=0])
+        err = np.sqrt(((ha[:,None]*sum([e*ki for e,ki in zip(DP_E,k)
+                                       if e!=0]))**2).sum(axis=1))
+        accept = ok&((err<=tol)|(ha<=hmin))
+        # Stages that left the grid (or hit B=0) shrink the step, once
+        #  it's as small as allowed the line ends there
+        stuck = ~ok&(ha<=hmin)
+        reason[active[stuck&offgrid]] = OUTSIDE
+        reason[active[stuck&~offgrid]] = NULL
+        with np.errstate(divide='ignore'):
+            factor = np.where(err>0,0.9*(tol/err)**0.2,5)
+        factor = np.where(ok,np.clip(factor,0.2,5),0.5)
+        h[active] = np.clip(ha*factor,hmin,hmax)
+        # Steps that cross r_inner are retaken shorter so the footpoint
+        #  isn't a long chord
+        r2 = (new**2).sum(axis=1)
+        crossing = (accept&outside_body[active]&(r2<r_inner**2)&(ha>hmin))
+        if np.any(crossing):
+            t = (np.sqrt(((_crossing(pa[crossing],new[crossing],r_inner)-
+                           pa[crossing])**2).sum(axis=1))/
+                 np.sqrt(((new[crossing]-pa[crossing])**2).sum(axis=1)))
+            h[active[crossing]] = np.maximum(np.minimum(0.99*t,0.5)*
+                                             ha[crossing],hmin)
+            accept &= ~crossing
+        moved = active[accept]
+        if len(moved)>0:
+            p0 = p[moved]
+            p[moved] = new[accept]
+            k1[moved] = k[6][accept]
+            length[moved] += ha[accept]
+            r2 = (p[moved]**2).sum(axis=1)
+            body = outside_body[moved]&(r2<r_inner**2)
+            outside_body[moved] |= r2>=r_inner**2
+            p[moved[body]] = _crossing(p0[body],p[moved[body]],r_inner)
+            reason[moved[body]] = BODY
+            reason[moved[(length[moved]>=max_length)&~body]] = MAXLENGTH
+        active = active[reason[active]==RUNNING]
+    reason[active] = MAXLENGTH
+    return p, reason, length
+
+def trace(grid, bfield, seeds, **kwargs):
+    """Function traces field lines from every seed both ways at once and
+        classifies each like the BATSRUS status variable
+    Inputs
+        grid (dict)- from build_grid
+        bfield (arr[float])- (n_nodes,3) magnetic field at nodes
+        seeds (arr[float])- (M,3)
+        kwargs:
+            directions (list[int])- [1,-1], +1 along B, -1 against
+            r_inner (float)- 2.75, line ends when it crosses this radius
+            tol (float)- 1e-3, RK45 error tolerance per step
+            h0, hmin, hmax (float)- 0.1, 1e-3, 1.0 step size limits
+            max_length (float)- 500, line ends after this arc length
+            max_steps (int)- 10000
+    Returns
+        result (dict)- for each direction d: end_d, reason_d, length_d
+                       and combined:
+                       status (arr[int])- 3 closed, 2 north open,
+                                          1 south open, 0 neither
+                       length (arr[float])- total line length
+                       footpoint_north, footpoint_south (arr[float])- (M,3)
+                                       r_inner crossing, NaN if none
+    """
+    bfield = np.asarray(bfield,dtype=np.float64).reshape(-1,3)
+    seeds = np.array(seeds,dtype=np.float64).reshape(-1,3)
+    M = len(seeds)
+    result = {'length':np.zeros(M),
+              'footpoint_north':np.full((M,3),np.nan),
+              'footpoint_south':np.full((M,3),np.nan)}
+    for sign in kwargs.get('directions',[1,-1]):
+        end, reason, length = trace_direction(grid,bfield,seeds,sign,
+                                              **kwargs)
+        name = {1:'forward',-1:'backward'}[sign]
+        result.update({'end_'+name:end,'reason_'+name:reason,
+                       'length_'+name:length})
+        result['length'] += length
+        north = (reason==BODY)&(end[:,2]>=0)
+        south = (reason==BODY)&(end[:,2]<0)
+        result['footpoint_north'][north] = end[north]
+        result['footpoint_south'][south] = end[south]
+    result['status'] = (2*np.isfinite(result['footpoint_north'][:,0])+
+                        np.isfinite(result['footpoint_south'][:,0]))
+    return result
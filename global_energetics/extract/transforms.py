@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Tools that **DONT REQUIRE TECPLOT, GEOPACK or SPACEPY** for rotating
+    vectors between GEI/GEO/GSE/GSM/SM/MAG, sun position, GST and dipole
+    tilt are found for whole arrays of times at once (same formulas as
+    geopack recalc) and vectors are rotated w one einsum over (N,3,3) stacks
+"""
+import numpy as np
+import pandas as pd
+
+#IGRF-13 dipole coefficients [nT] at each epoch, last row is the secular
+# variation [nT/yr] used past the final epoch
+IGRF_EPOCHS = np.arange(1965,2021,5)
+IGRF_DIPOLE = np.array([#g10        g11       h11
+                        [-30334.,   -2119.,   5776.],
+                        [-30220.,   -2068.,   5737.],
+                        [-30100.,   -2013.,   5675.],
+                        [-29992.,   -1956.,   5604.],
+                        [-29873.,   -1905.,   5500.],
+                        [-29775.,   -1848.,   5406.],
+                        [-29692.,   -1784.,   5306.],
+                        [-29619.4,  -1728.2,  5186.1],
+                        [-29554.63, -1669.05, 5077.99],
+                        [-29496.57, -1586.42, 4944.26],
+                        [-29441.46, -1501.77, 4795.99],
+                        [-29404.8,  -1450.9,  4652.5]])
+IGRF_SV = np.array([5.7, 7.4, -25.9])
+SYSTEMS = ['GEI','GEO','GSE','GSM','SM','MAG']
+
+def _time_parts(times):
+    """Function splits times into what the sun/igrf formulas need
+    Inputs
+        times (datetime, list[datetime], DatetimeIndex or arr[datetime64])
+    Returns
+        year (arr[int]), doy (arr[int]), seconds (arr[float]) of the day,
+        decimal year (arr[float])
+    """
+    times = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(times)))
+    year = times.year.values.astype(np.int64)
+    doy = times.dayofyear.values.astype(np.int64)
+    seconds = (times.hour.values*3600+times.minute.values*60+
+               times.second.values).astype(np.float64)
+    ndays = np.where(times.is_leap_year,366,365)
+    return year, doy, seconds, year+(doy-1+seconds/86400)/ndays
+
+def sun(times):
+    """Function gives the sun direction and GST like geopack SUN
+    Inputs
+        times- see _time_parts
+    Returns
+        sun (dict)- gst, slong, srasn, sdec, obliq [rad], each (N,)
+    """
+    year, doy, seconds, _ = _time_parts(times)
+    rad = np.pi/180
+    fday = seconds/86400
+    dj = 365*(year-1900)+(year-1901)//4+doy-0.5+fday
+    t = dj/36525
+    vl = np.mod(279.696678+0.9856473354*dj,360)
+    gst = np.mod(279.690983+0.9856473354*dj+360*fday+180,360)*rad
+    g = np.mod(358.475845+0.985600267*dj,360)*rad
+    slong = np.mod((vl+(1.91946-0.004789*t)*np.sin(g)+
+                    0.020094*np.sin(2*g))*rad,2*np.pi)
+    obliq = (23.45229-0.0130125*t)*rad
+    sob = np.sin(obliq)
+    slp = slong-9.924e-5
+    sind = sob*np.sin(slp)
+    cosd = np.sqrt(1-sind**2)
+    sc = sind/cosd
+    return {'gst':gst,'slong':slong,'obliq':obliq,'sdec':np.arctan(sc),
+            'srasn':np.pi-np.arctan2(np.cos(obliq)/sob*sc,-np.cos(slp)/cosd)}
+
+def dipole_axis(times):
+    """Function gives the north dipole (geomagnetic pole) direction in GEO
+    Inputs
+        times- see _time_parts
+    Returns
+        axis (arr[float])- (N,3) unit vectors
+    """
+    decimal = _time_parts(times)[-1]
+    g10,g11,h11 = [np.interp(decimal,IGRF_EPOCHS,IGRF_DIPOLE[:,i])+
+                   np.maximum(decimal-IGRF_EPOCHS[-1],0)*IGRF_SV[i]
+                   for i in range(3)]
+    axis = np.stack([g11,h11,g10],axis=1)
+    return -axis/np.linalg.norm(axis,axis=1)[:,None]
+
+def axes(times):
+    """Function gives the x,y,z axes of every system as rows in GEI
+    Inputs
+        times- see _time_parts
+    Returns
+        axes (dict{str:arr})- system:(N,3,3), xyz_sys = axes[sys] @ xyz_gei
+                              and 'tilt' (N,) dipole tilt [rad]
+    """
+    s = sun(times)
+    n = len(s['gst'])
+    S = np.stack([np.cos(s['srasn'])*np.cos(s['sdec']),
+                  np.sin(s['srasn'])*np.cos(s['sdec']),
+                  np.sin(s['sdec'])],axis=1)
+    cg, sg = np.cos(s['gst']), np.sin(s['gst'])
+    GEO = np.zeros((n,3,3))
+    GEO[:,0,0], GEO[:,0,1], GEO[:,1,0], GEO[:,1,1] = cg, sg, -sg, cg
+    GEO[:,2,2] = 1
+    # Dipole in GEI, GEO rows are the GEO axes so GEO^T maps back
+    D = np.einsum('nji,nj->ni',GEO,dipole_axis(times))
+    Y = np.cross(D,S)
+    Y /= np.linalg.norm(Y,axis=1)[:,None]
+    GSM = np.stack([S,Y,np.cross(S,Y)],axis=1)
+    ecliptic = np.stack([np.zeros(n),-np.sin(s['obliq']),np.cos(s['obliq'])],
+                        axis=1)
+    GSE = np.stack([S,np.cross(ecliptic,S),ecliptic],axis=1)
+    # SM is GSM turned about y by the tilt so z lies along the dipole
+    sps = (D*S).sum(axis=1)
+    cps = np.sqrt(1-sps**2)
+    SM = np.stack([cps[:,None]*GSM[:,0]-sps[:,None]*GSM[:,2],GSM[:,1],D],
+                  axis=1)
+    # MAG z is the dipole, y is perpendicular to it and the GEO z axis
+    Ymag = np.cross(GEO[:,2],D)
+    Ymag /= np.linalg.norm(Ymag,axis=1)[:,None]
+    MAG = np.stack([np.cross(Ymag,D),Ymag,D],axis=1)
+    GEI = np.broadcast_to(np.eye(3),(n,3,3))
+    return {'GEI':GEI,'GEO':GEO,'GSE':GSE,'GSM':GSM,'SM':SM,'MAG':MAG,
+            'tilt':np.arcsin(sps)}
+
+def dipole_tilt(times):
+    """Function gives the dipole tilt angle, + when the north pole leans
+        toward the sun, same as geopack recalc's return
+    Inputs
+        times- see _time_parts
+    Returns
+        tilt (arr[float])- (N,) [rad]
+    """
+    return axes(times)['tilt']
+
+def matrices(times, frm, to):
+    """Function builds the rotation for every time at once
+    Inputs
+        times- see _time_parts
+        frm, to (str)- one of SYSTEMS
+    Returns
+        T (arr[float])- (N,3,3), xyz_to = T[i] @ xyz_frm
+    """
+    rows = axes(times)
+    return np.einsum('nij,nkj->nik',rows[to.upper()],rows[frm.upper()])
+
+def transform(vectors, times, frm, to):
+    """Function rotates vectors between systems, one time per vector or a
+        single time for all of them
+    Inputs
+        vectors (arr[float])- (N,3) or (3,)
+        times- N times or 1, see _time_parts
+        frm, to (str)- one of SYSTEMS
+    Returns
+        result (arr[float])- same shape as vectors
+    """
+    vectors = np.asarray(vectors,dtype=np.float64)
+    T = matrices(times,frm,to)
+    if len(T)==1:
+        return vectors@T[0].T
+    return np.einsum('nij,nj->ni',T,vectors)
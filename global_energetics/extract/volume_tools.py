@@ -14,73 +14,17 @@ import pandas as pd
 #interpackage modules, different path if running as main to test
 from global_energetics.extract.tec_tools import (get_daymapped_nightmapped,
                                                  make_trade_eq)
-from global_energetics.extract.surface_tools import (energy_to_dB,
+from global_energetics.extract.surface_tools import (
                                         get_open_close_integrands,
                                          get_interface_integrands,
                                                get_dft_integrands,
                                                   conditional_mod,
                                                     calc_integral)
-
-def energy_post_integr(results, **kwargs):
-    """Creates dictionary of key:value combos of existing results
-    Inputs
-        results(dict{str:[value]})
-        kwargs:
-            do_cms
-    Outputs
-        newterms(dict{str:[value]})
-    """
-    newterms = {}
-    df = pd.DataFrame(results)
-    #Combine MAG and HYDRO back into total energy
-    uB = df[[k for k in df.keys() if ('uB' in k)and('uB_dipole'not in k)]]
-    ub = df[[k for k in df.keys() if 'u_db' in k]]
-    uH = df[[k for k in df.keys() if 'Hydro' in k]]
-    if (not uB.empty) and (not uH.empty):
-        u1_values = uB.values + uH.values #including dipole field
-        u1_keys =['Utot'.join(k.split('uB'))for k in df.keys()if('uB' in k)and
-                                                        ('uB_dipole'not in k)]
-        for k in enumerate(u1_keys):df[k[1]]=u1_values[0][k[0]]
-    if (not ub.empty) and (not uH.empty):
-        u2_values = ub.values + uH.values #disturbance energy
-        u2_keys=['Utot2'.join(k.split('u_db'))for k in df.keys()if'u_db'in k]
-        for k in enumerate(u2_keys):df[k[1]]=u2_values[0][k[0]]
-    if kwargs.get('do_cms', False):
-        #Combine 'acquisitions' and 'forfeitures' back into net
-        acqus = df[[k for k in df.keys()if 'acqu' in k]]
-        forfs = df[[k for k in df.keys()if 'forf' in k]]
-        net_values = acqus.values+forfs.values
-        net_keys = ['_net'.join(k.split('_acqu')) for k in df.keys()
-                    if 'acqu' in k]
-        for k in enumerate(net_keys):df[k[1]]=net_values[0][k[0]]
-    for key in df.keys(): newterms[key] = [df[key].values[0]]
-    return newterms
-
-def virial_post_integr(results,**kwargs):
-    """Creates dictionary of key:value combos of existing results
-    Inputs
-        results(dict{str:[value]})
-    Outputs
-        newterms(dict{str:[value]})
-    """
-    newterms = {}
-    #Virial volume terms
-    newterms.update({'Virial Volume Total [J]':
-                                          [results['Virial 2x Uk [J]'][0]+
-                                            results['Virial Ub [J]'][0]]})
-    if kwargs.get('do_cms', False):
-        df = pd.DataFrame(results)
-        #Combine 'acquisitions' and 'forfeitures' back into net
-        acqus = df[[k for k in df.keys()if 'acqu' in k]]
-        forfs = df[[k for k in df.keys()if 'forf' in k]]
-        net_values = acqus.values+forfs.values
-        net_keys = ['_net'.join(k.split('_acqu')) for k in df.keys()
-                    if 'acqu' in k]
-        for k in enumerate(net_keys):df[k[1]]=net_values[0][k[0]]
-    #Convert from J to nT
-    for newterm in newterms.copy().items():
-        newterms.update(energy_to_dB(newterm))
-    return newterms
+from global_energetics.extract.np_integrals import (VOLUME_TERMS,
+                                                   energy_post_integr,
+                                                   virial_post_integr,
+                                                   np_calc_integral,
+                                                   np_sweep_integrals)
 
 def get_imtrack_integrands(state_var):
     """Creates dictionary of terms to be integrated for IM track analysis
@@ -124,7 +68,7 @@ def get_mass_integrands(state_var):
     eq = tp.data.operate.execute_equation
     existing_variables = state_var.dataset.variable_names
     #Integrands
-    integrands = ['M [kg/Re^3]']
+    integrands = list(VOLUME_TERMS['mass'])
     for term in integrands:
         name = term.split(' ')[0]
         if name+state not in existing_variables:
@@ -144,8 +88,7 @@ def get_virial_integrands(state_var):
     eq = tp.data.operate.execute_equation
     existing_variables = state_var.dataset.variable_names
     #Integrands
-    integrands = ['Virial Ub [J/Re^3]','Virial 2x Uk [J/Re^3]',
-                  'rhoU_r [Js/Re^3]', 'Pth [J/Re^3]']
+    integrands = list(VOLUME_TERMS['virial'])
     #Debug:
     '''
     integrands = ['Virial Ub [J/Re^3]','Virial 2x Uk [J/Re^3]',
@@ -197,7 +140,7 @@ def get_energy_integrands(state_var):
     #integrands = ['uB [J/Re^3]','uB_dipole [J/Re^3]','u_db [J/Re^3]',
     #              'uHydro [J/Re^3]']
     #integrands = ['Utot [J/Re^3]','test']
-    integrands = ['uB [J/Re^3]','uHydro [J/Re^3]']
+    integrands = list(VOLUME_TERMS['energy'])
     for term in integrands:
         name = term.split(' ')[0]
         if 'Pth' in term:
@@ -268,6 +211,8 @@ def get_volume_trades(zone,integrands,**kwargs):
         integrands
         kwargs:
             do_central_diff
+            np_terms(dict)- if given, no tecplot variables are made, trades
+                            are recorded here for np_calc_integral instead
     Returns
         trade_integrands
     """
@@ -277,7 +222,7 @@ def get_volume_trades(zone,integrands,**kwargs):
     tdelta=str(kwargs.get('tdelta',60)*2)
     analysis_type = kwargs.get('analysis_type','')
     trade_integrands,td,eq = {}, str(tdelta), tp.data.operate.execute_equation
-    tradelist = []
+    trades = []
     state_name = kwargs.get('state_var').name
     if 'daynight' not in zone.dataset.variable_names:
         skip_daynightmapping = True
@@ -299,22 +244,22 @@ def get_volume_trades(zone,integrands,**kwargs):
          not skip_daynightmapping):
         #M5a    from  day_closed    ->  ext
         #M5b    from  night_closed  ->  ext
-        tradelist.append(make_trade_eq(dayclosed,ext,'M5a',tdelta))
-        tradelist.append(make_trade_eq(nightclosed,ext,'M5b',tdelta))
+        trades.append((dayclosed,ext,'M5a'))
+        trades.append((nightclosed,ext,'M5b'))
         if ('NLobe' in zone.dataset.variable_names and
             'SLobe' in zone.dataset.variable_names):
             #M2a    from  day_closed    ->  lobes
             #M2b    from  night_closed  ->  lobes
-            tradelist.append(make_trade_eq(dayclosed,lobes,'M2a',tdelta))
-            tradelist.append(make_trade_eq(nightclosed,lobes,'M2b',tdelta))
+            trades.append((dayclosed,lobes,'M2a'))
+            trades.append((nightclosed,lobes,'M2b'))
             #tradelist.append(make_trade_eq(dayclosed,nightlobes,'M2c',tdelta))
         #Mic    from  day_closed    <-  night_closed
-        tradelist.append(make_trade_eq(nightclosed,dayclosed,'Mic',tdelta))
+        trades.append((nightclosed,dayclosed,'Mic'))
     # North Lobe
     if ('NLobe' in zone.dataset.variable_names and 'NLobe' in state_name and
          not skip_daynightmapping):
         #M1    from  lobeN     ->  ext
-        tradelist.append(make_trade_eq(lobeN,ext,'M1',tdelta))
+        trades.append((lobeN,ext,'M1'))
         #tradelist.append(make_trade_eq(nightlobeN,ext,'M1b',tdelta))
         if 'lcb' in zone.dataset.variable_names:
             #M2a    from  lobeN         <-  day_closed
@@ -327,7 +272,7 @@ def get_volume_trades(zone,integrands,**kwargs):
     if ('SLobe' in zone.dataset.variable_names and 'SLobe' in state_name and
          not skip_daynightmapping):
         #M1    from  lobeS     ->  ext
-        tradelist.append(make_trade_eq(lobeS,ext,'M1',tdelta))
+        trades.append((lobeS,ext,'M1'))
         #tradelist.append(make_trade_eq(nightlobeS,ext,'M1b',tdelta))
         if 'lcb' in zone.dataset.variable_names:
             #M2a    from  lobeS     <-  day_closed
@@ -339,7 +284,7 @@ def get_volume_trades(zone,integrands,**kwargs):
     # Plasmasheet
     if 'plasmasheet_0.3' in zone.dataset.variable_names:
         #M    from  plasmasheet     ->  not_plasmasheet
-        tradelist.append(make_trade_eq(plasmasheet,not_plasmasheet,'M',tdelta))
+        trades.append((plasmasheet,not_plasmasheet,'M'))
     # Debug trades (linear combinations of above, for testing only!)
     if 'mp' in state_name:
         lobes = '({NLobe}==1 || {SLobe}==1)'
@@ -349,20 +294,29 @@ def get_volume_trades(zone,integrands,**kwargs):
         # M2    from  lobes     ->  closed
         # M5    from  closed    ->  ext
         # M     from  interior  ->  ext
-        tradelist.append(make_trade_eq(lobes,ext,'M1',tdelta))
-        tradelist.append(make_trade_eq(lobes,closed,'M2',tdelta))
-        tradelist.append(make_trade_eq(closed,ext,'M5',tdelta))
-        tradelist.append(make_trade_eq(interior,ext,'M',tdelta))
+        trades.append((lobes,ext,'M1'))
+        trades.append((lobes,closed,'M2'))
+        trades.append((closed,ext,'M5'))
+        trades.append((interior,ext,'M'))
     # Evaluate all equations and update the integrands for return
     for varstr,name in integrands.items():
-        for tradestr in tradelist:
+        for from_state,to_state,tradetag in trades:
             qty,unit = name.split(' ')
-            tradetag = tradestr.split('{name')[1].split('}')[0]
+            tradestr = make_trade_eq(from_state,to_state,tradetag,tdelta)
             new_eq = tradestr.replace('value',varstr).replace('name',qty)
             if unit=='[J]':
                 newunit = '[W]'
             elif unit=='[kg]':
                 newunit = '[kg/s]'
+            if 'np_terms' in kwargs:
+                #Skip tecplot, np_calc_integral builds the trade itself
+                kwargs['np_terms'][qty+tradetag] = {
+                        'base':varstr,
+                        'trade':(from_state,to_state),
+                        'tdelta':float(tdelta),
+                        'source_list':kwargs.get('source_list',[1,2,3])}
+                trade_integrands[qty+tradetag]=' '.join([qty+tradetag,newunit])
+                continue
             try:
                 eq(new_eq,zones=[zone],value_location=ValueLocation.Nodal)
                 trade_integrands[qty+tradetag]=' '.join([qty+tradetag,newunit])
@@ -561,6 +515,8 @@ def volume_analysis(state_var, **kwargs):
                                              integrands,
                                              **kwargs)
         '''
+    if 'truegridfile' in kwargs:
+        kwargs['np_terms'], kwargs['np_cache'] = {}, {}
     if kwargs.get('do_interfacing',False) and kwargs.get('do_cms',False):
         interface_terms = get_volume_trades(global_zone,base_integrands,
                                                 **kwargs,state_var=state_var)
@@ -573,15 +529,18 @@ def volume_analysis(state_var, **kwargs):
                                                 base_integrands,**kwargs))
     ###################################################################
     #Evaluate integrals
-    if 'truegridfile' in kwargs:
-        useNumpy = True
-    else:
-        useNumpy = False
+    useNumpy = 'truegridfile' in kwargs
     if kwargs.get('verbose',False):
         print('{:<20}{:<25}{:<9}'.format('Volume','Term','Value'))
         print('{:<20}{:<25}{:<9}'.format('******','****','*****'))
+    if useNumpy:
+        results.update(np_calc_integral(integrands, global_zone,
+                                        weight='trueCellVolume',
+                                        np_terms=kwargs['np_terms'],
+                                        np_cache=kwargs['np_cache']))
     for term in integrands.items():
-        results.update(calc_integral(term, global_zone,useNumpy=useNumpy))
+        if not useNumpy:
+            results.update(calc_integral(term, global_zone))
         if kwargs.get('verbose',False):
             print('{:<20}{:<25}{:>.3}'.format(
                       state_var.name,term[1],results[term[1]][0]))
@@ -623,4 +582,3 @@ def volume_analysis(state_var, **kwargs):
         results.update(energy_post_integr(results, **kwargs))
     #blank.active = False
     return pd.DataFrame(results)
-
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Background prefetch of input files, the next few files are decompressed
+    (or loaded) by a thread while the current one is being analyzed
+"""
+import os
+import gzip
+import queue
+import shutil
+import tempfile
+import threading
+
+def decompress(filename, scratch):
+    """Function streams a .gz file into scratch, plain files are returned
+        as is w no copy
+    Inputs
+        filename (str)
+        scratch (str)- directory for the decompressed copy
+    Returns
+        local (str)- path to the usable file
+    """
+    if not filename.endswith('.gz'):
+        return filename
+    local = os.path.join(scratch,os.path.basename(filename)[0:-3])
+    #Write under a temp name so a half written file is never picked up
+    with gzip.open(filename,'rb') as fin, open(local+'.part','wb') as fout:
+        shutil.copyfileobj(fin,fout,length=16*1024*1024)
+    os.replace(local+'.part',local)
+    return local
+
+def start(files, **kwargs):
+    """Function starts a thread that prepares files in order, at most
+        depth of them are held ready at a time
+    Inputs
+        files (list[str])- in the order they'll be used
+        kwargs:
+            depth (int)- 2, number of files ready ahead of the consumer
+            scratch (str)- node local dir, default $TMPDIR or /tmp
+            loader (function)- filename->item, default is decompress into
+                               scratch, eg. sliding_window.load_snapshot
+                               to keep everything in memory instead
+    Returns
+        fetcher (dict)- queue, thread, stop, scratch, created
+    """
+    scratch = tempfile.mkdtemp(prefix='prefetch_',
+                               dir=kwargs.get('scratch',
+                                             os.environ.get('TMPDIR')))
+    fetcher = {'queue':queue.Queue(maxsize=max(1,kwargs.get('depth',2))),
+               'stop':threading.Event(),
+               'scratch':scratch,
+               'created':set()}
+    loader = kwargs.get('loader',lambda f: decompress(f,scratch))
+    def fill():
+        for filename in files:
+            if fetcher['stop'].is_set():
+                break
+            try:
+                item = loader(filename)
+            except Exception as err:
+                item = err
+            if type(item)==str and item!=filename:
+                fetcher['created'].add(item)
+            while not fetcher['stop'].is_set():
+                try:
+                    fetcher['queue'].put((filename,item),timeout=1)
+                    break
+                except queue.Full:
+                    continue
+        fetcher['queue'].put(None)
+    fetcher['thread'] = threading.Thread(target=fill,daemon=True)
+    fetcher['thread'].start()
+    return fetcher
+
+def items(fetcher):
+    """Generator that yields (filename, item) as they become ready
+    Inputs
+        fetcher (dict)- from start
+    Yields
+        filename (str), item- local path or whatever loader returned
+    """
+    while True:
+        entry = fetcher['queue'].get()
+        if entry is None:
+            return
+        if isinstance(entry[1],Exception):
+            raise entry[1]
+        yield entry
+
+def release(fetcher, item):
+    """Function removes a decompressed file once it isn't needed anymore,
+        original input files are never touched
+    """
+    if item in fetcher['created']:
+        fetcher['created'].discard(item)
+        if os.path.exists(item):
+            os.remove(item)
+
+def stop(fetcher):
+    """Function stops the thread and cleans up everything in scratch
+    """
+    fetcher['stop'].set()
+    while fetcher['thread'].is_alive():
+        try:
+            fetcher['queue'].get(timeout=0.1)
+        except queue.Empty:
+            pass
+    shutil.rmtree(fetcher['scratch'],ignore_errors=True)
+    fetcher['created'].clear()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Keeps track of which snapshots in a run are pending/running/queued/done/
+    failed w a JSON-lines manifest, so a parallel run can resume exactly
+    where it stopped and each file's runtime is kept for throughput numbers
+"""
+import os
+import json
+import time
+import socket
+import traceback
+import numpy as np
+
+STATES = ['pending','running','queued','done','failed']
+
+def key(filename):
+    """Function gives the manifest key for a file (path independent)
+    """
+    return os.path.basename(filename)
+
+def update(path, filename, state, **kwargs):
+    """Function appends one state change to the manifest, one line per
+        record so appends from many workers don't need a lock
+    Inputs
+        path (str)- manifest file, eg. outputpath/manifest.jsonl
+        filename (str)- snapshot file
+        state (str)- pending, running, queued, done or failed, queued is
+                     analyzed but waiting on the store writer
+        kwargs:
+            anything json friendly, eg. runtime=12.3, error='...'
+    """
+    if state not in STATES:
+        raise ValueError('state '+state+' not in '+str(STATES))
+    record = {'file':key(filename),'path':filename,'state':state,
+              'stamp':time.time(),'host':socket.gethostname(),
+              'pid':os.getpid()}
+    record.update(kwargs)
+    with open(path,'a') as manifest:
+        manifest.write(json.dumps(record)+'\n')
+        manifest.flush()
+
+def load_manifest(path):
+    """Function replays the manifest, latest record for each file wins
+    Inputs
+        path (str)
+    Returns
+        manifest (dict{str:dict})- file key: latest record
+    """
+    manifest = {}
+    if not os.path.exists(path):
+        return manifest
+    with open(path,'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue#partial line from a killed job
+            previous = manifest.get(record['file'],{})
+            if record['state']=='queued' and previous.get('state')=='done':
+                #Writer stored it before the worker got to say queued
+                previous.setdefault('runtime',record.get('runtime'))
+                continue
+            if record['state']=='done' and 'runtime' in previous:
+                record.setdefault('runtime',previous['runtime'])
+            manifest[record['file']] = record
+    return manifest
+
+def init_manifest(path, files, **kwargs):
+    """Function adds any new files as pending and resets work that was
+        left 'running' by a crash or walltime kill, or 'queued' but never
+        stored by the writer
+    Inputs
+        path (str)- manifest file
+        files (list[str])- all files in the run, sorted in time
+        kwargs:
+            retry_failed (bool)- False, put failed files back to pending
+    Returns
+        todo (list[str])- files still to do, in the order of files
+    """
+    manifest = load_manifest(path)
+    for f in files:
+        record = manifest.get(key(f))
+        if record is None:
+            update(path,f,'pending')
+        elif record['state'] in ['running','queued']:
+            update(path,f,'pending',note='reset, was '+record['state']+
+                           ' on '+record.get('host','')+':'+
+                           str(record.get('pid')))
+        elif record['state']=='failed' and kwargs.get('retry_failed',False):
+            update(path,f,'pending',note='retry')
+    manifest = load_manifest(path)
+    return [f for f in files if manifest[key(f)]['state']=='pending']
+
+def blocks(files, nworkers, **kwargs):
+    """Function splits time sorted files into contiguous blocks, more
+        blocks than workers so the last ones don't sit idle
+    Inputs
+        files (list[str])
+        nworkers (int)
+        kwargs:
+            per_worker (int)- 4, blocks per worker
+    Returns
+        blocks (list[list[str]])
+    """
+    nblocks = max(1,min(len(files),nworkers*kwargs.get('per_worker',4)))
+    bounds = np.linspace(0,len(files),nblocks+1).astype(int)
+    return [files[start:end] for start,end in zip(bounds[0:-1],bounds[1::])
+                                                           if end>start]
+
+def run(path, filename, func, *args, finished='done', **kwargs):
+    """Function calls func w state + timing recorded in the manifest,
+        exceptions are recorded as failed and not raised
+    Inputs
+        path (str)- manifest file
+        filename (str)- snapshot being worked on
+        func (function)- the work, called as func(*args,**kwargs)
+        finished (str)- 'done', or 'queued' if results go to the store
+                        writer, which marks it done once they're written
+    Returns
+        result- whatever func returns, None if failed
+    """
+    update(path,filename,'running')
+    start = time.time()
+    try:
+        result = func(*args,**kwargs)
+    except Exception as err:
+        update(path,filename,'failed',runtime=time.time()-start,
+               error=repr(err),traceback=traceback.format_exc())
+        return None
+    update(path,filename,finished,runtime=time.time()-start)
+    return result
+
+def summary(path):
+    """Function gives counts for each state and timing of finished work
+    Inputs
+        path (str)- manifest file
+    Returns
+        summary (dict)- state counts, total/mean runtime [s], files/hr
+    """
+    manifest = load_manifest(path)
+    result = {state:0 for state in STATES}
+    for record in manifest.values():
+        result[record['state']]+=1
+    runtimes = [r['runtime'] for r in manifest.values()
+                                  if r['state']=='done' and 'runtime' in r]
+    result['runtime_total'] = float(np.sum(runtimes))
+    result['runtime_mean'] = float(np.mean(runtimes)) if runtimes else 0.
+    stamps = [r['stamp'] for r in manifest.values() if r['state']=='done']
+    if len(stamps)>1 and max(stamps)>min(stamps):
+        result['files_per_hour'] = 3600*(len(stamps)-1)/(max(stamps)-
+                                                         min(stamps))
+    else:
+        result['files_per_hour'] = 0.
+    result['failed_files'] = [r['path'] for r in manifest.values()
+                                               if r['state']=='failed']
+    return result
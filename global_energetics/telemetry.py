@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Nested timing spans (wall, cpu, peak RSS, counts) written as JSON-lines,
+    one trace file per worker, and an aggregator to find the hot spots of
+    a whole run. Spans cost next to nothing until configure is called
+"""
+import os,sys
+import json
+import glob
+import time
+import socket
+import resource
+import functools
+import contextlib
+import pandas as pd
+
+#Per process state, spans are expected to be opened from one thread
+STATE = {'path':None,'stack':[],'next_id':0,'labels':{}}
+
+def configure(path, **kwargs):
+    """Function turns tracing on for this process
+    Inputs
+        path (str)- trace file, or a folder to get trace_<host>_<pid>.jsonl
+                    None turns tracing back off
+        kwargs:
+            any json friendly labels put on every record, eg. file='...'
+    Returns
+        path (str)- the file records go to
+    """
+    if path is not None and (os.path.isdir(path) or
+                             not path.endswith('.jsonl')):
+        os.makedirs(path,exist_ok=True)
+        path = os.path.join(path,'trace_'+socket.gethostname()+'_'+
+                                 str(os.getpid())+'.jsonl')
+    STATE['path'] = path
+    STATE['labels'] = dict(kwargs)
+    return path
+
+def label(**kwargs):
+    """Function updates the labels put on every record, eg. current file
+    """
+    STATE['labels'].update(kwargs)
+
+def _maxrss():
+    #ru_maxrss is kB on linux, bytes on mac
+    scale = 2**20 if sys.platform=='darwin' else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/scale
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Context manager timing the block inside it
+    Inputs
+        name (str)- eg. 'surface_analysis'
+        attrs- json friendly details, eg. zone='mp_iso_betastar'
+    Yields
+        record (dict)- can be added to before the block ends
+    """
+    if STATE['path'] is None:
+        yield {}
+        return
+    STATE['next_id'] += 1
+    parent = STATE['stack'][-1] if STATE['stack'] else None
+    record = {'name':name,'id':STATE['next_id'],
+              'parent':parent['id'] if parent else None,
+              'depth':len(STATE['stack']),'attrs':attrs,'counts':{}}
+    STATE['stack'].append(record)
+    rss0 = _maxrss()
+    start, cpu0, stamp = time.perf_counter(), time.process_time(), time.time()
+    try:
+        yield record
+    except BaseException as err:
+        record['error'] = repr(err)
+        raise
+    finally:
+        record['wall'] = time.perf_counter()-start
+        record['cpu'] = time.process_time()-cpu0
+        record['maxrss_MB'] = _maxrss()
+        record['rss_growth_MB'] = record['maxrss_MB']-rss0
+        record['stamp'] = stamp
+        record['pid'] = os.getpid()
+        #Kept apart so a label can never overwrite name/wall/cpu etc.
+        record['labels'] = dict(STATE['labels'])
+        STATE['stack'].pop()
+        #Counts are inclusive, like wall time
+        if parent is not None:
+            for key,n in record['counts'].items():
+                parent['counts'][key] = parent['counts'].get(key,0)+n
+        with open(STATE['path'],'a') as trace:
+            trace.write(json.dumps(record,default=str)+'\n')
+
+def traced(name=None):
+    """Decorator putting a span around every call of a function
+    Inputs
+        name (str)- default is the function name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args,**kwargs)
+        return wrapper
+    return decorator
+
+def count(key, n=1):
+    """Function adds to a counter of the innermost open span, eg. number
+        of equations executed
+    """
+    if STATE['stack']:
+        counts = STATE['stack'][-1]['counts']
+        counts[key] = counts.get(key,0)+n
+
+def load_trace(path):
+    """Function reads trace files into one table
+    Inputs
+        path (str)- trace file or folder of trace_*.jsonl
+    Returns
+        trace (DataFrame)- one row per span, w self time (wall minus
+                           direct children), counts as count_<key> and
+                           labels as label_<key>
+    """
+    files = ([path] if os.path.isfile(path) else
+             sorted(glob.glob(os.path.join(path,'trace_*.jsonl'))))
+    records = []
+    for filename in files:
+        with open(filename,'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue#partial line from a killed job
+                for key,n in record.pop('counts',{}).items():
+                    record['count_'+key] = n
+                for key,value in record.pop('labels',{}).items():
+                    record['label_'+key] = value
+                records.append(record)
+    trace = pd.DataFrame(records)
+    if trace.empty:
+        return trace
+    nested = trace.dropna(subset=['parent'])
+    children = nested.groupby([nested['pid'],nested['parent'].astype(int)]
+                              )['wall'].sum().to_dict()
+    trace['self'] = trace['wall']-[children.get((p,i),0) for p,i in
+                                   zip(trace['pid'],trace['id'])]
+    return trace
+
+def hotspots(path, *, by='name', top=20):
+    """Function aggregates a run's trace to find where the time goes
+    Inputs
+        path (str)- see load_trace
+        by (str or list[str])- 'name', or eg. ['name','attrs'] per zone,
+                               ['name','label_file'] per file
+        top (int)- 20, rows kept
+    Returns
+        table (DataFrame)- calls, wall/self/cpu totals + mean wall, peak
+                           rss and summed counts, sorted by self time
+    """
+    trace = load_trace(path)
+    if trace.empty:
+        return trace
+    if 'attrs' in trace:
+        trace['attrs'] = trace['attrs'].apply(
+                          lambda a: json.dumps(a,sort_keys=True) if a else '')
+    grouped = trace.groupby(by)
+    table = pd.DataFrame({'calls':grouped.size(),
+                          'wall_total':grouped['wall'].sum(),
+                          'self_total':grouped['self'].sum(),
+                          'cpu_total':grouped['cpu'].sum(),
+                          'wall_mean':grouped['wall'].mean(),
+                          'maxrss_MB':grouped['maxrss_MB'].max()})
+    for key in [k for k in trace.keys() if k.startswith('count_')]:
+        table[key] = grouped[key].sum()
+    table['self_fraction'] = table['self_total']/trace['self'].sum()
+    return table.sort_values('self_total',ascending=False).head(top)
+
+if __name__ == "__main__":
+    #python -m global_energetics.telemetry outputpath/trace [-z]
+    #   -z splits each span name by its attributes (eg. zone)
+    table = hotspots(sys.argv[1],by=(['name','attrs'] if '-z' in sys.argv
+                                     else 'name'))
+    with pd.option_context('display.max_rows',None,'display.width',200):
+        print(table)
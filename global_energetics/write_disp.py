@@ -5,11 +5,16 @@ import sys
 import os
 import time
 import glob
+import warnings
+import traceback
+import multiprocessing
 import numpy as np
 import datetime as dt
 import pandas as pd
 #import spacepy as sp
 import tecplot as tp
+#interpackage modules
+from global_energetics import makevideo, scheduler
 
 def write_mesh(filename, zonename, timedata, mesh):
     """Function writes out 3D mesh data to hdf5 file
@@ -50,6 +55,152 @@ def write_to_hdf(filename, data):
                 #from IPython import embed; embed()
                 store.get_storer(key).attrs.time = data[key].attrs['time']
 
+def append_to_store(filename, data, **kwargs):
+    """Function appends one snapshot of results to the run's store, each
+        key is a chunked hdf5 table that grows w every append, time is
+        moved into the index (same layout as combine_hdfs2 output)
+    Inputs
+        filename- for output, one per run
+        data (Dict of DataFrames)- dictionary with name and associated df
+        kwargs:
+            timekey (str)- 'Time [UTC]'
+            complevel (int)- 5, blosc compression level
+    """
+    timekey = kwargs.get('timekey','Time [UTC]')
+    pathstring = os.path.dirname(filename)
+    if pathstring!='':
+        os.makedirs(pathstring, exist_ok=True)
+    with pd.HDFStore(filename,mode='a',complib='blosc',
+                     complevel=kwargs.get('complevel',5)) as store:
+        for key,df in data.items():
+            if type(df) != type(pd.DataFrame()):
+                raise TypeError ('append_to_store expects Dict of DataFrames')
+            df = df.copy()
+            if timekey in df.keys():
+                df.index = pd.DatetimeIndex(df[timekey],name=timekey)
+                df.drop(columns=[timekey],inplace=True)
+            #Keep a single numeric type so tables don't conflict later
+            for col in df.keys():
+                if df[col].dtype.kind in 'biu':
+                    df[col] = df[col].astype(float)
+            if len(df.keys())==0 or len(df)==0:
+                continue
+            if '/'+key.strip('/') in store.keys():
+                columns = list(store.select(key,stop=0).columns)
+                extra = [c for c in df.keys() if c not in columns]
+                if len(extra)>0:
+                    #Tables can't grow columns, rewrite this key w them
+                    warnings.warn(key+' new columns, rewriting table: '+
+                                  str(extra))
+                    columns = columns+extra
+                    existing = store.select(key).reindex(columns=columns)
+                    store.remove(key)
+                    store.append(key,existing,format='table',index=False)
+                df = df.reindex(columns=columns)
+            store.append(key,df,format='table',index=False)
+
+def store_writer(filename, queue, failures, **kwargs):
+    """Function for the single writer process, appends everything workers
+        put on the queue until it gets None
+    Inputs
+        filename- store, see append_to_store
+        queue (multiprocessing.Queue)- items are Dict of DataFrames, or
+                                       (source file, Dict of DataFrames)
+        failures (multiprocessing.Queue)- gets a dict for every item that
+                                          couldn't be written, then None
+        kwargs:
+            manifest (str)- if given, source files are marked done (or
+                            failed) there as soon as they're written
+            see append_to_store
+    """
+    manifest = kwargs.pop('manifest',None)
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        source, data = item if type(item)==tuple else (None, item)
+        try:
+            append_to_store(filename, data, **kwargs)
+        except Exception as err:
+            print('STORE WRITER failed on '+str(source)+' '+
+                  str(list(data.keys()))+'\n'+traceback.format_exc())
+            failures.put({'file':source,'error':repr(err),
+                          'traceback':traceback.format_exc()})
+            if manifest is not None and source is not None:
+                scheduler.update(manifest,source,'failed',error=repr(err),
+                                 traceback=traceback.format_exc(),
+                                 note='store write')
+            continue
+        if manifest is not None and source is not None:
+            scheduler.update(manifest,source,'done',note='stored')
+    failures.put(None)
+
+def start_store_writer(filename, **kwargs):
+    """Function starts the writer process so many workers can append to
+        the same store safely
+    Inputs
+        filename- store, see append_to_store
+        kwargs:
+            maxsize (int)- 64, items waiting before workers block
+            see store_writer
+    Returns
+        writer (dict)- queue, failures, process, filename
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue(maxsize=kwargs.pop('maxsize',64))
+    failures = context.Queue()
+    process = context.Process(target=store_writer,
+                              args=(filename,queue,failures),
+                              kwargs=kwargs,daemon=True)
+    process.start()
+    return {'queue':queue,'failures':failures,'process':process,
+            'filename':filename}
+
+def stop_store_writer(writer):
+    """Function lets the writer finish whatever is queued then stops it
+    Returns
+        failed (list[dict])- file, error, traceback of each item that was
+                             not written, so callers can mark them failed
+    """
+    writer['queue'].put(None)
+    failed = []
+    while True:
+        failure = writer['failures'].get()
+        if failure is None:
+            break
+        failed.append(failure)
+    writer['process'].join()
+    return failed
+
+def load_store(filename, *, keys=None):
+    """Function reads the run's store, one read per key, sorted in time
+    Inputs
+        filename
+        keys (list[str])- None for all
+    Returns
+        data (dict{str:DataFrame})
+    """
+    data = {}
+    with pd.HDFStore(filename,mode='r') as store:
+        for key in (store.keys() if keys is None else keys):
+            data[key] = store.select(key).sort_index(kind='mergesort')
+    return data
+
+def hdfs_to_store(datapath, filename, *, progress=True):
+    """Function appends older one-file-per-snapshot output into the store
+        so both end up in one place
+    Inputs
+        datapath- folder w energetics_*.h5 files
+        filename- store, see append_to_store
+    """
+    filelist = sorted(glob.glob(os.path.join(datapath,'*.h5')))
+    for i,infile in enumerate(filelist):
+        if progress:
+            print('{:>4}/{:<4}\t{:<25}'.format(i+1,len(filelist),infile))
+        with pd.HDFStore(infile,mode='r') as input_data:
+            data = {key:input_data[key] for key in input_data.keys()}
+        append_to_store(filename, data)
+
 def display_progress(meshfile, integralfile, zonename):
     """Function displays current status of hdf5 files
     Inputs
@@ -87,85 +238,125 @@ def display_progress(meshfile, integralfile, zonename):
     print(result)
     print('**************************************************************')
 
+def _nrows(storer):
+    """Function gets the number of rows in a stored frame w/o reading it
+    """
+    if getattr(storer,'nrows',None) is not None:
+        return int(storer.nrows)
+    return int(storer.shape[0])
+
 def combine_to_multi_index(datapath,outputpath,**kwargs):
     """Function combines .h5 files and stores common dataframes within the
         store in a multiIndex dataframe within an output .h5 file. This is
         useful for data which multi-dimensional and not sparse. For instance
         2500+ timesteps with 6 fluxes across ~90000 flux points.
+        Two passes: the first only reads headers to get sizes, the second
+        copies each file once into preallocated arrays
     Inputs
         datapath
         outpath
+        kwargs:
+            combo_name (str)- 'test.h5'
+            progress (bool)- True
+            cube (bool)- False, if True also write each key as a
+                         (time, point, variable) .npy cube (memory mapped
+                         while filling, NaN padded) + _index.npz w times,
+                         point counts and columns, see load_flux_cube
+            multi (bool)- True, write the multiIndex dataframes
+    Returns
+        layout (dict)- key: {'times','counts','columns'}
     """
     combo_name = kwargs.get('combo_name','test.h5')
-    filelist = sorted(glob.glob(os.path.join(datapath,'*.h5')),key=makevideo.time_sort)
-    #TODO
-    time_dict = {}
-    value_dict = {}
-    point_dict = {}
-    index_dict = {}
-    # Get the number of dataframes for the final output array
-    with pd.HDFStore(filelist[0]) as input_store:
-        dataframe_keys = input_store.keys()
-        for key in input_store.keys():
-            df = input_store[key]
-            #NOTE assuming each dataframe in the store has the same cols
-            columns = np.array(df.keys())
-            time_dict[key] = np.array([])
-            point_dict[key] = np.array([])
-            index_dict[key] = np.array([])
-            value_dict[key] = {}
-            for col in columns:
-                value_dict[key][col] = np.array([])
+    filelist = sorted(glob.glob(os.path.join(datapath,'*.h5')),
+                      key=makevideo.time_sort)
+    # First pass, sizes + times only
+    layout = {}
+    for i,infile in enumerate(filelist):
+        with pd.HDFStore(infile,mode='r') as input_store:
+            for key in input_store.keys():
+                storer = input_store.get_storer(key)
+                if key not in layout:
+                    #NOTE columns from the first file w this key are used
+                    layout[key] = {'times':[],'counts':[],'files':[],
+                                   'columns':np.array(input_store.select(
+                                                   key,stop=0).keys())}
+                if 'time' in storer.attrs:
+                    layout[key]['times'].append(storer.attrs.time)
+                else:
+                    layout[key]['times'].append(f'time{i}')
+                layout[key]['counts'].append(_nrows(storer))
+                layout[key]['files'].append(i)
+    # Preallocate
+    values, offsets, cubes = {}, {}, {}
+    stem = os.path.splitext(combo_name)[0]
+    for key,entry in layout.items():
+        entry['counts'] = np.array(entry['counts'],dtype=np.int64)
+        offsets[key] = np.concatenate([[0],np.cumsum(entry['counts'])])
+        ncols = len(entry['columns'])
+        if kwargs.get('multi',True):
+            values[key] = np.empty((offsets[key][-1],ncols))
+        if kwargs.get('cube',False):
+            cubes[key] = np.lib.format.open_memmap(
+                               os.path.join(outputpath,stem+'_'+
+                                            key.replace('/','')+'_cube.npy'),
+                               mode='w+',dtype=np.float64,
+                               shape=(len(entry['counts']),
+                                      int(entry['counts'].max()),ncols))
+            cubes[key][:] = np.nan
+    # Second pass, each file is read once and copied into place
+    position = {key:0 for key in layout}
     for i,infile in enumerate(filelist):
         if kwargs.get('progress',True):
             print('{:>4}/{:<4}\t{:<25}'.format(i+1,len(filelist),infile))
-        with pd.HDFStore(infile) as input_store:
+        with pd.HDFStore(infile,mode='r') as input_store:
             for key in input_store.keys():
-                df = input_store[key]
-                # Get time entry
-                if 'time' in input_store.get_storer(key).attrs:
-                    time = input_store.get_storer(key).attrs.time
-                else:
-                    time = f'time{i}'
-                # Update time array
-                time_dict[key] = np.append(time_dict[key],
-                                           np.array([time]*len(df)))
-                #columns = np.array([c.replace('/','') for c in df.keys()])
-                # Update the point array depending on the number of points
-                point_dict[key] = np.append(point_dict[key],
-                                            list(range(len(df))))
-                # Add this files values to the value array
-                for col in columns: #NOTE assuming all have same columns
-                    value_dict[key][col] = np.append(value_dict[key][col],
-                                                     df[col].values)
-    with pd.HDFStore(os.path.join(outputpath,combo_name)) as output:
-        # Set the index array with points + time entry
-        for key in dataframe_keys:
-            index_dict[key] = [time_dict[key],point_dict[key]]
-            # Smoosh the values from dict ->  (points) x (columns) array
-            values = np.array(list(value_dict[key].values())).T
-            output[key.replace('/','')] = pd.DataFrame(values,
-                                                       index=index_dict[key],
-                                                       columns=columns)
-    '''
-                input_dataframe = input_data[key]
-                if key in output_data:
-                    output_data[key] = pd.concat([input_dataframe,
-                                                  output_data[key]],
-                                                 ignore_index=True)
-                else:
-                    output_data[key] = input_dataframe
-    with pd.HDFStore(outputpath+'/'+combo_name) as output:
-       for key in output_data.keys():
-           if 'Time [UTC]' in output_data[key].keys():
-               load_df = output_data[key].sort_values(by='Time [UTC]')
-               load_df.index = load_df['Time [UTC]']
-               load_df.drop(columns=['Time [UTC]'],inplace=True)
-           else:
-               load_df = output_data[key]
-           output[key] = load_df
-    pass
-    '''
+                j = position[key]
+                columns = layout[key]['columns']
+                block = input_store[key].reindex(columns=columns).to_numpy(
+                                                            dtype=np.float64)
+                if key in values:
+                    values[key][offsets[key][j]:offsets[key][j+1]] = block
+                if key in cubes:
+                    cubes[key][j,0:len(block)] = block
+                position[key]+=1
+    for key,entry in layout.items():
+        if key in cubes:
+            cubes[key].flush()
+            del cubes[key]
+            np.savez(os.path.join(outputpath,stem+'_'+key.replace('/','')+
+                                  '_index.npz'),
+                     times=np.array(entry['times']),counts=entry['counts'],
+                     columns=entry['columns'])
+        entry.pop('files')
+    if kwargs.get('multi',True):
+        with pd.HDFStore(os.path.join(outputpath,combo_name)) as output:
+            # Set the index array with points + time entry
+            for key,entry in layout.items():
+                counts = entry['counts']
+                times = np.repeat(np.array(entry['times']),counts)
+                points = (np.arange(offsets[key][-1])-
+                          np.repeat(offsets[key][0:-1],counts)).astype(float)
+                index = pd.MultiIndex.from_arrays([times,points])
+                output[key.replace('/','')] = pd.DataFrame(values.pop(key),
+                                                        index=index,
+                                                        columns=entry['columns'])
+    return layout
+
+def load_flux_cube(outputpath, key, *, combo_name='test.h5'):
+    """Function opens a cube written by combine_to_multi_index(cube=True)
+        w/o reading it all into memory
+    Inputs
+        outputpath
+        key (str)- dataframe key, eg. 'mp_iso_betastar'
+        combo_name (str)- same as used to combine
+    Returns
+        cube (memmap[time,point,variable]), times, counts, columns
+    """
+    stem = os.path.join(outputpath,os.path.splitext(combo_name)[0]+'_'+
+                                   key.replace('/',''))
+    cube = np.load(stem+'_cube.npy',mmap_mode='r')
+    with np.load(stem+'_index.npz',allow_pickle=True) as index:
+        return cube,index['times'],index['counts'],index['columns']
 
 def merge_hdfs(datapath, outputpath, *, combo_name='energetics.h5',
                                           progress=True):
@@ -288,7 +479,7 @@ def combine_hdfs(datapath, outputpath, *, combo_name='energetics.h5',
                         outputpath+'/energetics.h5', 'Combined_zones')
 
 if __name__ == "__main__":
-    #from global_energetics import makevideo
+    #from global_energetics import makevideo, scheduler
     import makevideo
     PATH = sys.argv[1]
     OPATH = sys.argv[2]
@@ -296,6 +487,8 @@ if __name__ == "__main__":
     kwargs = {}
     if '-c' in sys.argv:
         kwargs['combo_name'] = sys.argv[sys.argv.index('-c')+1]
+    if '-cube' in sys.argv:
+        kwargs['cube'] = True
     if '-multi' in sys.argv:
         combine_to_multi_index(PATH,OPATH,**kwargs)
     else:
@@ -19,6 +19,7 @@ from tecplot.exception import *
 from global_energetics.extract import magnetosphere
 from global_energetics.extract import plasmasheet
 from global_energetics.extract import satellites
+from global_energetics.extract import flythrough
 from global_energetics.extract import tec_tools
 from global_energetics.extract import surface_tools
 from global_energetics.extract import volume_tools
@@ -173,6 +174,12 @@ if __name__ == "__main__":
             energetics_analysis([nowfile,nextfile_mirror],outpath)
         else:
             virtualsat_extractions(nowfile,satpath,outpath)
+    elif dosat:
+        # Fly every satellite through the whole list at once
+        flythrough.flythrough(file_list,glob.glob(os.path.join(satpath,'*.h5')),
+                              temporal=('--temporal' in sys.argv),
+                              outfile=os.path.join(outpath,'satellites',
+                                                   'virtual_sats.h5'))
     else:
         # Process the whole list
         for i,nowfile in enumerate(file_list):
@@ -27,7 +27,8 @@ from geopack import geopack as gp
 #Custom packages for calling CDAweb/OMNI + post processing
 import swmfpy
 from global_energetics.wind_to_swmfInput import (collect_themis,collect_mms)
-from global_energetics.extract.shue import r0_alpha_1998
+from global_energetics.extract.coupling import compute, GROUPS
+from global_energetics.extract import transforms
 from global_energetics.analysis.plot_tools import (general_plot_settings,
                                                    pyplotsetup)
 from global_energetics.analysis.proc_indices import (ID_ALbays)
@@ -131,7 +132,6 @@ def upgrade_OMNI(omni,**kwargs):
     Returns
         omni
     """
-    t0 = dt.datetime(1970,1,1)
     # Clean data (linear interpolate over data gaps)
     omni['dt'] = [(f-b).seconds for f,b in
                                 zip(omni['times'][1::],omni['times'][0:-1])]
@@ -147,51 +147,18 @@ def upgrade_OMNI(omni,**kwargs):
                               [['vx_gse','vy_gse','vz_gse'],
                                ['vx','vy','vz']]]:
         if gse_keys[0] in omni.keys():
-            gse = [omni[gse_keys[0]],omni[gse_keys[1]],omni[gse_keys[1]]]
+            gse = np.stack([omni[k] for k in gse_keys],axis=1)
         else:
             continue
-        x,y,z=np.zeros(len(gse[0])),np.zeros(len(gse[0])),np.zeros(len(gse[0]))
-        for i,t in enumerate(omni['times']):
-            ut = (t-t0).total_seconds()
-            gp.recalc(ut)
-            gsm = gp.gsmgse(gse[0][i],gse[1][i],gse[2][i],-1)
-            x[i],y[i],z[i] = gsm
+        x,y,z = transforms.transform(gse,omni['times'],'GSE','GSM').T
         omni[gsm_keys[0]] = x
         omni[gsm_keys[1]] = y
         omni[gsm_keys[2]] = z
-    # Dynamic pressure
-    convert = 1.6726e-27*1e6*(1e3)**2*1e9
-    omni['pdyn'] = omni['density']*omni['v']**2*convert
-    # Shue model
-    omni['r_shue98'],omni['alpha'] = (r0_alpha_1998(omni['bz'],omni['pdyn']))
-    # Coupling functions
-    Cmp = 1000 #Followed
-    #           https://supermag.jhuapl.edu/info/data.php?page=swdata
-    #           term comes from Cai and Clauer[2013].
-    #           Note that SuperMAG lists the term as 100,
-    #           however from the paper: "From our work,
-    #                                   α is estimated to be on order of 10^3"
-    omni['B_T'] = np.sqrt((omni['by']*1e-9)**2+(omni['bz']*1e-9)**2)
-    omni['M_A'] = (np.sqrt(omni['pdyn']*1e-9*(4*pi*1e-7))
-                    /omni['B_T'])
-    omni['clock'] = np.arctan2(omni['by'],omni['bz'])
-    omni['Newell']=Cmp*((omni['v']*1e3)**(4/3)*np.sqrt(
-                (omni['by']*1e-9)**2+(omni['bz']*1e-9)**2)**(2/3)*
-                            abs(np.sin(omni['clock']/2))**(8/3))
-    l = 7*6371*1000
-    omni['eps'] = (omni['b']**2*omni['v']*
-                                np.sin(omni['clock']/2)**4*l**2*
-                                        1e3*1e-9**2 / (4*pi*1e-7))
-    #Wang2014
-    omni['EinWang'] = (3.78e7*omni['density']**0.24*
-                        omni['v']**1.47*(omni['B_T']*1e9)**0.86*
-                        (abs(sin(omni['clock']/2))**2.70+0.25))
-    #Tenfjord2013
+    # Dynamic pressure, Shue model and coupling functions
     if 'vx' not in omni.keys():
         omni['vx'] = omni['v']
-    omni['Pstorm'] = (omni['B_T']**2*omni['vx']*1e3/(4*pi*1e-7)*
-                    omni['M_A']*abs(sin(omni['clock']/2))**4*
-                    135/(5e-5*omni['bz']**3+1)*6371e3**2)
+    omni = compute(omni,['pdyn']+GROUPS['standoff']+GROUPS['coupling'],
+                   keys={'B':'b'})
     return omni
 
 def classify_OMNI(omni,start,end,**kwargs):
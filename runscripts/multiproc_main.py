@@ -22,8 +22,10 @@ from tecplot.exception import *
 import global_energetics
 from global_energetics.extract import magnetosphere
 from global_energetics.extract import view_set
+from global_energetics.extract import sliding_window
 from global_energetics.extract.view_set import twodigit
-from global_energetics import write_disp, makevideo
+from global_energetics import write_disp, makevideo, scheduler, prefetch
+from global_energetics import telemetry
 
 def copy_plt(infiles,savepath):
     """Copies and unzips pair of files to process
@@ -45,11 +47,15 @@ def copy_plt(infiles,savepath):
     return temp_files
 
 def init(rundir, mhddir, iedir, imdir, scriptdir, outputpath, pngpath,
-         all_solution_times, loglevel):
+         all_solution_times, loglevel, scratch=None, depth=2,
+         store_queue=None):
     '''Initialization function for each new spawn
     Inputs
         rundir, mhddir, etc. - filepaths for input/output
         all_solution_times - list of all files for finding adjacents
+        scratch - node local dir for decompressed files, None for $TMPDIR
+        depth - number of files decompressed ahead of the analysis
+        store_queue - queue of the single process writing the run's store
     '''
     # !!! IMPORTANT !!!
     # Must register stop at exit to ensure Tecplot cleans
@@ -74,42 +80,30 @@ def init(rundir, mhddir, iedir, imdir, scriptdir, outputpath, pngpath,
             'OUTPUTPATH' : outputpath,
             'PNGPATH' : pngpath,
             'ALL_SOLUTION_TIMES' : all_solution_times,
+            'MANIFEST' : os.path.join(outputpath,'manifest.jsonl'),
+            'SCRATCH' : scratch,
+            'PREFETCH' : depth,
+            'STORE_QUEUE' : store_queue,
             'id' : ID,
             'log': logger
             }
     os.makedirs(mhddir+'/'+str(CONTEXT['id']), exist_ok=True)
+    #one trace file per worker, see python -m global_energetics.telemetry
+    telemetry.configure(os.path.join(outputpath,'trace'))
 
-def work(mhddatafile):
-    log = CONTEXT['log']
-    log.info('Beginning work for: '+mhddatafile)
-    if log.level==10:
-        marktime=time.time()
+#Global variables MODE 2 needs, -w derives these once per file when read
+GLOBALS = {'analysis_type':'energy',
+           'modes':['iso_betastar','closed','nlobe','slobe'],
+           'customTerms':{'test':'TestArea [Re^2]'}}
 
-    ##Find pair of files for current + next solution (assumed sorted)
-    cSol = CONTEXT['ALL_SOLUTION_TIMES']
-    nSol = cSol.copy(); nSol.pop(0); nSol.append(cSol[-1])#shift 1 right
-    cnSol = [[c,n] for c,n in zip(cSol,nSol) if c==mhddatafile][0]
-
-    if not os.path.exists(CONTEXT['MHDDIR']+'/copy_plt'):
-        #Create copies to spawn's local folder
-        temppath = CONTEXT['MHDDIR']+'/'+str(CONTEXT['id'])
-        tempSol = copy_plt(cnSol,temppath)#Now solutions are unzipped copies
-    else:
-        #Use existing copy found in "copy_plt" folder
-        tempSol=[cnSol[0],os.path.join(CONTEXT['MHDDIR'],
-                                   'copy_plt',cnSol[1].split('/')[-1])]
-
-    #Load data into tecplot and setup field zone names
-    tp.new_layout()
-    field_data = tp.data.load_tecplot(tempSol)
-    field_data.zone(0).name = 'global_field'
-    field_data.zone(1).name = 'future'
-    OUTPUTNAME = mhddatafile.split('e')[-1].split('.plt')[0]
-    if log.level==10:
-        log.debug('Copy unzip: --- {:.2f}s ---'.format(time.time()-
-                                                           marktime))
-        marktime=time.time()
-    #Caclulate surfaces
+def analyze(field_data,log,source=None,**kwargs):
+    """Runs the analysis on a loaded dataset
+    Inputs
+        field_data (tecplot Dataset)- w global_field, future (+past) zones
+        log (Logger)
+        source (str)- file being analyzed, tags results for the store
+        kwargs- passed on to get_magnetosphere (eg. window, useNumpy)
+    """
     '''
     #MODE 1 "terminator" polar cap stuff
     magnetosphere.get_magnetosphere(field_data,save_mesh=False,
@@ -127,17 +121,67 @@ def work(mhddatafile):
     #MODE 2 "full" magnetosphere stuff
     magnetosphere.get_magnetosphere(field_data,save_mesh=False,
                                     do_cms=True,
-                                    analysis_type='energy',
-                                    modes=['iso_betastar','closed',
-                                           'nlobe','slobe'],
-                                    customTerms={'test':'TestArea [Re^2]'},
+                                    **GLOBALS,
                                     do_interfacing=True,
                                     integrate_surface=True,
                                     integrate_volume=True,
                                     integrate_line=False,
                                     outputpath=CONTEXT['OUTPUTPATH'],
-                                    logger=log)
+                                    store_queue=CONTEXT['STORE_QUEUE'],
+                                    store_source=source,
+                                    logger=log,**kwargs)
                                     #tshift=45,
+
+def next_solution(mhddatafile):
+    """Returns the solution after mhddatafile, or itself if it's the last
+    """
+    cSol = CONTEXT['ALL_SOLUTION_TIMES']
+    return cSol[min(cSol.index(mhddatafile)+1,len(cSol)-1)]
+
+def work(mhddatafile,tempSol=None):
+    """Analysis for a single solution
+    Inputs
+        mhddatafile (str)
+        tempSol (list[str])- [current, next] already prepared (prefetch),
+                             if None they are copied here w copy_plt
+    """
+    log = CONTEXT['log']
+    log.info('Beginning work for: '+mhddatafile)
+    telemetry.label(file=os.path.basename(mhddatafile))
+    if log.level==10:
+        marktime=time.time()
+
+    ##Find pair of files for current + next solution (assumed sorted)
+    cnSol = [mhddatafile,next_solution(mhddatafile)]
+
+    copied = False
+    if tempSol is not None:
+        #Already decompressed by the prefetch thread, cleaned up there
+        pass
+    elif not os.path.exists(CONTEXT['MHDDIR']+'/copy_plt'):
+        #Create copies to spawn's local folder
+        temppath = CONTEXT['MHDDIR']+'/'+str(CONTEXT['id'])
+        tempSol = copy_plt(cnSol,temppath)#Now solutions are unzipped copies
+        copied = True
+    else:
+        #Use existing copy found in "copy_plt" folder
+        tempSol=[cnSol[0],os.path.join(CONTEXT['MHDDIR'],
+                                   'copy_plt',cnSol[1].split('/')[-1])]
+
+    #Load data into tecplot and setup field zone names
+    with telemetry.span('load',copied=copied):
+        tp.new_layout()
+        field_data = tp.data.load_tecplot(tempSol)
+        field_data.zone(0).name = 'global_field'
+        field_data.zone(1).name = 'future'
+    OUTPUTNAME = mhddatafile.split('e')[-1].split('.plt')[0]
+    if log.level==10:
+        log.debug('Copy unzip: --- {:.2f}s ---'.format(time.time()-
+                                                           marktime))
+        marktime=time.time()
+    #Caclulate surfaces
+    with telemetry.span('analysis'):
+        analyze(field_data,log,source=mhddatafile)
     if log.level==10:
         log.debug('Analysis: --- {:.2f}s ---'.format(time.time()-
                                                            marktime))
@@ -148,7 +192,7 @@ def work(mhddatafile):
         with open(CONTEXT['PNGPATH']+'/'+OUTPUTNAME+'.png','wb') as png:
             png.close()
     #Remove copies now that work is done for that file
-    if not os.path.exists(CONTEXT['MHDDIR']+'/copy_plt'):
+    if copied:
         for f in tempSol: os.remove(f)
     if log.level==10:
         log.debug('Png and Wrapup: --- {:.2f}s ---'.format(time.time()-
@@ -156,6 +200,78 @@ def work(mhddatafile):
         marktime=time.time()
     print(time.ctime())
 
+def work_block(block):
+    """Works through a contiguous block of solutions in time order, state
+        and runtime of each one is kept in the manifest. Files are
+        decompressed to node local scratch ahead of time by a prefetch
+        thread, each one only once
+    Inputs
+        block (list[str])- from scheduler.blocks
+    """
+    #Every file needed (current + next) in time order, w no repeats
+    needed = []
+    for mhddatafile in block:
+        for f in [mhddatafile,next_solution(mhddatafile)]:
+            if f not in needed: needed.append(f)
+    fetcher = prefetch.start(needed,depth=CONTEXT['PREFETCH'],
+                             scratch=CONTEXT['SCRATCH'])
+    ready, todo = {}, list(block)
+    try:
+        for filename,local in prefetch.items(fetcher):
+            ready[filename] = local
+            #Run everything that has both of its files ready
+            while todo and next_solution(todo[0]) in ready:
+                mhddatafile = todo.pop(0)
+                scheduler.run(CONTEXT['MANIFEST'],mhddatafile,work,
+                              mhddatafile,
+                              tempSol=[ready[mhddatafile],
+                                       ready[next_solution(mhddatafile)]],
+                              finished='queued')
+                #Drop anything no later solution will use
+                keep = set(todo+[next_solution(f) for f in todo])
+                for f in [f for f in ready if f not in keep]:
+                    prefetch.release(fetcher,ready.pop(f))
+    finally:
+        prefetch.stop(fetcher)
+
+def work_window(triplet,log):
+    """Analysis for the present snapshot of a sliding window, the .png
+        marker is only written once the analysis went through
+    Inputs
+        triplet (list[dict])- [past, present, future] from sliding_window
+        log (Logger)
+    """
+    mhddatafile = triplet[1]['filename']
+    field_data = sliding_window.to_tecplot(triplet)
+    #Globals were derived when read, only the missing ones are added
+    analyze(field_data,log,source=mhddatafile,window=True,useNumpy=True)
+    OUTPUTNAME = mhddatafile.split('e')[-1].split('.plt')[0]
+    with open(CONTEXT['PNGPATH']+'/'+OUTPUTNAME+'.png','wb') as png:
+        png.close()
+
+def work_chunk(chunk):
+    """Works through a contiguous chunk of solutions w a sliding window
+        so each file is only read once (halo files at the chunk edges)
+    Inputs
+        chunk (dict)- from sliding_window.partition
+    """
+    log = CONTEXT['log']
+    log.info('Beginning chunk: '+chunk['centers'][0]+' to '+
+                                 chunk['centers'][-1])
+    for triplet in sliding_window.walk(chunk['files'],chunk['centers'],
+                                       prefetch=CONTEXT['PREFETCH'],
+                                       use_numexpr=True,**GLOBALS):
+        if log.level==10:
+            marktime=time.time()
+        mhddatafile = triplet[1]['filename']
+        scheduler.run(CONTEXT['MANIFEST'],mhddatafile,work_window,triplet,log,
+                      finished='queued')
+        if log.level==10:
+            OUTPUTNAME = mhddatafile.split('e')[-1].split('.plt')[0]
+            log.debug(OUTPUTNAME+': --- {:.2f}s ---'.format(time.time()-
+                                                               marktime))
+        print(time.ctime())
+
 if __name__ == '__main__':
     start_time = time.time()
     if sys.version_info < (3, 5):
@@ -171,6 +287,8 @@ if __name__ == '__main__':
         -h  --help      prints this message then exit
         -np --noproc    skip processing and go right to cleaning
         -nc --noclean   skip cleaning step
+        -w  --window    read each file once, contiguous chunks per worker
+        -r  --retry     put files that failed last time back in the queue
 
     Example:
         multiPytec multiproc_main.py -np -nc
@@ -201,6 +319,8 @@ if __name__ == '__main__':
     OUTPUTPATH = os.path.join(SCRIPTDIR, '1min_output_starlink2')
     PNGPATH = os.path.join(OUTPUTPATH, 'png')
     LOGLEVEL = logging.DEBUG
+    SCRATCH = os.environ.get('TMPDIR')#node local disk for unzipped files
+    PREFETCH = 2#files unzipped ahead of the analysis
     ########################################
     #make directories for output
     os.makedirs(OUTPUTPATH, exist_ok=True)
@@ -212,18 +332,19 @@ if __name__ == '__main__':
     all_solution_times = sorted(glob.glob(MHDDIR+'/*.plt'),
                                 key=makevideo.time_sort)[::100]
     #Pick up only the files that haven't been processed
-    if os.path.exists(OUTPUTPATH+'/energeticsdata'):
-        parseddonelist, parsednotdone = [], []
-        donelist = glob.glob(OUTPUTPATH+'/png/*.png')
-        #donelist = glob.glob(OUTPUTPATH+'/energeticsdata/*.h5')
-        for png in donelist:
-            parseddonelist.append(png.split('/')[-1].split('.')[0])
+    MANIFEST = os.path.join(OUTPUTPATH,'manifest.jsonl')
+    STORE = os.path.join(OUTPUTPATH,'energetics.h5')
+    if (not os.path.exists(MANIFEST) and
+        os.path.exists(OUTPUTPATH+'/energeticsdata')):
+        #Older run w only png markers, carry those over as done
+        donelist = [png.split('/')[-1].split('.')[0] for png in
+                                          glob.glob(OUTPUTPATH+'/png/*.png')]
         for plt in all_solution_times:
-            parsednotdone.append(plt.split('e')[-1].split('.')[0])
-        solution_times = [MHDDIR+'/3d__var_1_e'+item+'.plt' for item
-                          in parsednotdone if item not in parseddonelist]
-    else:
-        solution_times = all_solution_times
+            if plt.split('e')[-1].split('.')[0] in donelist:
+                scheduler.update(MANIFEST,plt,'done',note='from png marker')
+    retry = ('-r' in sys.argv) or ('--retry' in sys.argv)
+    solution_times = scheduler.init_manifest(MANIFEST,all_solution_times,
+                                             retry_failed=retry)
     print('files remaining: ',len(solution_times))
     if ('-np' not in sys.argv) and ('--noproc' not in sys.argv):
         ########### MULTIPROCESSING ###########
@@ -234,30 +355,46 @@ if __name__ == '__main__':
         # Set up the pool with initializing function and associated arguments
         num_workers = min(numproc, len(solution_times))
         print('workers: ',num_workers)
+        # One writer appends every worker's results to the run's store,
+        #  files only become done in the manifest once they're written
+        writer = write_disp.start_store_writer(STORE,manifest=MANIFEST)
         pool = multiprocessing.Pool(num_workers, initializer=init,
                 initargs=(RUNDIR, MHDDIR, IEDIR, IMDIR, SCRIPTDIR, OUTPUTPATH,
-                        PNGPATH, all_solution_times,LOGLEVEL))
+                        PNGPATH, all_solution_times,LOGLEVEL,SCRATCH,
+                        PREFETCH,writer['queue']))
         try:
-            # Map the work function to each of the job arguments
-            pool.map(work, solution_times)
+            if ('-w' in sys.argv) or ('--window' in sys.argv):
+                # Contiguous chunks w 1 halo file, each read only once
+                pool.map(work_chunk, sliding_window.partition(solution_times,
+                                                            num_workers,
+                                             all_files=all_solution_times))
+            else:
+                # Contiguous blocks in time, state kept in the manifest
+                pool.map(work_block, scheduler.blocks(solution_times,
+                                                      num_workers))
         finally:
             # Join the process pool before exit so Tec cleans up & no core dump
             pool.close()
             pool.join()
+            # Failed writes are already marked in the manifest by the writer
+            failures = write_disp.stop_store_writer(writer)
+            if len(failures)>0:
+                print('store writes failed: ',len(failures))
             for f in [f for f in glob.glob(MHDDIR+'/*') if os.path.isdir(f)]:
                 try:
                     os.removedirs(f)
                 except: OSError
         ########################################
     if ('-nc' not in sys.argv) and ('--noclean' not in sys.argv):
-        #Combine and delete individual energetics files
+        #Move individual energetics files from older runs into the store
         if os.path.exists(OUTPUTPATH+'/energeticsdata'):
-            write_disp.combine_hdfs2(os.path.join(OUTPUTPATH,'energeticsdata'),
-                                OUTPUTPATH)
+            write_disp.hdfs_to_store(os.path.join(OUTPUTPATH,
+                                                  'energeticsdata','GM'),STORE)
             shutil.rmtree(OUTPUTPATH+'/energeticsdata/')
     if ('--noproc' in sys.argv) or ('-np' in sys.argv):
         if ('--noclean' in sys.argv) or ('-nc' in sys.argv):
             print(solution_times)
+    print(scheduler.summary(MANIFEST))
     #timestamp
     ltime = time.time()-start_time
     print('--- {:d}min {:.2f}s ---'.format(int(ltime/60),
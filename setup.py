@@ -112,11 +112,15 @@ setup(
     #
     #packages=find_packages(where="global_energetics"),  # Required
     py_modules=["global_energetics",
+              "global_energetics.benchmark",
               "global_energetics.makevideo",
               "global_energetics.image_stitch",
               "global_energetics.link_modules",
               "global_energetics.makevideo",
+              "global_energetics.prefetch",
               "global_energetics.preplot",
+              "global_energetics.scheduler",
+              "global_energetics.telemetry",
               "global_energetics.wind_to_swmfInput",
               "global_energetics.write_disp",
               "global_energetics.extract.equations",
@@ -128,6 +132,20 @@ setup(
               "global_energetics.extract.magnetosphere2D",
               "global_energetics.extract.mapping",
               "global_energetics.extract.plasmasheet",
+              "global_energetics.extract.plt_reader",
+              "global_energetics.extract.np_equations",
+              "global_energetics.extract.np_masks",
+              "global_energetics.extract.np_integrals",
+              "global_energetics.extract.sliding_window",
+              "global_energetics.extract.locator",
+              "global_energetics.extract.geometry_cache",
+              "global_energetics.extract.tracer",
+              "global_energetics.extract.idl_reader",
+              "global_energetics.extract.log_reader",
+              "global_energetics.extract.fac_regions",
+              "global_energetics.extract.flythrough",
+              "global_energetics.extract.isosurface",
+              "global_energetics.extract.transforms",
               "global_energetics.extract.pv_equations",
               "global_energetics.extract.pv_fte",
               "global_energetics.extract.pv_input_tools",
@@ -143,6 +161,7 @@ setup(
               "global_energetics.extract.satellites",
               "global_energetics.extract.shared_tools",
               "global_energetics.extract.shue",
+              "global_energetics.extract.coupling",
               "global_energetics.extract.surface_construct",
               "global_energetics.extract.surface_tools",
               "global_energetics.extract.swmf_access",
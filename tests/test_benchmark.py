@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Smoke test that every benchmark stage runs w/o pytecplot
+"""
+import os
+import sys
+import json
+import subprocess
+from global_energetics import benchmark
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_run_suite_without_tecplot():
+    #tecplot set to None in sys.modules makes 'import tecplot' fail, even
+    # on machines that have it, in a fresh interpreter
+    script = ("import sys, json\n"
+              "sys.modules['tecplot'] = None\n"
+              "from global_energetics import benchmark\n"
+              "report = benchmark.run_suite([20000])\n"
+              "print(json.dumps(sorted(report['20000'])))\n"
+              "print('tecplot' in [m.split('.')[0] for m in sys.modules\n"
+              "                    if sys.modules[m] is not None])\n")
+    done = subprocess.run([sys.executable,'-c',script],cwd=ROOT,
+                          capture_output=True,text=True,timeout=300)
+    assert done.returncode==0, done.stderr
+    stages, imported = done.stdout.strip().splitlines()[-2:]
+    assert set(benchmark.STAGES)<=set(json.loads(stages))
+    assert imported=='False'
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Check coupling functions against the formulas proc_indices.get_swmf_data
+    used to write out inline
+"""
+import numpy as np
+from numpy import pi, sin
+import pandas as pd
+import pytest
+from global_energetics.extract import coupling
+from global_energetics.extract.shue import r0_alpha_1998
+
+def _solar_wind(n=2000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'bx':rng.normal(0,5,n),'by':rng.normal(0,5,n),
+                         'bz':rng.normal(0,5,n),
+                         'vx':-400+rng.normal(0,50,n),
+                         'vy':rng.normal(0,20,n),'vz':rng.normal(0,20,n),
+                         'density':5+rng.random(n),
+                         'temperature':1e5+rng.random(n)*1e4},
+                        index=pd.date_range('2000',periods=n,freq='1min'))
+
+def _old_formulas(s):
+    """Function is the inline version from proc_indices, column by column
+    """
+    s = s.copy()
+    convert = 1.6726e-27*1e6*(1e3)**2*1e9
+    s['v'] = np.sqrt(s['vx']**2+s['vy']**2+s['vz']**2)
+    s['pdyn'] = s['density']*s['v']**2*convert
+    s['P'] = s['density']*1.3807e-23*s['temperature']*1e15
+    s['B'] = np.sqrt(s['bx']**2+s['by']**2+s['bz']**2)
+    s['Beta'] = s['P']/(s['B']**2/(4*np.pi*1e-7*1e9))
+    s['Beta*'] = (s['P']+s['pdyn'])/(s['B']**2/(4*np.pi*1e-7*1e9))
+    s['Va'] = np.sqrt(s['B']**2/(4*np.pi)/s['density']/1.67)*1e5
+    s['Ma'] = s['v']*1e3/s['Va']
+    s['r_shue98'], s['alpha'] = r0_alpha_1998(s['bz'],s['pdyn'])
+    s['B_T'] = np.sqrt((s['by']*1e-9)**2+(s['bz']*1e-9)**2)
+    s['M_A'] = (np.sqrt(s['pdyn']*1e-9*(4*pi*1e-7))/s['B_T'])
+    s['clock'] = np.arctan2(s['by'],s['bz'])
+    s['Newell'] = 1000*((s['v']*1e3)**(4/3)*
+                        np.sqrt((s['by']*1e-9)**2+(s['bz']*1e-9)**2)**(2/3)*
+                        abs(np.sin(s['clock']/2))**(8/3))
+    l = 7*6371*1000
+    s['eps'] = (s['B']**2*s['v']*np.sin(s['clock']/2)**4*l**2*
+                1e3*1e-9**2/(4*np.pi*1e-7))
+    s['Esw'] = (s['v']*(s['B_T']*1e9)*(sin(s['clock']/2)**2))
+    s['EinWang'] = (3.78e7*s['density']**0.24*s['v']**1.47*
+                    (s['B_T']*1e9)**0.86*(abs(sin(s['clock']/2))**2.70+0.25))
+    s['Pstorm'] = (s['B_T']**2*s['vx']*1e3/(4*pi*1e-7)*s['M_A']*
+                   abs(sin(s['clock']/2))**4*135/(5e-5*s['bz']**3+1)*
+                   6371e3**2)
+    return s
+
+def test_matches_old_formulas():
+    sw = _solar_wind()
+    names = sum(coupling.GROUPS.values(),[])
+    new = coupling.compute(sw.copy(),names)
+    old = _old_formulas(sw)
+    assert set(names)<=set(new.columns)
+    for name in names:
+        np.testing.assert_allclose(new[name],old[name],rtol=1e-12,
+                                   err_msg=name)
+
+def test_only_what_is_asked():
+    sw = _solar_wind(10)
+    columns = list(sw.columns)
+    newell = coupling.compute(sw,['Newell'],inplace=False)
+    assert list(newell.columns)==['Newell']
+    assert newell.index.equals(sw.index)
+    assert list(sw.columns)==columns
+    coupling.compute(sw,['Newell'])
+    assert list(sw.columns)==columns+['Newell']
+
+def test_omni_columns_used_as_is():
+    #OMNI has its own 'v' and 'b', neither is recomputed from components
+    omni = {'v':np.full(5,400.),'b':np.full(5,6.),'bx':np.zeros(5),
+            'by':np.ones(5),'bz':-np.ones(5),'vx':np.full(5,-390.),
+            'vy':np.zeros(5),'vz':np.zeros(5),'density':np.full(5,5.)}
+    coupling.compute(omni,['pdyn','eps'],keys={'B':'b'})
+    assert 'B' not in omni and 'v' in omni
+    np.testing.assert_allclose(omni['pdyn'],5*400.**2*1.6726e-6)
+    clock = np.arctan2(1,-1)
+    np.testing.assert_allclose(omni['eps'],
+                         6.**2*400*np.sin(clock/2)**4*(7*6371e3)**2*1e3*
+                         1e-18/(4*pi*1e-7))
+
+def test_unknown_name_and_units():
+    with pytest.raises(KeyError):
+        coupling.compute(_solar_wind(3),['not_a_function'])
+    with pytest.raises(KeyError):
+        coupling.compute({'by':np.ones(2)},['Newell'])
+    assert coupling.units(['Newell','bz','pdyn'])=={'Newell':'Wb/s',
+                                                   'bz':'nT','pdyn':'nPa'}
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Check fac_regions on a synthetic two ring (R1 poleward of R2) Jr and
+    dawn/dusk potential pattern, w the up R1 and down R2 regions running
+    across the psi=0/360 seam
+"""
+import numpy as np
+import pytest
+from global_energetics.extract import fac_regions
+
+HEADERS = ['Theta_[deg]','Psi_[deg]','JR_[mA/m^2]','PHI_[kV]']
+THETA = np.arange(0,91,1.)
+PSI = np.arange(0,361,4.)
+R1, R2 = (16,22), (26,32)#colatitude bands from the pole
+SHIFT = 30#up R1 is centered on psi=60, so it spans 330->150
+
+def _cube(theta):
+    """Function gives (ntheta,npsi,nvar) for one hemisphere, theta is
+        colatitude from the pole for the north and mirrored for the south
+    """
+    TH,PS = np.meshgrid(theta,PSI,indexing='ij')
+    pole = np.minimum(TH,180-TH)
+    wave = np.sin(np.deg2rad(PS+SHIFT))
+    jr = np.zeros(TH.shape)
+    jr[(pole>=R1[0])&(pole<=R1[1])] = 1
+    jr[(pole>=R2[0])&(pole<=R2[1])] = -0.6
+    jr = jr*wave
+    #dusk (Y>0) is negative, peaked between the rings
+    phi = -50*wave*np.exp(-((pole-20)/10)**2)
+    return np.stack([TH,PS,jr,phi],axis=-1)
+
+def _expected(cube, north, threshold=0.15):
+    """Function sums each ring straight from the pattern
+    """
+    theta = cube[:,0,0]
+    jr = cube[:,0:-1,2]
+    pole = np.broadcast_to((theta if north else 180-theta)[:,None],
+                           jr.shape)
+    dth = np.abs(np.gradient(np.deg2rad(theta)))
+    area = (((1+300/6371)**2*np.sin(np.deg2rad(theta))*dth)[:,None]*
+            np.full(len(PSI)-1,2*np.pi/(len(PSI)-1))[None,:])
+    want = {}
+    for R,(low,high) in [[1,R1],[2,R2]]:
+        ring = (pole>=low)&(pole<=high)
+        up, down = ring&(jr>=threshold), ring&(jr<=-threshold)
+        want[f'UP_R{R}'] = (jr*area)[up].sum()*6371**2*1e-6
+        want[f'DOWN_R{R}'] = (jr*area)[down].sum()*6371**2*1e-6
+        D = (pole*area)[up|down].sum()/area[up|down].sum()
+        want[f'Theta_R{R}'] = D if north else 180-D
+    return want
+
+def test_label_regions_seam():
+    cube = _cube(THETA)
+    mask = cube[:,0:-1,2]>=0.15
+    labels, n = fac_regions.label_regions(mask,True)
+    #up R1 (330->150) and up R2 (on the other side) only
+    assert n==2
+    ring = np.argmax(THETA>=R1[0])
+    assert labels[ring,0]==labels[ring,-1]>=0
+    assert (labels>=0).sum()==mask.sum()
+    #w/o the wrap the up R1 is cut in two at psi=0
+    labels, n = fac_regions.label_regions(mask,False)
+    assert n==3
+    assert labels[ring,0]!=labels[ring,-1]
+
+def test_id_R1R2():
+    north, south = _cube(THETA), _cube(180-THETA[::-1])
+    FAC = fac_regions.id_R1R2(north,south,HEADERS)
+    for cube,hemi,is_north in [[north,'N',True],[south,'S',False]]:
+        for key,value in _expected(cube,is_north).items():
+            assert FAC[f'{key}_{hemi}']==pytest.approx(value,rel=1e-9),key
+    assert FAC['UP_R1_N']>0>FAC['DOWN_R1_N']
+    assert FAC['UP_R2_N']>0>FAC['DOWN_R2_N']
+    assert R1[0]<FAC['Theta_R1_N']<R1[1]<R2[0]<FAC['Theta_R2_N']<R2[1]
+    assert FAC['Theta_R1_S']==pytest.approx(180-FAC['Theta_R1_N'])
+    assert FAC['Theta_R2_S']==pytest.approx(180-FAC['Theta_R2_N'])
+    #potential extremes are on opposite sides of the pole at 20deg
+    assert FAC['d_North']==pytest.approx(np.deg2rad(40))
+    assert FAC['d_South']==pytest.approx(np.deg2rad(40))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Check flythrough on two small ascii snapshots of a linear field, one
+    row per snapshot and blended in time, w a satellite off the grid
+"""
+import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
+from global_energetics.extract import flythrough
+
+T0 = dt.datetime(2022,2,2,5,0)
+T1 = T0+dt.timedelta(minutes=1)
+
+def _field(x, y, z, step):
+    """Function is linear in space, so the locator is exact, and the 2nd
+        snapshot is the 1st + 10
+    """
+    return 1+2*x-y+0.5*z+10*step
+
+def _write_dat(path, time, step):
+    axis = np.linspace(-2,2,5)
+    Z,Y,X = np.meshgrid(axis,axis,axis,indexing='ij')#I fastest
+    filename = str(path/('3d__var_1_e'+time.strftime('%Y%m%d-%H%M%S')+
+                         '-000.dat'))
+    with open(filename,'w') as f:
+        f.write('TITLE="BATSRUS: 3D test"\n')
+        f.write('VARIABLES="X [R]", "Y [R]", "Z [R]", "Rho [amu/cm^3]"\n')
+        f.write('ZONE T="global_field" I=5, J=5, K=5, DATAPACKING=POINT\n')
+        for x,y,z in zip(X.ravel(),Y.ravel(),Z.ravel()):
+            f.write('{} {} {} {}\n'.format(x,y,z,_field(x,y,z,step)))
+    return filename
+
+def _trajectory(times, start, velocity):
+    seconds = np.array([(t-T0).total_seconds() for t in times])
+    xyz = np.array(start)[None,:]+seconds[:,None]*np.array(velocity)
+    return pd.DataFrame(xyz,columns=flythrough.COORDS,
+                        index=pd.DatetimeIndex(times))
+
+SAMPLES = [T0-dt.timedelta(seconds=30),T0,T0+dt.timedelta(seconds=15),
+           T0+dt.timedelta(seconds=45),T1,T1+dt.timedelta(seconds=30)]
+SATS = {'inner':_trajectory(SAMPLES,(-1.5,0.5,0.2),(0.02,-0.01,0.005)),
+        'lost':_trajectory(SAMPLES,(30,0,0),(0.1,0,0))}
+
+@pytest.fixture
+def files(tmp_path):
+    #given out of time order, flythrough sorts them
+    sources = [_write_dat(tmp_path,T1,1),_write_dat(tmp_path,T0,0)]
+    satfile = str(tmp_path/'satlocations.h5')
+    with pd.HDFStore(satfile) as store:
+        for sat,df in SATS.items():
+            store[sat] = df
+    return sources, [satfile]
+
+@pytest.mark.parametrize('nworkers',[1,2])
+def test_snapshots(files, nworkers):
+    vsat = flythrough.flythrough(*files,nworkers=nworkers)
+    inner = vsat['inner']
+    assert list(inner.index)==[pd.Timestamp(T0),pd.Timestamp(T1)]
+    traj = SATS['inner']
+    for step,time in enumerate([T0,T1]):
+        x,y,z = traj.loc[time].values
+        assert inner.loc[time,'X [R]']==pytest.approx(x)
+        assert inner.loc[time,'Rho [amu/cm^3]']==pytest.approx(
+                                                     _field(x,y,z,step))
+        assert np.allclose(inner.loc[time,['Xgsm','Ygsm','Zgsm']],[x,y,z])
+    assert vsat['lost'][['X [R]','Rho [amu/cm^3]']].isna().all().all()
+    assert np.allclose(vsat['lost']['Xgsm'],SATS['lost'].loc[[T0,T1],
+                                                             'x_gsm'])
+
+@pytest.mark.parametrize('nworkers',[1,2])
+def test_temporal(files, nworkers):
+    vsat = flythrough.flythrough(*files,temporal=True,nworkers=nworkers)
+    inner = vsat['inner']
+    #only samples between the first and last snapshot
+    assert list(inner.index)==[pd.Timestamp(t) for t in SAMPLES[1:5]]
+    for time,(x,y,z) in SATS['inner'].loc[SAMPLES[1:5]].iterrows():
+        w = (time-pd.Timestamp(T0)).total_seconds()/60
+        want = (1-w)*_field(x,y,z,0)+w*_field(x,y,z,1)
+        assert inner.loc[time,'Rho [amu/cm^3]']==pytest.approx(want)
+        assert inner.loc[time,'X [R]']==pytest.approx(x)
+    assert len(vsat['lost'])==4
+    assert vsat['lost']['Rho [amu/cm^3]'].isna().all()
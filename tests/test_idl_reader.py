@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Check idl_reader on small IE .idl and mag_grid (ascii and real4) files
+    written here, and the (time,lat,lon,var) stacks from read_batch
+"""
+import struct
+import datetime as dt
+import numpy as np
+import pytest
+from global_energetics.extract import idl_reader
+
+IE_VARS = ['X [R]','Y [R]','Z [R]','Theta [deg]','Psi [deg]','SigmaH [S]',
+           'JR [`mA/m^2]','PHI [kV]']
+NTHETA, NPSI = 7, 13
+MAG_HEADERS = ['Lon','Lat','dBn','dBe','dBd','LatSm','LonSm']
+NLON, NLAT = 12, 5
+
+def _ie_values(theta, seed):
+    """Function gives rows for one hemisphere, theta outer and psi inner
+    """
+    rng = np.random.default_rng(seed)
+    psi = np.linspace(0,360,NPSI)
+    theta2d,psi2d = np.meshgrid(theta,psi,indexing='ij')
+    rows = np.zeros([theta2d.size,len(IE_VARS)])
+    th,ps = np.deg2rad(theta2d.ravel()),np.deg2rad(psi2d.ravel())
+    rows[:,0] = np.sin(th)*np.cos(ps)
+    rows[:,1] = np.sin(th)*np.sin(ps)
+    rows[:,2] = np.cos(th)
+    rows[:,3],rows[:,4] = theta2d.ravel(),psi2d.ravel()
+    rows[:,5::] = rng.normal(0,1,[theta2d.size,len(IE_VARS)-5])
+    return rows
+
+def _write_ie(path, time, seed=0):
+    north = _ie_values(np.linspace(0,90,NTHETA),seed)
+    south = _ie_values(np.linspace(90,180,NTHETA),seed+1)
+    filename = str(path/('it'+time.strftime('%y%m%d_%H%M%S')+'_000.idl'))
+    with open(filename,'w') as f:
+        f.write('TITLE\n BATSRUS: Ionospheric Potential Solution\n\n')
+        f.write('NUMERICAL VALUES\n{:6d} nvars\n{:6d} nTheta\n'
+                '{:6d} nPsi\n     1 nCells\n     1 iSide\n\n'.format(
+                                                len(IE_VARS),NTHETA,NPSI))
+        f.write('TIME\n'+''.join(['{:6d} {}\n'.format(v,n) for v,n in
+                    zip(time.timetuple()[0:6],['year','month','day','hour',
+                                               'minute','second'])])+'\n')
+        f.write('SIMULATION\n{:6d} simulation step\n'
+                '   3600.0 simulation time\n\n'.format(100))
+        f.write('DIPOLE TILT\n  -12.5 xx\n    0.0 yy\n\n')
+        f.write('VARIABLE LIST\n'+''.join(['{:3d} {}\n'.format(i+1,v)
+                                          for i,v in enumerate(IE_VARS)]))
+        f.write('\n')
+        for name,rows in [['NORTHERN',north],['SOUTHERN',south]]:
+            f.write('BEGIN {} HEMISPHERE\n'.format(name))
+            for row in rows:
+                f.write(' '.join(['{:.6e}'.format(v) for v in row])+'\n')
+    return filename, north, south
+
+def _mag_values(seed):
+    """Function gives mag_grid rows, lat outer and lon inner
+    """
+    rng = np.random.default_rng(seed)
+    lon2d,lat2d = np.meshgrid(np.arange(0,360,360/NLON),
+                              np.linspace(-80,80,NLAT))
+    rows = rng.normal(0,100,[lon2d.size,len(MAG_HEADERS)])
+    rows[:,0],rows[:,1] = lon2d.ravel(),lat2d.ravel()
+    return rows
+
+def _write_mag_ascii(path, time, rows):
+    filename = str(path/('mag_grid_e'+time.strftime('%Y%m%d-%H%M%S')+
+                         '.out'))
+    with open(filename,'w') as f:
+        f.write('Magnetometer grid (2D) in GEO coordinates\n')
+        f.write(time.strftime('%Y %m %d %H %M %S')+'\n')
+        f.write('{} {}\n'.format(NLON,NLAT))
+        f.write(' '.join(MAG_HEADERS)+'\n')
+        for row in rows:
+            f.write(' '.join(['{:.6f}'.format(v) for v in row])+'\n')
+    return filename
+
+def _record(payload):
+    return struct.pack('<i',len(payload))+payload+struct.pack('<i',
+                                                              len(payload))
+
+def _write_mag_real4(path, time, rows):
+    """Function writes the same grid as a fortran unformatted IDL file,
+        coordinate names are Lat Lon w longitude first like SWMF does
+    """
+    filename = str(path/('mag_grid_e'+time.strftime('%Y%m%d-%H%M%S')+
+                         '.out'))
+    nvar = len(MAG_HEADERS)-2
+    names = ' '.join(['Lat','Lon']+MAG_HEADERS[2::]+['rBody'])
+    raw = _record('mag_grid'.ljust(79).encode())
+    raw+= _record(struct.pack('<ifiii',100,3600.,2,1,nvar))
+    raw+= _record(struct.pack('<ii',NLON,NLAT))
+    raw+= _record(struct.pack('<f',2.5))
+    raw+= _record(names.encode())
+    raw+= _record(rows[:,0:2].T.astype('<f4').tobytes())
+    for i in range(nvar):
+        raw+= _record(rows[:,2+i].astype('<f4').tobytes())
+    with open(filename,'wb') as f:
+        f.write(raw)
+    return filename
+
+TIMES = [dt.datetime(2022,2,2,5,0),dt.datetime(2022,2,2,5,1)]
+
+def test_read_idl_ascii(tmp_path):
+    filename, north, south = _write_ie(tmp_path,TIMES[0])
+    ie_north,ie_south,aux = idl_reader.read_idl_ascii(filename)
+    assert list(ie_north.keys())==[v.replace(' ','_') for v in IE_VARS]
+    #north used to run on into the south rows
+    assert len(ie_north)==len(ie_south)==NTHETA*NPSI
+    assert np.allclose(ie_north.values,north,rtol=1e-6)
+    assert np.allclose(ie_south.values,south,rtol=1e-6)
+    assert aux['nTheta']==NTHETA and aux['nPsi']==NPSI
+    assert aux['year']==2022 and aux['xx']==-12.5
+    assert aux['simulation_time']==3600.
+
+def test_read_maggrid(tmp_path):
+    rows = _mag_values(0)
+    grid,headers = idl_reader.read_maggrid(_write_mag_ascii(tmp_path,
+                                                            TIMES[0],rows))
+    assert headers==MAG_HEADERS
+    assert grid.shape==(NLON*NLAT,len(MAG_HEADERS))
+    assert np.allclose(grid,rows,atol=1e-6)
+
+def test_read_maggrid_real4(tmp_path):
+    rows = _mag_values(0)
+    grid,headers = idl_reader.read_maggrid(_write_mag_real4(tmp_path,
+                                                            TIMES[0],rows),
+                                           type='real4')
+    #File says Lat Lon, but the first coordinate is longitude
+    assert headers==MAG_HEADERS
+    assert grid.shape==(NLON*NLAT,len(MAG_HEADERS))
+    assert np.allclose(grid,rows.astype(np.float32))
+    idl = idl_reader.read_idl_binary(tmp_path/('mag_grid_e'+
+                                       TIMES[0].strftime('%Y%m%d-%H%M%S')+
+                                       '.out'))
+    assert list(idl['grid'])==[NLON,NLAT]
+    assert idl['params']=={'rBody':2.5}
+    assert idl['step']==100 and idl['time']==3600.
+
+@pytest.mark.parametrize('kind',['ascii','real4'])
+def test_read_batch_maggrid(tmp_path, kind):
+    writer = {'ascii':_write_mag_ascii,'real4':_write_mag_real4}[kind]
+    rows = [_mag_values(i) for i in range(len(TIMES))]
+    files = [writer(tmp_path,t,r) for t,r in zip(TIMES,rows)]
+    batch = idl_reader.read_batch(files,nworkers=1,type=kind)
+    assert batch['times']==TIMES
+    assert batch['headers']==MAG_HEADERS
+    assert batch['data'].shape==(len(TIMES),NLAT,NLON,len(MAG_HEADERS))
+    for i in range(len(TIMES)):
+        cube = rows[i].reshape(NLAT,NLON,-1)
+        assert np.allclose(batch['data'][i],cube,atol=1e-4)
+    #lat and lon both increase along their axes
+    assert np.all(np.diff(batch['data'][0,:,0,1])>0)
+    assert np.all(np.diff(batch['data'][0,0,:,0])>0)
+
+def test_read_batch_idl(tmp_path):
+    files, norths = [], []
+    for i,time in enumerate(TIMES):
+        filename, north, south = _write_ie(tmp_path,time,seed=2*i)
+        files.append(filename)
+        norths.append(north)
+    batch = idl_reader.read_batch(files,nworkers=2,lat='Theta_[deg]',
+                                  lon='Psi_[deg]')
+    assert batch['times']==TIMES
+    for part in ['north','south']:
+        assert batch[part].shape==(len(TIMES),NTHETA,NPSI,len(IE_VARS))
+    assert np.allclose(batch['north'][1],
+                       norths[1].reshape(NTHETA,NPSI,-1),rtol=1e-6)
+    assert batch['south'][:,:,:,3].min()==pytest.approx(90)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Check isosurface extraction on spheres, where the answer is known
+"""
+import numpy as np
+from global_energetics.extract import isosurface
+
+def _ordered(n=41, half=2.):
+    """Function gives an ordered grid (x fastest like tecplot) on a cube
+    """
+    axis = np.linspace(-half,half,n)
+    X,Y,Z = np.meshgrid(axis,axis,axis,indexing='ij')
+    return X.ravel(order='F'),Y.ravel(order='F'),Z.ravel(order='F'),(n,n,n)
+
+def _edges(faces):
+    pairs = np.concatenate([faces[:,[0,1]],faces[:,[1,2]],faces[:,[2,0]]])
+    return np.unique(np.sort(pairs,axis=1),axis=0,return_counts=True)
+
+def test_sphere_area_and_normals():
+    x,y,z,shape = _ordered()
+    r = np.sqrt(x**2+y**2+z**2)
+    region, = isosurface.isosurfaces(x,y,z,r,1.5,shape=shape,inside='below')
+    assert abs(region['area'].sum()/(4*np.pi*1.5**2)-1)<0.01
+    #normals point away from r<1.5, ie. radially out
+    radial = region['center']/np.linalg.norm(region['center'],axis=1)[:,None]
+    assert ((region['normal']*radial).sum(axis=1)>0.9).all()
+    #vertices land on the sphere up to the linear interpolation error
+    np.testing.assert_allclose(np.linalg.norm(region['vertices'],axis=1),1.5,
+                               atol=0.01)
+    np.testing.assert_allclose(isosurface.interpolate(region,x),
+                               region['vertices'][:,0],atol=1e-12)
+
+def test_sphere_is_closed():
+    x,y,z,shape = _ordered(n=21)
+    r = np.sqrt(x**2+y**2+z**2)
+    region, = isosurface.isosurfaces(x,y,z,r,1.2,shape=shape)
+    edges, count = _edges(region['faces'])
+    #every edge shared by exactly two faces and V-E+F=2
+    assert (count==2).all()
+    assert (len(region['vertices'])-len(edges)+len(region['faces']))==2
+
+def test_connected_regions():
+    x,y,z,shape = _ordered()
+    #big sphere around x=-1, small one around x=+1.2
+    values = np.minimum(np.sqrt((x+1)**2+y**2+z**2)/0.8,
+                        np.sqrt((x-1.2)**2+y**2+z**2)/0.5)
+    both = isosurface.isosurfaces(x,y,z,values,1,shape=shape,keep='all')
+    assert len(both)==2
+    assert len(both[0]['faces'])>len(both[1]['faces'])
+    assert (both[0]['center'][:,0]<0).all()
+    assert (both[1]['center'][:,0]>0).all()
+    for region in both:
+        assert (_edges(region['faces'])[1]==2).all()
+    largest = isosurface.isosurfaces(x,y,z,values,1,shape=shape)
+    assert len(largest)==1
+    np.testing.assert_array_equal(largest[0]['faces'],both[0]['faces'])
+    nsmall = len(both[1]['faces'])
+    assert len(isosurface.isosurfaces(x,y,z,values,1,shape=shape,keep='all',
+                                      min_faces=nsmall))==2
+    assert len(isosurface.isosurfaces(x,y,z,values,1,shape=shape,keep='all',
+                                      min_faces=nsmall+1))==1
+
+def test_brick_matches_ordered():
+    x,y,z,shape = _ordered(n=21)
+    r = np.sqrt(x**2+y**2+z**2)
+    ordered, = isosurface.isosurfaces(x,y,z,r,1.2,shape=shape)
+    grid = {'kind':'ordered','shape':shape}
+    #same cells as an FEBRICK nodemap, corners in tecplot brick order
+    connectivity = isosurface.cell_nodes(grid)[:,[0,1,3,2,4,5,7,6]]
+    brick, = isosurface.isosurfaces(x,y,z,r,1.2,connectivity=connectivity)
+    np.testing.assert_allclose(brick['area'].sum(),ordered['area'].sum(),
+                               rtol=1e-12)
+    assert len(brick['faces'])==len(ordered['faces'])
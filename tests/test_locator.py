@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Check locator interpolation is exact for fields trilinear in x,y,z, on
+    ordered and refined (AMR) FEBRICK grids
+"""
+import numpy as np
+from global_energetics.extract import locator
+
+def _field(points):
+    x,y,z = np.asarray(points).T
+    return 2*x-3*y+0.5*z+1+0.25*x*y*z
+
+def _ordered():
+    axes = [np.linspace(-2,2,9),np.linspace(-1,3,5),np.linspace(0,1,3)]
+    X,Y,Z = np.meshgrid(*axes,indexing='ij')
+    xyz = np.stack([X.ravel(order='F'),Y.ravel(order='F'),
+                    Z.ravel(order='F')],axis=1)
+    return xyz, tuple(len(a) for a in axes)
+
+def _amr():
+    """Function gives a 4x4x4 block of unit cells w the cell at the origin
+        split into 8, every cell w its own 8 nodes in a shuffled order
+    """
+    corners = np.array([[i&1,(i>>1)&1,(i>>2)&1] for i in range(8)],
+                       dtype=float)
+    cells = [(np.array([i,j,k],dtype=float),1.) for i in range(4)
+             for j in range(4) for k in range(4) if (i,j,k)!=(0,0,0)]
+    cells += [(corners[c]*0.5,0.5) for c in range(8)]
+    rng = np.random.default_rng(3)
+    xyz, connectivity = [], []
+    for lo,size in cells:
+        connectivity.append(len(xyz)+rng.permutation(8))
+        xyz += list(lo+corners*size)
+    return np.array(xyz), np.array(connectivity)
+
+def test_ordered_exact():
+    xyz, shape = _ordered()
+    grid = locator.build_grid(*xyz.T,shape=shape)
+    rng = np.random.default_rng(0)
+    points = rng.uniform([-2,-1,0],[2,3,1],(500,3))
+    #nodes and the far faces are on the grid too
+    points = np.vstack([points,xyz,[[2,3,1]]])
+    result, inside = locator.sample(grid,_field(xyz),points)
+    assert inside.all()
+    np.testing.assert_allclose(result,_field(points),rtol=1e-12,atol=1e-12)
+    vector, _ = locator.sample(grid,np.stack([xyz[:,0],_field(xyz)],axis=1),
+                               points)
+    np.testing.assert_allclose(vector[:,0],points[:,0],atol=1e-12)
+
+def test_amr_exact():
+    xyz, connectivity = _amr()
+    grid = locator.build_grid(*xyz.T,connectivity=connectivity,chunksize=7)
+    assert [level['dx'] for level in grid['levels']]==[0.5,1.0]
+    rng = np.random.default_rng(1)
+    points = np.vstack([rng.uniform(0,4,(500,3)),
+                        rng.uniform(0,1,(100,3))])
+    result, inside = locator.sample(grid,_field(xyz),points)
+    assert inside.all()
+    np.testing.assert_allclose(result,_field(points),rtol=1e-12,atol=1e-12)
+    #fine cells are the ones found inside the refined corner
+    nodes, weights, _ = locator.locate(grid,[[0.2,0.3,0.4],[1.5,0.5,0.5]])
+    np.testing.assert_allclose(np.ptp(xyz[nodes[0]],axis=0),0.5)
+    np.testing.assert_allclose(np.ptp(xyz[nodes[1]],axis=0),1.0)
+    np.testing.assert_allclose(weights.sum(axis=1),1)
+
+def test_off_grid():
+    xyz, connectivity = _amr()
+    grid = locator.build_grid(*xyz.T,connectivity=connectivity)
+    result, inside = locator.sample(grid,_field(xyz),
+                                    [[-0.1,1,1],[1,1,4.5],[1,1,1]])
+    np.testing.assert_array_equal(inside,[False,False,True])
+    assert np.isnan(result[0:2]).all() and np.isfinite(result[2])
+
+def test_grid_cache(tmp_path):
+    xyz, connectivity = _amr()
+    built = locator.get_grid(*xyz.T,connectivity=connectivity,
+                             cache_dir=str(tmp_path))
+    saved = list(tmp_path.glob('grid_*.npz'))
+    assert [p.name for p in saved]==['grid_'+built['hash']+'.npz']
+    locator.GRIDS.clear()
+    loaded = locator.get_grid(*xyz.T,connectivity=connectivity,
+                              cache_dir=str(tmp_path))
+    assert loaded is not built and loaded['hash']==built['hash']
+    points = np.random.default_rng(2).uniform(0,4,(50,3))
+    np.testing.assert_array_equal(locator.sample(loaded,xyz[:,1],points)[0],
+                                  locator.sample(built,xyz[:,1],points)[0])
+    assert locator.get_grid(*xyz.T,connectivity=connectivity) is loaded
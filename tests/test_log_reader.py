@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Check log_reader against the old proc_indices.csv_to_pandas parse and
+    that the sidecar cache is reused and refreshed
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from global_energetics.extract import log_reader
+
+def _old(csvfile, **kwargs):
+    """Function is the csv_to_pandas parse from before log_reader
+    """
+    tdict = kwargs.get('tdict',log_reader.LOG_TIME)
+    df = pd.read_csv(csvfile,sep=r'\s+',skiprows=kwargs.get('skiprows',1))
+    df['Time [UTC]'] = pd.to_datetime(dict(year=df[tdict['year']],
+                                           month=df[tdict['month']],
+                                           day=df[tdict['day']],
+                                           hour=df[tdict['hour']],
+                                           minute=df[tdict['minute']],
+                                           second=df[tdict['second']]))
+    df.index = df['Time [UTC]']
+    dropcols = list(tdict.values())+['Time [UTC]']
+    if 'it' in df.columns:
+        dropcols.append('it')
+    return df.drop(columns=dropcols)
+
+@pytest.fixture
+def logfile(tmp_path):
+    n = 1000
+    t = pd.date_range('2014-02-18 23:30',periods=n,freq='2s')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'it':np.arange(n),'year':t.year,'mo':t.month,
+                       'dy':t.day,'hr':t.hour,'mn':t.minute,'sc':t.second,
+                       'msc':0,'dst':rng.normal(size=n),
+                       'AL':rng.normal(size=n)*100})
+    path = tmp_path/'log_e20140218-233000.log'
+    with open(path,'w') as f:
+        f.write('Progress:\n')
+        df.to_csv(f,sep=' ',index=False)
+    return str(path)
+
+def _sidecars(path):
+    folder = os.path.dirname(path)
+    return sorted(f for f in os.listdir(folder)
+                  if f.startswith('.'+os.path.basename(path)))
+
+def test_matches_old_parse(logfile):
+    new = log_reader.read_log(logfile,cache=False)
+    pd.testing.assert_frame_equal(new,_old(logfile),check_dtype=False,
+                                  check_index_type=False)
+    assert new.index.name=='Time [UTC]'
+    assert _sidecars(logfile)==[]
+
+def test_cache_reused_then_refreshed(logfile, monkeypatch):
+    first = log_reader.read_log(logfile)
+    written = _sidecars(logfile)
+    assert len(written)==1
+    def no_parse(*args):
+        raise AssertionError('parsed again w an up to date sidecar')
+    monkeypatch.setattr(log_reader,'_parse',no_parse)
+    pd.testing.assert_frame_equal(log_reader.read_log(logfile),first,
+                                  check_freq=False)
+    monkeypatch.undo()
+    #a newer mtime means a new sidecar, the old one is cleared
+    stat = os.stat(logfile)
+    os.utime(logfile,ns=(stat.st_atime_ns,stat.st_mtime_ns+10**9))
+    pd.testing.assert_frame_equal(log_reader.read_log(logfile),first,
+                                  check_freq=False)
+    refreshed = _sidecars(logfile)
+    assert len(refreshed)==1 and refreshed!=written
+
+def test_cache_dir_and_bad_cache(logfile, tmp_path):
+    cache_dir = str(tmp_path/'cache')
+    first = log_reader.read_log(logfile,cache_dir=cache_dir)
+    cachefile = log_reader.sidecar(logfile,cache_dir=cache_dir)
+    assert os.path.dirname(cachefile)==cache_dir
+    assert os.path.exists(cachefile) and _sidecars(logfile)==[]
+    with open(cachefile,'wb') as f:
+        f.write(b'not a cache')
+    with pytest.warns(UserWarning,match='bad cache'):
+        again = log_reader.read_log(logfile,cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(again,first,check_freq=False)
+
+def test_imf_file(tmp_path):
+    path = str(tmp_path/'IMF.dat')
+    with open(path,'w') as f:
+        f.write('Solar wind from OMNI\n\nmade for a test\n'
+                'year month day hour min sec msec bx by bz vx density\n'
+                '#COORDINATES\nGSE\n\n#START\n'
+                '2014 2 18 23 30 0 0 1.0 -2.0 3.0 -400.0 5.0\n'
+                '2014 2 18 23 31 0 0 1.5 -2.5 ***** -410.0 5.5\n')
+    assert log_reader.imf_coordsys(path)=='GSE'
+    imf = log_reader.read_log(path,tdict=log_reader.IMF_TIME,
+                              skiprows=log_reader.IMF_SKIPROWS,cache=False)
+    assert list(imf.columns)==['bx','by','bz','vx','density']
+    assert list(imf.index)==[pd.Timestamp('2014-02-18 23:30'),
+                             pd.Timestamp('2014-02-18 23:31')]
+    #Fortran overflow fields come back as NaN
+    assert imf['bz'].iloc[0]==3.0 and np.isnan(imf['bz'].iloc[1])
+
+def test_imf_default_coordsys(tmp_path):
+    path = str(tmp_path/'IMF.dat')
+    with open(path,'w') as f:
+        f.write('no coordinates given\n#START\n2014 2 18 23 30 0 0 1 2 3\n')
+    assert log_reader.imf_coordsys(path)=='GSM'
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Check the stacked grid_indices/read_MGL against a plain one file at a
+    time loop over small ascii mag_grid files, and read_virtual_SML
+    against the old one time at a time loop over a virtual mag file
+"""
+import os
+import datetime as dt
+import numpy as np
+import pytest
+from global_energetics.extract import magnetometer, transforms
+
+HEADERS = ['Lon','Lat','dBn','dBe','dBd','dBnMhd','dBeMhd','dBdMhd',
+           'dBnFac','dBeFac','dBdFac','dBnHal','dBeHal','dBdHal',
+           'dBnPed','dBePed','dBdPed','LatSm','LonSm']
+TIMES = [dt.datetime(2022,2,2,5,0),dt.datetime(2022,2,2,5,1),
+         dt.datetime(2022,2,2,5,2)]
+REGIONS = {'night':(50,80,300,30),#wraps through LonSm=0
+           'dusk':(40,80,150,210)}
+
+def _write_grid(path, time, seed):
+    """Function writes an ascii mag_grid file w random dB on a 10x20deg
+        grid, LonSm is shifted so some values are negative
+    """
+    rng = np.random.default_rng(seed)
+    lon = np.arange(0,360,10.)
+    lat = np.arange(-80,81,20.)
+    lon2d,lat2d = np.meshgrid(lon,lat)
+    rows = np.zeros([lon2d.size,len(HEADERS)])
+    rows[:,0],rows[:,1] = lon2d.ravel(),lat2d.ravel()
+    rows[:,2:-2] = rng.normal(0,100,[lon2d.size,len(HEADERS)-4])
+    rows[:,-2] = rows[:,1]+3
+    rows[:,-1] = rows[:,0]-25
+    filename = str(path/('mag_grid_e'+time.strftime('%Y%m%d-%H%M%S')+
+                         '.out'))
+    with open(filename,'w') as f:
+        f.write('Magnetometer grid (2D) in GEO coordinates\n')
+        f.write(time.strftime('%Y %m %d %H %M %S')+'\n')
+        f.write('{} {}\n'.format(len(lon),len(lat)))
+        f.write(' '.join(HEADERS)+'\n')
+        for row in rows:
+            f.write(' '.join(['{:.6f}'.format(v) for v in row])+'\n')
+    return filename
+
+def _plain(files, times):
+    """Function works out each index one file and one point at a time
+    """
+    result = []
+    for filename,time in zip(files,times):
+        grid = np.loadtxt(filename,skiprows=4)
+        col = {name:grid[:,i] for i,name in enumerate(HEADERS)}
+        i = np.argmin(col['dBn'])
+        xyz = magnetometer.sph_to_cart(1,col['Lat'][i],col['Lon'][i])
+        gsm = transforms.transform(np.array(xyz),[time],'GEO','GSM')
+        row = {'dBmin':col['dBn'][i],'geoLat':col['Lat'][i],
+               'geoLon':col['Lon'][i],'smLat':col['LatSm'][i],
+               'smLon':col['LonSm'][i]%360,
+               'gsmX':gsm.ravel()[0],'gsmY':gsm.ravel()[1],
+               'gsmZ':gsm.ravel()[2],
+               'dBMhd':col['dBnMhd'][i],'dBFac':col['dBnFac'][i],
+               'dBPed':col['dBnPed'][i],'dBHal':col['dBnHal'][i]}
+        inband = [dB for dB,lat in zip(col['dBn'],col['LatSm'])
+                  if 40<=lat<=80]
+        row['vSML'],row['vSMU'] = min(inband),max(inband)
+        for name,(latmin,latmax,lonmin,lonmax) in REGIONS.items():
+            inside = []
+            for dB,lat,lon in zip(col['dBn'],col['LatSm'],col['LonSm']):
+                lon = lon%360
+                if lonmin<=lonmax:
+                    inlon = lonmin<=lon<=lonmax
+                else:
+                    inlon = lon>=lonmin or lon<=lonmax
+                if inlon and latmin<=lat<=latmax:
+                    inside.append(dB)
+            row[name+'L'],row[name+'U'] = min(inside),max(inside)
+        result.append(row)
+    return result
+
+@pytest.fixture
+def gridpath(tmp_path):
+    #written out of time order, read_MGL sorts them
+    for i in [2,0,1]:
+        _write_grid(tmp_path,TIMES[i],seed=i)
+    return tmp_path
+
+@pytest.mark.parametrize('nworkers',[1,2])
+def test_read_MGL(gridpath, nworkers):
+    files = sorted([str(f) for f in gridpath.glob('mag_grid_*.out')])
+    MGL = magnetometer.read_MGL(str(gridpath),nworkers=nworkers,
+                                regions=REGIONS)
+    assert list(MGL.index)==TIMES
+    for (time,got),want in zip(MGL.iterrows(),_plain(files,TIMES)):
+        for key,value in want.items():
+            assert got[key]==pytest.approx(value,abs=1e-9),(time,key)
+
+def test_empty_region(gridpath):
+    files = sorted([str(f) for f in gridpath.glob('mag_grid_*.out')])
+    batch = magnetometer.idl_reader.read_batch(files,nworkers=1)
+    MGL = magnetometer.grid_indices(batch['data'],batch['headers'],
+                                    batch['times'],
+                                    regions={'none':(85,90,0,360)})
+    assert MGL['noneL'].isna().all() and MGL['noneU'].isna().all()
+
+STATION_FILE = os.path.join(os.path.dirname(__file__),'..','data',
+                            'stations.loc')
+STATIONS = ['AAA','ABK','AMS','AND','API','ARS']
+MAG_TIMES = [dt.datetime(2022,2,2,0,30,30),dt.datetime(2022,2,2,12,0),
+             dt.datetime(2022,2,2,12,1),dt.datetime(2022,2,2,16,0)]
+
+def _write_mag(path):
+    """Function writes a virtual magnetometer file, the 2nd time is
+        missing two stations and the 4th only has the southern ones
+    """
+    rng = np.random.default_rng(4)
+    rows = []
+    for i,time in enumerate(MAG_TIMES):
+        for n,station in enumerate(STATIONS):
+            if ((i==2 and station in ['ABK','ARS']) or
+                (i==3 and station not in ['AMS','API'])):
+                continue
+            rows.append([time.year,time.month,time.day,time.hour,
+                         time.minute,time.second,0,n+1,0.,0.,0.,
+                         rng.normal(0,200),rng.normal(0,50),
+                         rng.normal(0,50)])
+    filename = str(path/'magnetometers_e20220202-120000.mag')
+    with open(filename,'w') as f:
+        f.write(' '.join(STATIONS)+'\n')
+        f.write('year mo dy hr mn sc msc station X Y Z dBn dBe dBd\n')
+        for row in rows:
+            f.write(' '.join([str(v) for v in row[0:8]]+
+                             ['{:.6f}'.format(v) for v in row[8::]])+'\n')
+    return filename
+
+def _old_vsml(filename, *, band=(-90,90), sector=None):
+    """Function is the old loop over times, w the band and MLT sector
+        picked station by station, None where nothing is left
+    """
+    stations = magnetometer.read_station_locations(file_in=STATION_FILE)
+    results = np.loadtxt(filename,skiprows=2)
+    result = []
+    for time in MAG_TIMES:
+        ut = time.hour+time.minute/60+time.second/3600
+        rows = []
+        for row in results[(results[:,3]==time.hour)&
+                           (results[:,4]==time.minute)]:
+            station = STATIONS[int(row[7])-1]
+            maglat = stations.loc[station,'MAGLAT']
+            mltshift = stations.loc[station,'MAGLON']*12/180
+            mlt = (mltshift+ut)%24
+            if not band[0]<=maglat<=band[1]:
+                continue
+            if sector is not None and not (mlt>=sector[0] or
+                                           mlt<sector[1]):
+                continue
+            rows.append((row[11],station,maglat,mltshift))
+        if len(rows)==0:
+            result.append(None)
+            continue
+        low = min(rows,key=lambda r: r[0])
+        result.append({'vSML':low[0],'vSMU':max([r[0] for r in rows]),
+                       'station':low[1],'mLat':low[2],'mLon':low[3]})
+    return result
+
+@pytest.fixture
+def magfile(tmp_path):
+    return _write_mag(tmp_path)
+
+def _check(vsml, want, prefix='vSM'):
+    assert list(vsml.index)==MAG_TIMES
+    for (time,got),old in zip(vsml.iterrows(),want):
+        if old is None:
+            assert np.isnan(got[prefix+'L']) and np.isnan(got[prefix+'U'])
+            continue
+        assert got[prefix+'L']==pytest.approx(old['vSML'],abs=1e-9)
+        assert got[prefix+'U']==pytest.approx(old['vSMU'],abs=1e-9)
+        if prefix=='vSM':
+            assert got['station']==old['station']
+            assert got['mLat']==pytest.approx(old['mLat'])
+            assert got['mLon']==pytest.approx(old['mLon'])
+
+def test_virtual_SML(magfile):
+    vsml = magnetometer.read_virtual_SML(magfile,station_file=STATION_FILE)
+    _check(vsml,_old_vsml(magfile))
+    assert np.allclose(vsml['vSME'],vsml['vSMU']-vsml['vSML'])
+
+def test_virtual_SML_band(magfile):
+    vsml = magnetometer.read_virtual_SML(magfile,station_file=STATION_FILE,
+                                         band=(30,90))
+    want = _old_vsml(magfile,band=(30,90))
+    assert want[3] is None#only southern stations then
+    _check(vsml,want)
+    assert vsml.iloc[3][['station','mLat','mLon']].isna().all()
+
+def test_virtual_SML_midnight(magfile):
+    vsml = magnetometer.read_virtual_SML(magfile,station_file=STATION_FILE,
+                                         regions={'mid':(21,3)})
+    want = _old_vsml(magfile,sector=(21,3))
+    #00:30UT has no station on the night side, 12UT is before and 16UT
+    #   after midnight
+    assert want[0] is None and want[1] is not None and want[3] is not None
+    _check(vsml,want,prefix='mid')
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Check np_equations against the equations() strings and numexpr on a
+    small synthetic field
+"""
+import re
+import numpy as np
+import pytest
+from global_energetics import benchmark
+from global_energetics.extract import np_equations
+from global_energetics.extract.equations import equations
+
+ANALYSIS = 'energy_mass'
+#Tecplot function name -> numpy, for the straight string translation below
+NUMPY = {'sqrt':'np.sqrt','abs':'np.abs','sin':'np.sin','cos':'np.cos',
+         'tan':'np.tan','asin':'np.arcsin','acos':'np.arccos',
+         'atan':'np.arctan','atan2':'np.arctan2','exp':'np.exp',
+         'log10':'np.log10','trunc':'np.trunc','MAX':'np.maximum',
+         'MIN':'np.minimum','max':'np.maximum','min':'np.minimum'}
+
+def _field():
+    data, _ = benchmark.synthetic_field(3000)
+    return data
+
+def _naive(rhs):
+    """Function turns a tecplot rhs straight into python, no parser, only
+        for equations w/o IF, logic or zone references
+    """
+    out = []
+    for part in re.split(r'(\{[^}]*\})',rhs):
+        if part.startswith('{'):
+            out.append('d['+repr(part[1:-1].strip())+']')
+        else:
+            part = part.replace('^','**')
+            out.append(re.sub(r'\b([A-Za-z_]\w*)\(',
+                              lambda m:NUMPY[m.group(1)]+'(',part))
+    return ''.join(out)
+
+def test_matches_equation_strings():
+    data = np_equations.get_global_variables(_field(),ANALYSIS,
+                                             aux=benchmark.AUX)
+    alleq = equations(aux=benchmark.AUX)
+    checked = 0
+    for eqset in np_equations.select_eqsets(ANALYSIS):
+        for lhs,rhs in alleq[eqset].items():
+            if re.search(r'IF\(|\[\d+\]|&&|\|\|',rhs):
+                continue
+            with np.errstate(all='ignore'):
+                expected = eval(_naive(rhs),{'np':np,'d':data,'pi':np.pi})
+            np.testing.assert_allclose(data[np_equations.strip_name(lhs)],
+                                       expected,rtol=1e-12,equal_nan=True,
+                                       err_msg=lhs+' = '+rhs)
+            checked += 1
+    assert checked>20
+
+def test_numexpr_matches_numpy():
+    pytest.importorskip('numexpr')
+    plain = np_equations.get_global_variables(_field(),ANALYSIS,
+                                              aux=benchmark.AUX)
+    fast = np_equations.get_global_variables(_field(),ANALYSIS,
+                                             aux=benchmark.AUX,
+                                             use_numexpr=True)
+    assert sorted(plain)==sorted(fast)
+    for name in plain:
+        #cancellation leaves round off where the exact answer is 0
+        scale = np.nanmax(np.abs(plain[name]),initial=0)
+        np.testing.assert_allclose(fast[name],plain[name],rtol=1e-10,
+                                   atol=1e-12*scale,equal_nan=True,
+                                   err_msg=name)
+
+@pytest.mark.parametrize('use_numexpr',[False,True])
+def test_if_logic_and_zone_references(use_numexpr):
+    if use_numexpr:
+        pytest.importorskip('numexpr')
+    x = np.linspace(-2,2,9)
+    data = {'x':x}
+    other = {'x':x[::-1]}
+    np_equations.eqeval({'{a}':'IF({x}>0 && {x}<1.5, {x}^2, -1)',
+                         '{b}':'{a}*2-{x}[2]',
+                         '{c}':'-{x}^2'},
+                        data,zones=[data,other],use_numexpr=use_numexpr)
+    np.testing.assert_allclose(data['a'],np.where((x>0)&(x<1.5),x**2,-1))
+    np.testing.assert_allclose(data['b'],data['a']*2-x[::-1])
+    np.testing.assert_allclose(data['c'],-x**2)
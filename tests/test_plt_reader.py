@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Round trip a small synthetic TDV112 binary file through plt_reader
+"""
+import gzip
+import struct
+import datetime as dt
+import numpy as np
+import pytest
+from global_energetics.extract import plt_reader
+
+VARIABLES = ['X [R]','Y [R]','Z [R]','P [nPa]']
+
+def _int(*values):
+    return struct.pack('<'+str(len(values))+'i',*values)
+
+def _string(text):
+    return _int(*[ord(c) for c in text],0)
+
+def _brick():
+    """Function gives a 2x2x2 cell block of unit cubes as a FEBRICK zone
+    """
+    x,y,z = np.meshgrid(*[np.arange(3.)]*3,indexing='ij')
+    nodes = np.arange(27).reshape(3,3,3)
+    elements = []
+    for i in range(2):
+        for j in range(2):
+            for k in range(2):
+                elements.append([nodes[i,j,k],nodes[i+1,j,k],
+                                 nodes[i+1,j+1,k],nodes[i,j+1,k],
+                                 nodes[i,j,k+1],nodes[i+1,j,k+1],
+                                 nodes[i+1,j+1,k+1],nodes[i,j+1,k+1]])
+    return ({'X [R]':x.ravel(),'Y [R]':y.ravel(),'Z [R]':z.ravel(),
+             'P [nPa]':np.arange(8.)*0.5},
+            np.array(elements,dtype=np.int32))
+
+def _write_tdv112(filename):
+    """Function writes one FEBRICK zone (P cell centered, f8) and one
+        ORDERED zone (all nodal, f4) the same way BATSRUS/tecplot lay out
+    """
+    brick, elements = _brick()
+    ordered = {name:np.arange(12.,dtype=np.float32)+i
+               for i,name in enumerate(VARIABLES)}
+    header = b'#!TDV112'+_int(1,0)+_string('synthetic')
+    header += _int(len(VARIABLES))+b''.join(_string(v) for v in VARIABLES)
+    #FEBRICK zone record
+    header += struct.pack('<f',299.)+_string('global_field')+_int(-1,-1)
+    header += struct.pack('<d',1.5)+_int(-1,5)
+    header += _int(1,0,0,0,1)+_int(0,0)
+    header += _int(27,8,0,0,0)
+    header += _int(1)+_string('TIMEEVENT')+_int(0)
+    header += _string('2022/06/06 12:30:15.000')+_int(0)
+    #ORDERED zone record
+    header += struct.pack('<f',299.)+_string('line')+_int(-1,-1)
+    header += struct.pack('<d',2.5)+_int(-1,0)+_int(0)+_int(0,0)
+    header += _int(2,3,2)+_int(0)
+    header += struct.pack('<f',799.)+_string('SAVEDBY')+_int(0)
+    header += _string('test')
+    header += struct.pack('<f',357.)
+    #Data section
+    data = struct.pack('<f',299.)+_int(*[2]*len(VARIABLES))+_int(0,0,-1)
+    for name in VARIABLES:
+        data += struct.pack('<2d',brick[name].min(),brick[name].max())
+    for name in VARIABLES:
+        data += brick[name].astype('<f8').tobytes()
+    data += elements.astype('<i4').tobytes()
+    data += struct.pack('<f',299.)+_int(*[1]*len(VARIABLES))+_int(0,0,-1)
+    for name in VARIABLES:
+        data += struct.pack('<2d',ordered[name].min(),ordered[name].max())
+    for name in VARIABLES:
+        data += ordered[name].astype('<f4').tobytes()
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename,'wb') as f:
+        f.write(header+data)
+    return brick, elements, ordered
+
+@pytest.mark.parametrize('suffix',['.plt','.plt.gz'])
+def test_binary_round_trip(tmp_path, suffix):
+    filename = str(tmp_path/('synthetic'+suffix))
+    brick, elements, ordered = _write_tdv112(filename)
+    dataset = plt_reader.read_plt(filename)
+    assert dataset['format']=='binary'
+    assert dataset['title']=='synthetic'
+    assert dataset['variables']==VARIABLES
+    assert dataset['aux']=={'SAVEDBY':'test'}
+    assert [z['name'] for z in dataset['zones']]==['global_field','line']
+    zone = plt_reader.get_zone(dataset,'global*')
+    assert zone['zonetype']=='FEBRICK'
+    assert (zone['n_nodes'],zone['n_elements'])==(27,8)
+    assert zone['solution_time']==1.5
+    assert zone['minmax']['P [nPa]']==(0.,3.5)
+    for name in VARIABLES:
+        np.testing.assert_array_equal(
+                           plt_reader.zone_values(dataset,name,'global*'),
+                           brick[name])
+    np.testing.assert_array_equal(
+                           plt_reader.zone_connectivity(dataset,0),elements)
+    line = plt_reader.get_zone(dataset,1)
+    assert line['zonetype']=='ORDERED' and line['shape']==(2,3,2)
+    assert plt_reader.zone_connectivity(dataset,1) is None
+    for name in VARIABLES:
+        values = plt_reader.zone_values(dataset,name,1,copy=True)
+        assert values.dtype==np.float32
+        np.testing.assert_array_equal(values,ordered[name])
+
+def test_load_variables_and_time(tmp_path):
+    filename = str(tmp_path/'synthetic.plt')
+    brick, _, _ = _write_tdv112(filename)
+    data, aux = plt_reader.load_variables(filename,['P *','X*'])
+    assert sorted(data)==['P [nPa]','X [R]']
+    np.testing.assert_array_equal(data['P [nPa]'],brick['P [nPa]'])
+    assert plt_reader.read_aux_time(aux)==dt.datetime(2022,6,6,12,30,15)
+    with pytest.raises(KeyError):
+        plt_reader.find_variable(plt_reader.read_plt(filename),'Rho*')
+
+def test_gzip_decompressed_once(tmp_path, monkeypatch):
+    filename = str(tmp_path/'synthetic.plt.gz')
+    brick, _, _ = _write_tdv112(filename)
+    opened = []
+    real_open = gzip.open
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return real_open(*args,**kwargs)
+    monkeypatch.setattr(plt_reader.gzip,'open',counting_open)
+    dataset = plt_reader.read_plt(filename)
+    for name in VARIABLES:
+        plt_reader.zone_values(dataset,name,0)
+    plt_reader.zone_connectivity(dataset,0)
+    assert opened==[filename]
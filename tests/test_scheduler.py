@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Check the manifest only calls a file done once the store writer says so
+    and that a restart redoes anything left running or queued
+"""
+import pytest
+from global_energetics import scheduler
+
+FILES = ['run/3d__var_1_e20220202-0{}0000-000.plt'.format(i)
+         for i in range(4)]
+
+@pytest.fixture
+def manifest(tmp_path):
+    path = str(tmp_path/'manifest.jsonl')
+    scheduler.init_manifest(path,FILES)
+    return path
+
+def _state(path, filename):
+    return scheduler.load_manifest(path)[scheduler.key(filename)]['state']
+
+def test_run_done(manifest):
+    assert scheduler.run(manifest,FILES[0],lambda x: x+1,1)==2
+    assert _state(manifest,FILES[0])=='done'
+    assert scheduler.run(manifest,FILES[1],lambda: 1/0) is None
+    assert _state(manifest,FILES[1])=='failed'
+
+def test_queued_until_stored(manifest):
+    scheduler.run(manifest,FILES[0],lambda: None,finished='queued')
+    assert _state(manifest,FILES[0])=='queued'
+    scheduler.update(manifest,FILES[0],'done',note='stored')
+    record = scheduler.load_manifest(manifest)[scheduler.key(FILES[0])]
+    assert record['state']=='done'
+    assert 'runtime' in record
+    assert scheduler.summary(manifest)['done']==1
+
+def test_writer_ack_first(manifest):
+    #Writer can store + ack before the worker records queued
+    scheduler.update(manifest,FILES[0],'running')
+    scheduler.update(manifest,FILES[0],'done',note='stored')
+    scheduler.update(manifest,FILES[0],'queued',runtime=3.)
+    record = scheduler.load_manifest(manifest)[scheduler.key(FILES[0])]
+    assert record['state']=='done'
+    assert record['runtime']==3.
+
+def test_restart(manifest):
+    scheduler.run(manifest,FILES[0],lambda: None,finished='queued')
+    scheduler.update(manifest,FILES[1],'running')
+    scheduler.run(manifest,FILES[2],lambda: None,finished='queued')
+    scheduler.update(manifest,FILES[2],'done',note='stored')
+    scheduler.run(manifest,FILES[3],lambda: 1/0)
+    #Killed here, 0 never stored and 1 never finished
+    assert scheduler.init_manifest(manifest,FILES)==FILES[0:2]
+    assert scheduler.init_manifest(manifest,FILES,
+                                   retry_failed=True)==[FILES[0],FILES[1],
+                                                        FILES[3]]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Check tracer footpoints against dipole field lines, r=L*cos(lat)^2
+"""
+import numpy as np
+import pytest
+from global_energetics.extract import locator, tracer
+
+@pytest.fixture(scope='module')
+def dipole():
+    """Ordered grid on [-8,8]^3 Re w an Earth like (southward moment)
+        dipole at the nodes
+    """
+    n = 65
+    axis = np.linspace(-8,8,n)
+    X,Y,Z = np.meshgrid(axis,axis,axis,indexing='ij')
+    x,y,z = [a.ravel(order='F') for a in (X,Y,Z)]
+    r = np.maximum(np.sqrt(x**2+y**2+z**2),0.5)
+    m = -3e4
+    bfield = np.stack([3*m*x*z/r**5,3*m*y*z/r**5,m*(3*z**2-r**2)/r**5],
+                      axis=1)
+    return locator.build_grid(x,y,z,shape=(n,n,n)), bfield
+
+def test_dipole_footpoints(dipole):
+    grid, bfield = dipole
+    L = np.array([4,5,6,4,5,6.])
+    phi = np.deg2rad([0,90,200,45,300,135])
+    seeds = np.stack([L*np.cos(phi),L*np.sin(phi),np.zeros(6)],axis=1)
+    result = tracer.trace(grid,bfield,seeds,r_inner=2.75)
+    np.testing.assert_array_equal(result['status'],3)
+    expected = np.rad2deg(np.arccos(np.sqrt(2.75/L)))
+    for name,sign in [('footpoint_north',1),('footpoint_south',-1)]:
+        foot = result[name]
+        r = np.linalg.norm(foot,axis=1)
+        np.testing.assert_allclose(r,2.75,atol=1e-9)
+        lat = np.rad2deg(np.arcsin(foot[:,2]/r))
+        np.testing.assert_allclose(lat,sign*expected,atol=0.1)
+        #dipole lines stay in their meridian
+        dphi = np.angle(np.exp(1j*(np.arctan2(foot[:,1],foot[:,0])-phi)))
+        np.testing.assert_allclose(np.rad2deg(dphi),0,atol=0.05)
+    #dipole field line length from the equator to lat, both ways
+    lam = np.deg2rad(expected)
+    s = lambda l:(np.sin(l)*np.sqrt(1+3*np.sin(l)**2)+
+                  np.arcsinh(np.sqrt(3)*np.sin(l))/np.sqrt(3))/2
+    np.testing.assert_allclose(result['length'],2*L*s(lam),rtol=0.01)
+
+def test_open_and_off_grid(dipole):
+    grid, bfield = dipole
+    seeds = [[7.9,7.9,7.9],[20,0,0]]
+    result = tracer.trace(grid,bfield,seeds)
+    #high latitude line leaves the box on the way south
+    assert result['status'][0]==2
+    assert tracer.OUTSIDE in (result['reason_forward'][0],
+                              result['reason_backward'][0])
+    assert result['status'][1]==0
+    assert result['reason_forward'][1]==tracer.OUTSIDE
+    assert np.isnan(result['footpoint_north'][1]).all()
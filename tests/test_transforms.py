@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Check transforms against an independent, one time at a time build of
+    the geopack frames (almanac sun + IGRF dipole) and geopack itself when
+    it's installed
+"""
+import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
+from global_energetics.extract import transforms
+
+TIMES = pd.DatetimeIndex(['1998-05-04 03:00','2003-10-29 06:11:23',
+                          '2013-03-17 12:00','2015-06-21 17:30',
+                          '2019-12-22 05:00','2022-02-03 23:59:59'])
+
+def _unit(v):
+    return np.asarray(v)/np.linalg.norm(v)
+
+def _frames(time):
+    """Function builds each system's axes (rows, in GEI) for one time from
+        the Astronomical Almanac low precision sun and the IGRF dipole
+    """
+    n = (time-pd.Timestamp('2000-01-01 12:00')).total_seconds()/86400
+    L = np.deg2rad(280.460+0.9856474*n)
+    g = np.deg2rad(357.528+0.9856003*n)
+    lam = L+np.deg2rad(1.915)*np.sin(g)+np.deg2rad(0.020)*np.sin(2*g)
+    eps = np.deg2rad(23.439-4e-7*n)
+    gmst = np.deg2rad(280.46061837+360.98564736629*n)
+    sun = np.array([np.cos(lam),np.cos(eps)*np.sin(lam),
+                    np.sin(eps)*np.sin(lam)])
+    geo = np.array([[np.cos(gmst),np.sin(gmst),0],
+                    [-np.sin(gmst),np.cos(gmst),0],[0,0,1]])
+    #dipole coefficients linear between IGRF epochs, secular variation
+    # after the last one
+    year = time.year+(time.dayofyear-1+(time-time.normalize()).seconds/
+                      86400)/(366 if time.is_leap_year else 365)
+    g10,g11,h11 = [np.interp(year,transforms.IGRF_EPOCHS,
+                             transforms.IGRF_DIPOLE[:,i])+
+                   max(year-transforms.IGRF_EPOCHS[-1],0)*transforms.IGRF_SV[i]
+                   for i in range(3)]
+    dipole = geo.T@_unit([-g11,-h11,-g10])
+    ecliptic = np.array([0,-np.sin(eps),np.cos(eps)])
+    gsm_y = _unit(np.cross(dipole,sun))
+    sm_y = gsm_y
+    mag_y = _unit(np.cross(geo[2],dipole))
+    return {'GEI':np.eye(3),'GEO':geo,
+            'GSE':np.array([sun,np.cross(ecliptic,sun),ecliptic]),
+            'GSM':np.array([sun,gsm_y,np.cross(sun,gsm_y)]),
+            'SM':np.array([np.cross(sm_y,dipole),sm_y,dipole]),
+            'MAG':np.array([np.cross(mag_y,dipole),mag_y,dipole]),
+            'tilt':np.arcsin(dipole@sun)}
+
+@pytest.mark.parametrize('frm',transforms.SYSTEMS)
+@pytest.mark.parametrize('to',transforms.SYSTEMS)
+def test_matches_independent_frames(frm, to):
+    T = transforms.matrices(TIMES,frm,to)
+    for i,time in enumerate(TIMES):
+        frames = _frames(time)
+        #sun/GST formulas differ by ~0.002deg between the two sources
+        np.testing.assert_allclose(T[i],frames[to]@frames[frm].T,atol=1e-4)
+
+def test_orthonormal_and_round_trip():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(len(TIMES),3))
+    for frm in transforms.SYSTEMS:
+        for to in transforms.SYSTEMS:
+            T = transforms.matrices(TIMES,frm,to)
+            np.testing.assert_allclose(T@T.transpose(0,2,1),
+                                np.broadcast_to(np.eye(3),T.shape),atol=1e-12)
+            np.testing.assert_allclose(np.linalg.det(T),1,atol=1e-12)
+            there = transforms.transform(vectors,TIMES,frm,to)
+            np.testing.assert_allclose(
+                        transforms.transform(there,TIMES,to,frm),vectors,
+                        atol=1e-12)
+
+def test_shared_axes():
+    #GSE->GSM turns about x, GSM->SM about y by the tilt
+    gse_gsm = transforms.matrices(TIMES,'GSE','GSM')
+    np.testing.assert_allclose(gse_gsm[:,0],[[1,0,0]]*len(TIMES),atol=1e-12)
+    gsm_sm = transforms.matrices(TIMES,'GSM','SM')
+    np.testing.assert_allclose(gsm_sm[:,1],[[0,1,0]]*len(TIMES),atol=1e-12)
+    tilt = transforms.dipole_tilt(TIMES)
+    np.testing.assert_allclose(gsm_sm[:,0,0],np.cos(tilt),atol=1e-12)
+    np.testing.assert_allclose(gsm_sm[:,0,2],-np.sin(tilt),atol=1e-12)
+
+def test_sun_and_tilt_values():
+    s = transforms.sun([dt.datetime(2000,1,1,12)])
+    #GMST at J2000 is 280.4606deg
+    assert abs(np.rad2deg(s['gst'][0])-280.4606)<0.01
+    solstice = transforms.sun(['2021-06-21 03:32','2021-12-21 15:59'])
+    np.testing.assert_allclose(np.rad2deg(solstice['sdec']),[23.44,-23.44],
+                               atol=0.01)
+    #north pole leans sunward in June, most when the pole (~73W) is at
+    # local noon ~17 UT, and away in December, most at midnight ~05 UT
+    tilt = np.rad2deg(transforms.dipole_tilt(['2021-06-21 17:00',
+                                              '2021-12-21 05:00']))
+    assert 32<tilt[0]<35 and -35<tilt[1]<-32
+    for time,expected in zip(TIMES,transforms.dipole_tilt(TIMES)):
+        assert abs(_frames(time)['tilt']-expected)<1e-4
+
+def test_single_time_many_vectors():
+    vectors = np.random.default_rng(1).normal(size=(5,3))
+    one = transforms.transform(vectors,TIMES[0],'GSE','GSM')
+    each = transforms.transform(vectors,[TIMES[0]]*5,'GSE','GSM')
+    np.testing.assert_allclose(one,each,atol=1e-14)
+    assert transforms.transform(vectors[0],TIMES[0],'GSE','GSM').shape==(3,)
+
+def test_matches_geopack():
+    gp = pytest.importorskip('geopack.geopack')
+    for time in TIMES:
+        ut = (time-pd.Timestamp('1970-01-01')).total_seconds()
+        psi = gp.recalc(ut)
+        assert abs(psi-transforms.dipole_tilt(time)[0])<1e-3
+        for vector in np.eye(3):
+            np.testing.assert_allclose(gp.geogsm(*vector,1),
+                        transforms.transform(vector,time,'GEO','GSM'),
+                        atol=1e-3)
+            np.testing.assert_allclose(gp.smgsm(*vector,1),
+                        transforms.transform(vector,time,'SM','GSM'),
+                        atol=1e-3)
+            np.testing.assert_allclose(gp.geomag(*vector,1),
+                        transforms.transform(vector,time,'GEO','MAG'),
+                        atol=1e-3)